@@ -0,0 +1,235 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Deque, Optional
+
+import numpy as np
+
+# Same contract as a sounddevice.Stream callback: (indata, outdata, frames, time, status)
+AudioCallback = Callable[[np.ndarray, np.ndarray, int, object, object], None]
+
+
+class CallbackStatus:
+    """Minimal stand-in for sounddevice.CallbackFlags used by non-PortAudio backends."""
+
+    def __init__(self):
+        self.input_underflow = False
+        self.input_overflow = False
+        self.output_underflow = False
+        self.output_overflow = False
+
+    def __bool__(self) -> bool:
+        return (self.input_underflow or self.input_overflow or
+                self.output_underflow or self.output_overflow)
+
+
+class AudioBackend(ABC):
+    """A full-duplex audio device that drives AudioIO's callback."""
+
+    @abstractmethod
+    def start(self, callback: AudioCallback, sample_rate: int, block_size: int):
+        pass
+
+    @abstractmethod
+    def stop(self):
+        pass
+
+
+class SoundDeviceBackend(AudioBackend):
+    """Live PortAudio stream via sounddevice (default backend)."""
+
+    def __init__(self):
+        self.stream = None
+
+    def _find_devices(self, sd):
+        input_device = None
+        output_device = None
+
+        print("🔍 Audio Device Search (Target: NVIDIA Broadcast / RTX Voice)...")
+        try:
+            devices = sd.query_devices()
+            # Targets: "NVIDIA Broadcast", "RTX Voice", "RTX-Audio"
+            # We match partial string.
+
+            for i, d in enumerate(devices):
+                name = d['name']
+                name_lower = name.lower()
+                # Look for Input
+                if ("nvidia" in name_lower and "broadcast" in name_lower) or \
+                   ("rtx" in name_lower and ("point" in name_lower or "voice" in name_lower)):
+                    if d['max_input_channels'] > 0 and input_device is None:
+                        input_device = i
+                        print(f"  🎤 Found Input: [{i}] {name}")
+                    if d['max_output_channels'] > 0 and output_device is None:
+                        # User reported that System Default output wasn't recognized by AEC.
+                        # Route Output through NVIDIA Broadcast so it captures the reference signal.
+                        output_device = i
+                        print(f"  🔊 Found Output: [{i}] {name}")
+
+        except Exception as e:
+            print(f"⚠️ Device search failed: {e}")
+
+        # Fallback to defaults if not found
+        if input_device is None:
+            print("  ⚠️ NVIDIA Broadcast Input not found. Using system default.")
+        if output_device is None:
+            print("  ⚠️ NVIDIA Broadcast Output not found. Using system default.")
+
+        return input_device, output_device
+
+    def start(self, callback: AudioCallback, sample_rate: int, block_size: int):
+        if self.stream is not None:
+            return
+        # Imported lazily so headless setups (virtual backend) don't need PortAudio
+        import sounddevice as sd
+
+        input_device, output_device = self._find_devices(sd)
+        self.stream = sd.Stream(
+            samplerate=sample_rate,
+            blocksize=block_size,
+            device=(input_device, output_device),
+            dtype='float32',
+            channels=1,
+            callback=callback
+        )
+        self.stream.start()
+        print(f"✅ AudioIO Started | Device: In={input_device}, Out={output_device}")
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+def load_wav(path: str, sample_rate: int) -> np.ndarray:
+    """Load a WAV file as mono float32 at `sample_rate`."""
+    import scipy.io.wavfile
+    import scipy.signal
+
+    file_rate, data = scipy.io.wavfile.read(path)
+    if data.dtype == np.int16:
+        data = data.astype(np.float32) / 32768.0
+    elif data.dtype == np.int32:
+        data = data.astype(np.float32) / 2147483648.0
+    elif data.dtype == np.uint8:
+        data = (data.astype(np.float32) - 128.0) / 128.0
+    else:
+        data = data.astype(np.float32)
+
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    if file_rate != sample_rate:
+        data = scipy.signal.resample_poly(data, sample_rate, file_rate).astype(np.float32)
+    return data
+
+
+class VirtualAudioBackend(AudioBackend):
+    """
+    File/array driven audio device for headless runs and replay.
+
+    Feeds `input_audio` through the callback block by block, records the last
+    `record_seconds` of what the callback writes to the speaker (0 = nothing,
+    so a long replay doesn't grow memory), and advances a simulated clock.
+    `speed` is the realtime factor (2.0 = twice as fast as realtime);
+    `speed=None` runs as fast as the callback allows.
+    After the input is exhausted, silence is fed for `tail_seconds` so pending
+    playback and endpointing can finish, then `finished` is set.
+    """
+
+    def __init__(self, input_audio: Optional[np.ndarray] = None, input_path: Optional[str] = None,
+                 speed: Optional[float] = 1.0, tail_seconds: float = 1.0, record_seconds: float = 60.0):
+        if input_audio is not None and input_path is not None:
+            raise ValueError("Pass either input_audio or input_path, not both")
+        self.input_audio = input_audio
+        self.input_path = input_path
+        self.speed = speed
+        self.tail_seconds = tail_seconds
+        self.record_seconds = record_seconds
+
+        self.frames_processed = 0
+        self.finished = threading.Event()
+        self._recorded: Deque[np.ndarray] = deque(maxlen=0)  # Sized once the block size is known
+        self._recorded_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._sample_rate = None
+
+    @property
+    def elapsed(self) -> float:
+        """Simulated seconds of audio processed so far."""
+        if not self._sample_rate:
+            return 0.0
+        return self.frames_processed / self._sample_rate
+
+    def start(self, callback: AudioCallback, sample_rate: int, block_size: int):
+        if self._thread is not None:
+            return
+        if self.input_path is not None:
+            source = load_wav(self.input_path, sample_rate)
+        elif self.input_audio is not None:
+            source = np.asarray(self.input_audio, dtype=np.float32)
+        else:
+            source = np.zeros(0, dtype=np.float32)
+
+        self._sample_rate = sample_rate
+        self._recorded = deque(maxlen=-(-int(self.record_seconds * sample_rate) // block_size))
+        self._running = True
+        self.finished.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(callback, source, sample_rate, block_size),
+            daemon=True
+        )
+        self._thread.start()
+        print(f"✅ AudioIO Started | Virtual device ({len(source) / sample_rate:.1f}s input, speed={self.speed or 'max'})")
+
+    def _run(self, callback: AudioCallback, source: np.ndarray, sample_rate: int, block_size: int):
+        total = len(source) + int(self.tail_seconds * sample_rate)
+        indata = np.zeros((block_size, 1), dtype=np.float32)
+        outdata = np.zeros((block_size, 1), dtype=np.float32)
+        status = CallbackStatus()
+        wall_start = time.monotonic()
+
+        while self._running and self.frames_processed < total:
+            start = self.frames_processed
+            chunk = source[start:start + block_size]
+            indata[:len(chunk), 0] = chunk
+            indata[len(chunk):, 0] = 0.0
+            outdata.fill(0.0)
+
+            callback(indata, outdata, block_size, None, status)
+            if self._recorded.maxlen:
+                with self._recorded_lock:
+                    self._recorded.append(outdata[:, 0].copy())
+            self.frames_processed += block_size
+
+            if self.speed:
+                # Pace against the simulated clock instead of sleeping a fixed period
+                target = wall_start + (self.frames_processed / sample_rate) / self.speed
+                delay = target - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            elif self.frames_processed % (block_size * 64) == 0:
+                # Let consumer threads run when going flat out
+                time.sleep(0)
+
+        self.finished.set()
+
+    def recorded_output(self) -> np.ndarray:
+        """The last `record_seconds` played to the virtual speaker (whole blocks)."""
+        with self._recorded_lock:
+            blocks = list(self._recorded)
+        if not blocks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(blocks)
+
+    def wait_until_finished(self, timeout: Optional[float] = None) -> bool:
+        return self.finished.wait(timeout)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
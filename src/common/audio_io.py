@@ -1,120 +1,135 @@
-import sounddevice as sd
 import numpy as np
 import threading
-import queue
 import time
-import sys
+
+from src.common.audio_backend import AudioBackend, SoundDeviceBackend
+from src.common.audio_telemetry import AudioTelemetry, AudioTelemetrySnapshot
+from src.common.ring_buffer import RingBuffer
 
 class AudioIO:
-    def __init__(self, sample_rate=16000, block_size=512):
+    def __init__(self, sample_rate=16000, block_size=512, output_buffer_seconds=60.0, input_buffer_seconds=30.0,
+                 backend: AudioBackend = None):
         self.sample_rate = sample_rate
         self.block_size = block_size
+        # Device that drives _callback (live PortAudio stream unless a virtual device is given)
+        self.backend = backend if backend is not None else SoundDeviceBackend()
         
-        self.output_queue = queue.Queue() # TTS writes here
-        self.input_queue = queue.Queue()  # STT reads from here
+        # Preallocated SPSC ring buffers. The realtime callback is the consumer of
+        # output_buffer and the producer of input_buffer, so it never allocates or locks.
+        self.output_buffer = RingBuffer(int(sample_rate * output_buffer_seconds)) # TTS writes here
+        self.input_buffer = RingBuffer(int(sample_rate * input_buffer_seconds))   # STT reads from here
         
-        self.stream = None
         self.running = False
         
         # Internal state for "is_playing"
         self._is_playing_internal = False
+        # Playback flush is requested here and performed by the callback (the consumer):
+        # output written before this position is dropped, anything enqueued later still plays
+        self._discard_until = 0
+        self._discard_lock = threading.Lock()  # Never taken by the callback
+        self._cancel_generation = 0
+        # Health counters written by the callback; read via telemetry_snapshot()
+        self.telemetry = AudioTelemetry()
 
     def start(self):
-        if self.stream is not None:
+        if self.running:
             return
-            
-        # Device Selection Logic
-        input_device = None
-        output_device = None
-        
-        print("🔍 Audio Device Search (Target: NVIDIA Broadcast / RTX Voice)...")
-        try:
-            devices = sd.query_devices()
-            # Targets: "NVIDIA Broadcast", "RTX Voice", "RTX-Audio"
-            # We match partial string.
-            
-            for i, d in enumerate(devices):
-                name = d['name']
-                name_lower = name.lower()
-                # Look for Input
-                if ("nvidia" in name_lower and "broadcast" in name_lower) or \
-                   ("rtx" in name_lower and ("point" in name_lower or "voice" in name_lower)):
-                    if d['max_input_channels'] > 0 and input_device is None:
-                        input_device = i
-                        print(f"  🎤 Found Input: [{i}] {name}")
-                    if d['max_output_channels'] > 0 and output_device is None:
-                        # User reported that System Default output wasn't recognized by AEC.
-                        # Route Output through NVIDIA Broadcast so it captures the reference signal.
-                        output_device = i
-                        print(f"  🔊 Found Output: [{i}] {name}")
-
-        except Exception as e:
-            print(f"⚠️ Device search failed: {e}")
-
-        # Fallback to defaults if not found
-        if input_device is None:
-            print("  ⚠️ NVIDIA Broadcast Input not found. Using system default.")
-        if output_device is None:
-            print("  ⚠️ NVIDIA Broadcast Output not found. Using system default.")
 
         self.running = True
-        self.stream = sd.Stream(
-            samplerate=self.sample_rate,
-            blocksize=self.block_size,
-            device=(input_device, output_device),
-            dtype='float32',
-            channels=1,
-            callback=self._callback
-        )
-        self.stream.start()
-        print(f"✅ AudioIO Started | Device: In={input_device}, Out={output_device}")
+        self.backend.start(self._callback, self.sample_rate, self.block_size)
 
     def stop(self):
         self.running = False
-        if self.stream:
-            self.stream.stop()
-            self.stream.close()
-            self.stream = None
+        self.backend.stop()
 
     def enqueue_output(self, samples):
-        # Chunk logic
-        cursor = 0
-        while cursor < len(samples):
-            chunk = samples[cursor : cursor + self.block_size]
-            if len(chunk) < self.block_size:
-                pad = np.zeros(self.block_size - len(chunk), dtype='float32')
-                chunk = np.concatenate((chunk, pad))
-            self.output_queue.put(chunk)
-            cursor += self.block_size
-
-    def cancel_playback(self):
+        """
+        Write samples into the playback ring buffer.
+        Blocks (producer-side backpressure) while the buffer is full, and gives up
+        on the remainder if playback is cancelled or the stream stops meanwhile.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        generation = self._cancel_generation
+        self.telemetry.record_enqueue(self.output_buffer.write_position, time.perf_counter())
+        cursor = self.output_buffer.write(samples)
+        while generation == self._cancel_generation:
+            if cursor >= len(samples) or not self.running:
+                return
+            time.sleep(self.block_size / self.sample_rate)
+            cursor += self.output_buffer.write(samples[cursor:])
+        # Cancelled while writing: what this write published after the cut is dropped too
+        self._discard_to(self.output_buffer.write_position)
+
+    def read_input(self, out, timeout=1.0):
+        """
+        Read captured microphone samples into the preallocated array `out`.
+        Waits up to `timeout` seconds for data. Returns the number of samples read.
+        """
+        deadline = time.monotonic() + timeout
+        poll_interval = self.block_size / self.sample_rate / 2
+        while self.input_buffer.available == 0:
+            if time.monotonic() >= deadline:
+                return 0
+            time.sleep(poll_interval)
+        return self.input_buffer.read_into(out)
+
+    def cancel_playback(self) -> int:
         """
         現在の再生キューをクリアして直ちに音声を止める
+        Returns the output position (samples ever played) where playback was cut.
         """
-        with self.output_queue.mutex:
-            self.output_queue.queue.clear()
+        # The callback owns the read cursor, so it performs the actual flush.
+        # Only what was written up to now is dropped; a write still in progress
+        # notices the new generation and extends the cut over its own samples.
+        position = self.output_buffer.read_position
+        self._cancel_generation += 1
+        self._discard_to(self.output_buffer.write_position)
         self._is_playing_internal = False
+        return position
+
+    def _discard_to(self, write_position: int):
+        with self._discard_lock:
+            self._discard_until = max(self._discard_until, write_position)
+
+    @property
+    def output_position(self) -> int:
+        """Samples ever written to the playback buffer (compare with cancel_playback())."""
+        return self.output_buffer.write_position
+
+    def telemetry_snapshot(self) -> AudioTelemetrySnapshot:
+        """Copy of the realtime counters; safe to call from any thread at any rate."""
+        return self.telemetry.snapshot(
+            self.output_buffer.available, self.input_buffer.available, self.sample_rate
+        )
 
     @property
     def is_playing(self):
-        # Check if queue has items or if we recently processed output
-        return not self.output_queue.empty() or self._is_playing_internal
+        # Check if buffer has samples (not awaiting a flush) or if we recently processed output
+        pending = self.output_buffer.write_position - max(self.output_buffer.read_position, self._discard_until)
+        return pending > 0 or self._is_playing_internal
+
+    def _callback(self, indata, outdata, frames, time_info, status):
+        started = time.perf_counter()
+        self.telemetry.record_status(status)
 
-    def _callback(self, indata, outdata, frames, time, status):
-        if status:
-            print(status, file=sys.stderr)
-            
         # 1. Output Processing (Speaker)
-        try:
-            out_chunk = self.output_queue.get_nowait()
-            self._is_playing_internal = True
-        except queue.Empty:
-            out_chunk = np.zeros(frames, dtype='float32')
-            self._is_playing_internal = False
-        
-        outdata[:] = out_chunk.reshape(-1, 1)
+        discard_until = self._discard_until
+        if self.output_buffer.read_position < discard_until:
+            self.output_buffer.discard(discard_until)
+            self.telemetry.discard_markers(self.output_buffer.read_position)
+
+        out = outdata[:, 0]
+        n = self.output_buffer.read_into(out)
+        if n < frames:
+            out[n:] = 0.0
+        self._is_playing_internal = n > 0
+        self.telemetry.record_output(n, frames)
+        self.telemetry.record_playback(self.output_buffer.read_position, started)
 
         # 2. Input Processing (Mic)
         # Barge-in Enabled: We pass input through.
         # We rely on NVIDIA Broadcast (set in start()) to remove the echo.
-        self.input_queue.put(indata.flatten())
+        written = self.input_buffer.write(indata[:, 0])
+        self.telemetry.record_capture(written, frames)
+
+        self.telemetry.record_callback(time.perf_counter() - started, self.input_buffer.available)
@@ -0,0 +1,183 @@
+from dataclasses import dataclass, field
+from typing import Dict
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+def _summarize(samples: np.ndarray, scale: float) -> Dict[str, float]:
+    if len(samples) == 0:
+        return {}
+    stats = {f"p{p}": float(v) * scale for p, v in zip(PERCENTILES, np.percentile(samples, PERCENTILES))}
+    stats["max"] = float(samples.max()) * scale
+    return stats
+
+
+@dataclass
+class AudioTelemetrySnapshot:
+    """Point-in-time copy of AudioIO health counters."""
+    callbacks: int = 0
+    # PortAudio-reported status flags
+    output_underflows: int = 0
+    output_overflows: int = 0
+    input_underflows: int = 0
+    input_overflows: int = 0
+    # Ring-buffer level events
+    playback_underruns: int = 0      # Output ran dry in the middle of playback
+    capture_overruns: int = 0        # Input buffer full, mic samples dropped
+    capture_dropped_samples: int = 0
+    # Backlog depth
+    output_backlog_ms: float = 0.0
+    input_backlog_ms: float = 0.0
+    peak_input_backlog_ms: float = 0.0
+    # Distributions over the most recent window
+    callback_time_us: Dict[str, float] = field(default_factory=dict)
+    enqueue_to_play_ms: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        cb = self.callback_time_us
+        lat = self.enqueue_to_play_ms
+        return (
+            f"callbacks={self.callbacks} underruns={self.playback_underruns} "
+            f"overruns={self.capture_overruns} "
+            f"portaudio(out_under={self.output_underflows}, in_over={self.input_overflows}) "
+            f"backlog(out={self.output_backlog_ms:.0f}ms, in={self.input_backlog_ms:.0f}ms, "
+            f"in_peak={self.peak_input_backlog_ms:.0f}ms) "
+            f"callback_p99={cb.get('p99', 0):.0f}us play_latency_p95={lat.get('p95', 0):.0f}ms"
+        )
+
+
+class AudioTelemetry:
+    """
+    Counters and timing windows written from the realtime callback.
+
+    Every field has a single writer (the callback, or the single producer for
+    enqueue markers), so recording is a few integer/array stores with no locks
+    or allocation. `snapshot()` copies the windows on the reader's thread;
+    a torn read can at worst mix one stale sample into the percentiles.
+    """
+
+    def __init__(self, window: int = 2048, max_markers: int = 1024, underrun_resume_blocks: int = 16):
+        self.callbacks = 0
+        self.output_underflows = 0
+        self.output_overflows = 0
+        self.input_underflows = 0
+        self.input_overflows = 0
+        self.playback_underruns = 0
+        self.capture_overruns = 0
+        self.capture_dropped_samples = 0
+        self.peak_input_backlog = 0
+
+        # A dry spell that ends with more audio within this many blocks counts as an underrun;
+        # longer silences are treated as the natural end of an utterance.
+        self.underrun_resume_blocks = underrun_resume_blocks
+        self._dry_blocks = 0
+        self._was_playing = False
+
+        # Callback execution time ring (seconds)
+        self._callback_times = np.zeros(window, dtype=np.float64)
+
+        # Enqueue markers: producer writes (position, time), callback consumes them
+        self._marker_pos = np.zeros(max_markers, dtype=np.int64)
+        self._marker_time = np.zeros(max_markers, dtype=np.float64)
+        self._marker_write = 0
+        self._marker_read = 0
+        self.dropped_markers = 0
+
+        # Enqueue-to-play latency ring (seconds)
+        self._latencies = np.zeros(window, dtype=np.float64)
+        self._latency_count = 0
+
+    # --- Producer side (enqueue_output) ---
+
+    def record_enqueue(self, position: int, timestamp: float):
+        """Mark that the sample at output `position` was enqueued at `timestamp`."""
+        if self._marker_write - self._marker_read >= len(self._marker_pos):
+            self.dropped_markers += 1
+            return
+        idx = self._marker_write % len(self._marker_pos)
+        self._marker_pos[idx] = position
+        self._marker_time[idx] = timestamp
+        self._marker_write += 1
+
+    # --- Realtime callback side ---
+
+    def record_status(self, status):
+        if not status:
+            return
+        if status.output_underflow:
+            self.output_underflows += 1
+        if status.output_overflow:
+            self.output_overflows += 1
+        if status.input_underflow:
+            self.input_underflows += 1
+        if status.input_overflow:
+            self.input_overflows += 1
+
+    def record_output(self, played: int, frames: int):
+        """Track gaps in playback from how many samples the output buffer supplied."""
+        if played > 0 and 0 < self._dry_blocks <= self.underrun_resume_blocks:
+            self.playback_underruns += 1
+            self._dry_blocks = 0
+        if played < frames:
+            if self._was_playing:
+                self._dry_blocks = 1
+            elif self._dry_blocks:
+                self._dry_blocks += 1
+        else:
+            self._dry_blocks = 0
+        self._was_playing = played == frames
+
+    def record_capture(self, written: int, frames: int):
+        if written < frames:
+            self.capture_overruns += 1
+            self.capture_dropped_samples += frames - written
+
+    def record_playback(self, read_position: int, now: float):
+        """Resolve markers whose first sample has now been handed to the device."""
+        size = len(self._marker_pos)
+        while self._marker_read < self._marker_write:
+            idx = self._marker_read % size
+            if self._marker_pos[idx] >= read_position:
+                break
+            self._latencies[self._latency_count % len(self._latencies)] = now - self._marker_time[idx]
+            self._latency_count += 1
+            self._marker_read += 1
+
+    def discard_markers(self, read_position: int):
+        """Drop markers for audio that was flushed instead of played."""
+        self._dry_blocks = 0
+        self._was_playing = False
+        size = len(self._marker_pos)
+        while self._marker_read < self._marker_write and \
+                self._marker_pos[self._marker_read % size] < read_position:
+            self._marker_read += 1
+
+    def record_callback(self, duration: float, input_backlog: int):
+        self._callback_times[self.callbacks % len(self._callback_times)] = duration
+        self.callbacks += 1
+        if input_backlog > self.peak_input_backlog:
+            self.peak_input_backlog = input_backlog
+
+    # --- Reader side ---
+
+    def snapshot(self, output_backlog: int, input_backlog: int, sample_rate: int) -> AudioTelemetrySnapshot:
+        callback_times = self._callback_times[:min(self.callbacks, len(self._callback_times))].copy()
+        latencies = self._latencies[:min(self._latency_count, len(self._latencies))].copy()
+        to_ms = 1000.0 / sample_rate
+        return AudioTelemetrySnapshot(
+            callbacks=self.callbacks,
+            output_underflows=self.output_underflows,
+            output_overflows=self.output_overflows,
+            input_underflows=self.input_underflows,
+            input_overflows=self.input_overflows,
+            playback_underruns=self.playback_underruns,
+            capture_overruns=self.capture_overruns,
+            capture_dropped_samples=self.capture_dropped_samples,
+            output_backlog_ms=output_backlog * to_ms,
+            input_backlog_ms=input_backlog * to_ms,
+            peak_input_backlog_ms=self.peak_input_backlog * to_ms,
+            callback_time_us=_summarize(callback_times, 1e6),
+            enqueue_to_play_ms=_summarize(latencies, 1e3),
+        )
@@ -5,14 +5,120 @@ import os
 STT_MODEL_SIZE = "large-v3"
 STT_DEVICE = "auto"
 STT_COMPUTE_TYPE = "float32"
+STT_NUM_WORKERS = 1          # Parallel decode workers on the shared Whisper model
+STT_MAX_BATCH_SIZE = 8       # Utterances from different sessions decoded in one batch
+VAD_BACKEND = "torch"   # "torch" (torch.hub Silero) or "onnx" (ONNX Runtime)
+VAD_NUM_THREADS = 1     # Keep VAD off the cores Whisper and llama.cpp use
+VAD_ONNX_PATH = None    # Defaults to the silero_vad.onnx inside the torch.hub checkout
+STT_UTTERANCE_QUEUE_SIZE = 4 # Utterances waiting for Whisper; oldest is dropped beyond this
+STT_MAX_UTTERANCE_SEC = 30.0 # Capture buffer size; longer speech is force-segmented (Whisper window)
+STT_PREROLL_SEC = 0.32       # Audio kept from before the VAD fired
+STT_STREAMING = True         # Re-decode while the user speaks and emit partial text
+STT_PARTIAL_INTERVAL_SEC = 1.0
+STT_PARTIAL_MIN_SEC = 1.0    # Don't start partial decodes before this much speech
+STT_AGREEMENT_N = 2          # Consecutive hypotheses that must agree before text is committed
+# Adaptive decoding: try tiers in order, escalate only when the result looks unreliable
+STT_DECODE_TIERS = [
+    {"name": "greedy", "beam_size": 1},
+    {"name": "wide", "beam_size": 10},
+]
+STT_MIN_AVG_LOGPROB = -0.7       # Segments below this are "low confidence"
+STT_MAX_COMPRESSION_RATIO = 2.4  # Above this the text is likely a repetition loop
+STT_NO_SPEECH_THRESHOLD = 0.6    # no_speech_prob above this (with low logprob) = silence
+STT_WORD_TIMESTAMPS = False      # Only needed for debugging output
 
 TTS_API_URL = "http://127.0.0.1:5000"
+TTS_API_URLS = [TTS_API_URL]     # Several SBV2 servers -> pooled, least-loaded dispatch with failover
+TTS_PER_ENDPOINT_IN_FLIGHT = 2   # With multiple endpoints, in-flight sentences = this x len(TTS_API_URLS)
+TTS_HEDGE = True                 # Re-send to another server when the first chunk is later than that server's p95
+TTS_FAILURE_THRESHOLD = 2        # Consecutive errors before a server is taken out of rotation
+TTS_HEALTH_INTERVAL = 5.0        # Seconds between active health probes
+TTS_STREAM_CHUNK_BYTES = 8192    # WAV body is decoded/resampled/enqueued per chunk of this size as it downloads
+TTS_CONNECT_TIMEOUT = 3.0        # Seconds
+TTS_READ_TIMEOUT = 30.0          # Seconds between bytes (long sentences take a while to start)
+TTS_SEGMENT_FIRST_MIN_CHARS = 4  # First chunk of a reply may end at a comma once this long (fast first audio)
+TTS_SEGMENT_TARGET_CHARS = 50    # Later chunks gather sentences up to about this length
+TTS_SEGMENT_GROWTH = 2.0         # Each chunk at least this times longer than the previous one
+TTS_SEGMENT_MAX_CHARS = 120      # Hard cap when the LLM produces no punctuation
+TTS_CACHE_MAX_MB = 64            # In-memory LRU of synthesized (already resampled) phrases
+TTS_CACHE_MAX_DISK_MB = 512
+TTS_CACHE_MAX_TEXT_CHARS = 40    # Only short phrases are cached; long LLM sentences rarely repeat
+TTS_PREWARM_PHRASES = [          # Synthesized into the cache at startup
+    "はい。",
+    "わかりました。",
+    "少々お待ちください。",
+    "ありがとうございます。",
+]
+TTS_MAX_IN_FLIGHT = 2            # Sentences synthesized concurrently (playback stays in order)
 AUDIO_SAMPLE_RATE = 16000
+AUDIO_BLOCK_SIZE = 512
+AUDIO_OUTPUT_BUFFER_SECONDS = 60.0 # Playback ring buffer (TTS -> speaker)
+AUDIO_INPUT_BUFFER_SECONDS = 30.0  # Capture ring buffer (mic -> STT)
+# "sounddevice" = live microphone/speaker, "virtual" = replay AUDIO_REPLAY_PATH headlessly
+AUDIO_BACKEND = "sounddevice"
+AUDIO_REPLAY_PATH = None
+AUDIO_REPLAY_SPEED = 1.0 # Realtime factor for the virtual device (None = as fast as possible)
 
-# LLM_REPO_ID / LLM_FILENAME are required by main.py
+# Local GGUF (first shard if split): loaded directly, no Hugging Face hub lookup, works offline.
+# None = download / find LLM_REPO_ID + LLM_FILENAME through the hub
+LLM_MODEL_PATH = None
 LLM_REPO_ID = "Qwen/Qwen3-14B-GGUF"
 LLM_FILENAME = "Qwen3-14B-Q4_K_M.gguf"
 LLM_CONTEXT_SIZE = 8192 * 4
+LLM_N_BATCH = 512         # Logical batch: prompt tokens per decode call
+LLM_N_UBATCH = 512        # Physical batch (compute buffer); <= LLM_N_BATCH
+LLM_N_THREADS = None      # Generation threads (None = llama.cpp default)
+LLM_N_THREADS_BATCH = None # Prompt processing threads (None = llama.cpp default)
+LLM_USE_MMAP = True       # Map the weights: a warm page cache makes restarts take seconds
+LLM_USE_MLOCK = False     # Keep the weights resident (needs RLIMIT_MEMLOCK >= model size)
+LLM_VERBOSE = False       # llama.cpp load/perf logging
+LLM_SPECULATIVE_PREFILL = True # Prefill history + partial transcript while the user is still speaking
+# Speculative decoding: None, "prompt_lookup" (n-grams copied from the prompt, no extra model)
+# or "model" (small draft GGUF with the same tokenizer as LLM_FILENAME)
+LLM_DRAFT = None
+LLM_DRAFT_NUM_PRED_TOKENS = 10  # prompt_lookup: tokens guessed per n-gram match
+LLM_DRAFT_MAX_NGRAM_SIZE = 2    # prompt_lookup: longest n-gram searched for
+LLM_DRAFT_MODEL_PATH = None     # model: local draft GGUF (overrides the repo below)
+LLM_DRAFT_REPO_ID = "Qwen/Qwen3-0.6B-GGUF"
+LLM_DRAFT_FILENAME = "Qwen3-0.6B-Q8_0.gguf"
+LLM_DRAFT_TOKENS = 4            # model: greedy guesses per verification round
+LLM_DRAFT_GPU_LAYERS = -1
+# Drafting needs logits for every token (logits_all): llama-cpp-python then keeps
+# n_ctx x n_vocab x 4 bytes of scores, ~20 GB at 32k context with Qwen's 151936-token
+# vocab, and every saved state (prompt cache, session switch) carries n_tokens x n_vocab
+# x 4 bytes (~0.6 MB per token). With LLM_DRAFT set, the context is capped here (~5 GB).
+LLM_DRAFT_MAX_CONTEXT = 8192
+# Several conversations share the model: after N tokens, at the next sentence end (at the latest
+# after 2N), a generation gives way to waiting ones. Each switch saves and restores the whole
+# KV cache (hundreds of MB at a few thousand tokens), so keep slices long.
+LLM_SCHEDULER_QUANTUM_TOKENS = 128
+LLM_SESSION_POLICY = "queue"    # Utterance during a turn of the same session: "queue" or "preempt"
+LLM_PROMPT_CACHE_RAM_MB = 2048  # KV states keyed by token prefix, LRU; 0 = disabled
+LLM_PROMPT_CACHE_DISK_MB = 8192 # States evicted from RAM (and left at shutdown) spill here
+LLM_PROMPT_CACHE_MIN_TOKENS = 64 # Shorter prompts are cheaper to prefill than to restore
+
+# --- Conversation History ---
+CONVERSATION_TOKEN_BUDGET = LLM_CONTEXT_SIZE // 2  # History incl. system prompt; the rest is tools + answer
+CONVERSATION_EVICT_FRACTION = 0.25  # Over budget: evict whole turns until this share of the budget is free
+CONVERSATION_SUMMARY = True         # Fold evicted turns into a rolling summary (no model call)
+CONVERSATION_SUMMARY_MAX_CHARS = 1500
+
+# --- Tools ---
+# Tools offered per turn, ranked by BM25 over tool names/descriptions (+ TOOL_KEYWORDS);
+# None = every tool's schema is sent with every request
+TOOL_SELECTION_TOP_K = 6
+TOOL_PINNED = []  # Tool names offered on every turn regardless of relevance (none: no match -> every tool)
+# Extra search terms per tool name or MCP server name (the descriptions are English, users speak Japanese)
+TOOL_KEYWORDS = {
+    "windows-mcp": ["アプリ", "起動", "開いて", "閉じて", "クリック", "画面", "ウィンドウ", "入力", "音量"],
+    "brave-search": ["検索", "調べて", "ニュース", "天気", "最新", "ウェブ"],
+    "web-browser": ["ブラウザ", "サイト", "ページ", "スクリーンショット"],
+    "filesystem": ["ファイル", "フォルダ", "保存", "読んで", "書いて"],
+}
+
+# --- Startup ---
+STARTUP_MAX_WORKERS = 4   # Components loaded concurrently (Whisper, VAD, LLM, TTS, MCP)
+STARTUP_WARMUP = True     # Run one throwaway inference per component before opening the mic
 
 # --- Safety ---
 MAX_TOOL_OUTPUT_CHARS = 8000
@@ -20,6 +126,8 @@ MAX_TOOL_OUTPUT_CHARS = 8000
 # --- Paths ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MCP_CONFIG_PATH = os.path.join(BASE_DIR, "mcp", "mcp_config.json")
+TTS_CACHE_DIR = os.path.join(os.path.dirname(BASE_DIR), "cache", "tts")  # None = memory only
+LLM_PROMPT_CACHE_DIR = os.path.join(os.path.dirname(BASE_DIR), "cache", "llm")  # None = RAM only
 
 # --- Persona ---
 SYSTEM_PROMPT = """あなたはWindows操作も可能なSiriや、AlexaのようなチャットAIアシスタント、フータオです。
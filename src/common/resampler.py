@@ -0,0 +1,122 @@
+import functools
+from math import gcd
+
+import numpy as np
+import scipy.signal
+from numpy.lib.stride_tricks import as_strided, sliding_window_view
+
+
+@functools.lru_cache(maxsize=None)
+def _design_polyphase(up: int, down: int):
+    """
+    Design the anti-aliasing FIR for an up/down ratio and split it into `up` phases.
+    Same filter as scipy.signal.resample_poly (Kaiser, beta=5, 10 zero crossings).
+    Cached, so each (src_rate, dst_rate) pair is designed only once per process.
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = scipy.signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * up
+
+    taps = -(-len(h) // up)
+    padded = np.zeros(taps * up)
+    padded[:len(h)] = h
+    # phases[p, j] = h[p + (taps - 1 - j) * up], i.e. each phase reversed so it can be
+    # dotted directly with an ascending window of input samples
+    phases = np.ascontiguousarray(padded.reshape(taps, up).T[:, ::-1], dtype=np.float32)
+    phases.setflags(write=False)
+    return phases, half_len, taps
+
+
+class StreamingResampler:
+    """
+    Rational polyphase resampler that works chunk by chunk.
+
+    Filter history is carried across `process()` calls, so concatenating the
+    outputs of several chunks plus `flush()` equals resampling the whole signal
+    at once (as scipy.signal.resample_poly would).
+    """
+
+    # Below this many outputs per filter phase, the vectorised gather path is used
+    MIN_ROWS_PER_PHASE = 64
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        g = gcd(src_rate, dst_rate)
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.up = dst_rate // g
+        self.down = src_rate // g
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+        self._phases, self._delay, self._taps = _design_polyphase(self.up, self.down)
+        self.reset()
+
+    def reset(self):
+        if self.passthrough:
+            return
+        # Buffer starts with taps-1 zeros standing in for the samples before t=0
+        self._buf = np.zeros(self._taps - 1, dtype=np.float32)
+        self._buf_start = -(self._taps - 1)  # Global input index of self._buf[0]
+        self._in_count = 0
+        self._out_count = 0
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """Feed input samples; returns every output sample that is now fully determined."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self.passthrough:
+            return chunk
+        if len(chunk) == 0:
+            return np.zeros(0, dtype=np.float32)
+        self._buf = np.concatenate((self._buf, chunk))
+        self._in_count += len(chunk)
+        return self._emit()
+
+    def flush(self) -> np.ndarray:
+        """Drain the filter tail and reset for the next stream."""
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+        expected = -(-self._in_count * self.up // self.down)
+        pad = self._delay // self.up + self._taps + 1
+        self._buf = np.concatenate((self._buf, np.zeros(pad, dtype=np.float32)))
+        out = self._emit(limit=expected)
+        self.reset()
+        return out
+
+    def _emit(self, limit: int = None) -> np.ndarray:
+        up, down, delay = self.up, self.down, self._delay
+        end = self._buf_start + len(self._buf)  # Exclusive global input index
+        # Output m needs input index (m*down + delay) // up, which must be < end
+        m_end = (end * up - 1 - delay) // down + 1
+        if limit is not None:
+            m_end = min(m_end, limit)
+        if m_end <= self._out_count:
+            return np.zeros(0, dtype=np.float32)
+
+        count = m_end - self._out_count
+        out = np.empty(count, dtype=np.float32)
+        if count >= up * self.MIN_ROWS_PER_PHASE:
+            # Outputs m and m+up share a filter phase and their input windows are
+            # `down` samples apart, so each phase is one strided matrix-vector product.
+            itemsize = self._buf.itemsize
+            for r in range(up):
+                n = (self._out_count + r) * down + delay
+                first = n // up - (self._taps - 1) - self._buf_start
+                rows = (count - r + up - 1) // up
+                windows = as_strided(self._buf[first:], shape=(rows, self._taps),
+                                     strides=(down * itemsize, itemsize), writeable=False)
+                out[r::up] = windows @ self._phases[n % up]
+        else:
+            # Small chunks: one gather over all outputs beats a Python loop over phases
+            n = np.arange(self._out_count, m_end) * down + delay
+            first = n // up - (self._taps - 1) - self._buf_start
+            windows = sliding_window_view(self._buf, self._taps)[first]
+            out[:] = np.einsum('mj,mj->m', windows, self._phases[n % up])
+
+        self._out_count = m_end
+        # Keep only the history the next output still needs
+        next_base = (m_end * down + delay) // up
+        drop = next_base - (self._taps - 1) - self._buf_start
+        if drop > 0:
+            self._buf = self._buf[drop:]
+            self._buf_start += drop
+        return out
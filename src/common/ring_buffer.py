@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Single-producer / single-consumer ring buffer over a preallocated array.
+
+    The producer only advances the write cursor and the consumer only advances
+    the read cursor, so no lock is needed as long as each side stays on its own
+    thread. Cursors are monotonically increasing sample counts; the storage
+    index is the cursor modulo capacity.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._buf = np.zeros(capacity, dtype=dtype)
+        self._write_pos = 0  # Only touched by the producer
+        self._read_pos = 0   # Only touched by the consumer
+
+    @property
+    def available(self) -> int:
+        """Number of samples ready to be read."""
+        return self._write_pos - self._read_pos
+
+    @property
+    def free(self) -> int:
+        """Number of samples that can be written without overwriting unread data."""
+        return self.capacity - (self._write_pos - self._read_pos)
+
+    @property
+    def write_position(self) -> int:
+        return self._write_pos
+
+    @property
+    def read_position(self) -> int:
+        return self._read_pos
+
+    # --- Producer side ---
+
+    def write(self, data: np.ndarray) -> int:
+        """Copy as much of `data` as fits. Returns the number of samples written."""
+        n = min(len(data), self.free)
+        if n <= 0:
+            return 0
+        start = self._write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = data[:first]
+        if n > first:
+            self._buf[:n - first] = data[first:n]
+        # Publish only after the samples are in place
+        self._write_pos += n
+        return n
+
+    # --- Consumer side ---
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Copy up to len(out) samples into `out`. Returns the number of samples read."""
+        n = min(len(out), self.available)
+        if n <= 0:
+            return 0
+        start = self._read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        if n > first:
+            out[first:n] = self._buf[:n - first]
+        self._read_pos += n
+        return n
+
+    def discard(self, until: int = None) -> int:
+        """
+        Drop readable samples up to write position `until` (everything if None).
+        Returns the number of samples dropped.
+        """
+        end = self._write_pos if until is None else min(until, self._write_pos)
+        n = max(end - self._read_pos, 0)
+        self._read_pos += n
+        return n
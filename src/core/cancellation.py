@@ -0,0 +1,52 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class CancellationToken:
+    """
+    One-shot cancel signal shared by everything working on a turn.
+
+    Long-running work either polls `cancelled` (LLM stopping criteria, the
+    streaming loop) or registers a callback that aborts it (MCP futures,
+    waiters). Callbacks run once, on the thread that calls `cancel()`; one
+    registered after the fact runs immediately.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.cancelled_at: Optional[float] = None  # time.monotonic() of the first cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Cancel callback failed: {e}")
+
+    def add_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
@@ -1,46 +1,173 @@
 
-from typing import List, Dict, Any
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+# Chat-template tokens around each message (<|im_start|>role\n ... <|im_end|>\n)
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+TokenCounter = Callable[[str], int]
+# (evicted messages, previous summary or None) -> new summary
+Summarizer = Callable[[List[Dict[str, Any]], Optional[str]], str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokenizer-free estimate: ~4 ASCII chars per token, ~1 token per CJK char."""
+    if not text:
+        return 0
+    # Non-ASCII chars here are mostly 3-byte UTF-8 (kana/kanji)
+    non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+    ascii_chars = max(0, len(text) - non_ascii)
+    return (ascii_chars + 3) // 4 + non_ascii
+
+
+def summarize_turns(messages: List[Dict[str, Any]], previous: Optional[str] = None,
+                    max_chars: int = 1500, line_chars: int = 120) -> str:
+    """
+    Extractive rolling summary (no model call): one short line per user
+    message and assistant answer, tool outputs left out. The oldest lines are
+    dropped once the summary exceeds `max_chars`.
+    """
+    lines = previous.splitlines() if previous else []
+    for msg in messages:
+        role = msg["role"]
+        content = (msg.get("content") or "").strip().replace("\n", " ")
+        if role == "user" and content:
+            lines.append(f"User: {content[:line_chars]}")
+        elif role == "assistant":
+            if content:
+                lines.append(f"Assistant: {content[:line_chars]}")
+            for tc in msg.get("tool_calls") or []:
+                lines.append(f"Assistant used {tc['function']['name']}")
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
 
 class ConversationManager:
-    """Manages the conversation history for the LLM."""
-    
-    def __init__(self, system_prompt: str, max_history: int = 20):
+    """
+    Manages the conversation history for the LLM.
+
+    History is bounded by a token budget (system prompt included); each
+    message's token count is computed once, when it is added. When the
+    budget is exceeded, whole turns (a user message up to the next one) are
+    evicted oldest first until the history is `evict_fraction` of the budget
+    below it, so the prompt prefix only changes once per block instead of
+    every turn and llama.cpp keeps reusing its KV cache in between. The
+    latest turn is never evicted. With a `summarizer`, evicted turns are
+    folded into a rolling summary kept as a second system message.
+    """
+
+    def __init__(self, system_prompt: str, token_budget: int = 16384, token_counter: TokenCounter = None,
+                 evict_fraction: float = 0.25, summarizer: Summarizer = None):
         self.system_prompt = system_prompt
-        self.max_history = max_history
-        self.history: List[Dict[str, Any]] = [
-            {"role": "system", "content": self.system_prompt}
-        ]
+        self.token_budget = token_budget
+        self.token_counter = token_counter or estimate_tokens
+        self.evict_fraction = evict_fraction
+        self.summarizer = summarizer
+        self.summary: Optional[str] = None
+        self.history: List[Dict[str, Any]] = []
+        self._tokens: List[int] = []  # Token count per history message, same order
+        self.stats: Dict[str, int] = {"evictions": 0, "evicted_messages": 0, "evicted_tokens": 0}
+        self._append({"role": "system", "content": self.system_prompt})
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self._tokens)
+
+    def count_tokens(self, msg: Dict[str, Any]) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.token_counter(msg.get("content") or "")
+        if msg.get("tool_calls"):
+            tokens += self.token_counter(json.dumps(msg["tool_calls"], ensure_ascii=False))
+        return tokens
+
+    def _append(self, msg: Dict[str, Any]):
+        self.history.append(msg)
+        self._tokens.append(self.count_tokens(msg))
 
     def add_user_message(self, content: str):
-        self.history.append({"role": "user", "content": content})
+        self._append({"role": "user", "content": content})
         self._trim_history()
 
     def add_assistant_message(self, content: str = None, tool_calls: List[Dict] = None):
         if not content and not tool_calls:
             return
-            
+
         msg = {"role": "assistant"}
         if content:
             msg["content"] = content
         if tool_calls:
             msg["tool_calls"] = tool_calls
-            
-        self.history.append(msg)
+
+        self._append(msg)
         self._trim_history()
 
     def add_tool_output(self, tool_call_id: str, content: str):
-        self.history.append({
+        self._append({
             "role": "tool",
             "tool_call_id": tool_call_id,
             "content": content
         })
         self._trim_history()
 
+    def revise_last_assistant_message(self, content: str):
+        """Replace the text of the latest assistant message (e.g. with what was heard before a barge-in)."""
+        for i in range(len(self.history) - 1, 0, -1):
+            msg = self.history[i]
+            if msg["role"] != "assistant":
+                continue
+            if content:
+                msg["content"] = content
+            elif msg.get("tool_calls"):
+                msg.pop("content", None)
+            else:
+                del self.history[i]
+                del self._tokens[i]
+                return
+            self._tokens[i] = self.count_tokens(msg)
+            return
+
+    def _first_turn_index(self) -> int:
+        """Index of the first evictable message (after the system prompt and summary)."""
+        return 2 if self.summary is not None else 1
+
     def _trim_history(self):
-        """Keeps the system prompt + last N messages."""
-        if len(self.history) > self.max_history + 1:
-            # Always keep index 0 (System Prompt)
-            self.history = [self.history[0]] + self.history[-self.max_history:]
+        """Evicts whole turns, oldest first, in one block once the token budget is exceeded."""
+        if self.total_tokens <= self.token_budget:
+            return
+        start = self._first_turn_index()
+        turn_starts = [i for i in range(start, len(self.history)) if self.history[i]["role"] == "user"]
+        if len(turn_starts) < 2:
+            return  # Only the current turn is left
+
+        target = self.token_budget * (1 - self.evict_fraction)
+        total = self.total_tokens
+        end = start
+        for next_start in turn_starts[1:]:
+            if total <= target:
+                break
+            total -= sum(self._tokens[end:next_start])
+            end = next_start
+
+        evicted = self.history[start:end]
+        self.stats["evictions"] += 1
+        self.stats["evicted_messages"] += len(evicted)
+        self.stats["evicted_tokens"] += sum(self._tokens[start:end])
+        del self.history[start:end]
+        del self._tokens[start:end]
+
+        if self.summarizer is not None:
+            self._set_summary(self.summarizer(evicted, self.summary))
+
+    def _set_summary(self, summary: str):
+        msg = {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+        if self.summary is not None:
+            self.history[1] = msg
+            self._tokens[1] = self.count_tokens(msg)
+        else:
+            self.history.insert(1, msg)
+            self._tokens.insert(1, self.count_tokens(msg))
+        self.summary = summary
 
     def get_history(self) -> List[Dict[str, Any]]:
         return self.history
@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from src.core.cancellation import CancellationToken
+
+QUEUE = "queue"      # A new utterance waits for the session's running turn to finish
+PREEMPT = "preempt"  # A new utterance stops the session's running turn
+
+_SENTENCE_ENDS = ("。", "！", "？", ".", "!", "?", "\n")
+
+
+@dataclass
+class SessionStats:
+    turns: int = 0
+    preempted: int = 0
+    tokens: int = 0               # Sampled tokens (counted by the LLM), not streamed chunks
+    decode_sec: float = 0.0       # Time holding the model
+    queue_wait_sec: float = 0.0   # Time waiting for the model (initial wait + after each time slice)
+    max_queue_wait_sec: float = 0.0
+    waits: int = 0
+    switches: int = 0             # Time slices given away mid-generation
+    switch_sec: float = 0.0       # Saving + restoring the llama.cpp state for them
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.tokens / self.decode_sec if self.decode_sec > 0 else 0.0
+
+    @property
+    def avg_queue_wait_sec(self) -> float:
+        return self.queue_wait_sec / self.waits if self.waits else 0.0
+
+    @property
+    def avg_switch_sec(self) -> float:
+        return self.switch_sec / self.switches if self.switches else 0.0
+
+
+class Session:
+    """One conversation (its own history) served by the shared model."""
+
+    def __init__(self, session_id: str, conversation):
+        self.session_id = session_id
+        self.conversation = conversation
+        self.stats = SessionStats()
+        # (text, playback handle) per chunk of the last completed answer, which may still be playing
+        self.last_speech: Optional[List] = None
+        self._turn_lock = threading.Lock()
+        self._current: Optional["Turn"] = None
+
+
+class Turn:
+    """One user utterance and everything the assistant does for it."""
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.token = CancellationToken()
+        self.cut_position: Optional[int] = None  # Playback position where a barge-in cut its speech
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    def cancel(self):
+        self.token.cancel()
+
+
+class _Slot:
+    """A generation holding (or waiting for) the model. Passed to LocalLLM.chat_stream."""
+
+    def __init__(self, scheduler: "LLMScheduler", turn: Turn):
+        self.scheduler = scheduler
+        self.turn = turn
+        self.tokens = 0        # Sampled by this generation so far
+        self.slice_start = 0   # self.tokens when the model was (re)acquired
+        self.acquired_at = 0.0
+
+    def count_token(self):
+        """Called by the LLM once per sampled token."""
+        self.tokens += 1
+
+    def should_yield(self, text: str = "") -> bool:
+        """
+        Checked by the LLM after each streamed chunk. A time slice ends at the
+        first sentence end after `quantum_tokens` tokens (at the latest after
+        twice that), and only if another generation is waiting.
+        """
+        quantum = self.scheduler.quantum_tokens
+        used = self.tokens - self.slice_start
+        if used < quantum:
+            return False
+        at_sentence_end = text.endswith("\n") or text.rstrip().endswith(_SENTENCE_ENDS)
+        return (at_sentence_end or used >= 2 * quantum) and self.scheduler._has_waiters()
+
+    def record_switch(self, seconds: float):
+        """Time the LLM spent saving and restoring its state for one slice given away."""
+        stats = self.turn.session.stats
+        stats.switches += 1
+        stats.switch_sec += seconds
+
+    def wait_turn(self) -> bool:
+        """
+        Let every waiting generation run one slice, then continue.
+        Returns False (model not held) if the turn was cancelled meanwhile.
+        """
+        self.scheduler._release(self)
+        return self.scheduler._acquire(self)
+
+
+class LLMScheduler:
+    """
+    Shares one LocalLLM between several conversations.
+
+    - Per session, turns are serialized: with the "queue" policy a new
+      utterance waits for the running turn; with "preempt" it stops it.
+    - Across sessions, generations take turns on the model in FIFO order.
+      After `quantum_tokens` tokens, at the next sentence end, a generation
+      gives way if another one is waiting: LocalLLM saves its llama.cpp state,
+      the others run one slice each, and the state is restored, so a long
+      answer doesn't hold up a short one. A switch copies the whole KV cache
+      twice, so slices are long and end where the speech has a pause anyway.
+    - Metrics: queue wait (time waiting for the model), decode throughput
+      and state switch cost per session.
+    """
+
+    def __init__(self, llm, conversation_factory: Callable[[], Any] = None, quantum_tokens: int = 128,
+                 policy: str = QUEUE):
+        if policy not in (QUEUE, PREEMPT):
+            raise ValueError(f"Unknown session policy: {policy}")
+        self.llm = llm
+        self.conversation_factory = conversation_factory
+        self.quantum_tokens = quantum_tokens
+        self.policy = policy
+
+        self.sessions: Dict[str, Session] = {}
+        self._sessions_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._waiting: Deque[_Slot] = deque()
+        self._owner: Optional[_Slot] = None
+
+    # --- Sessions ---
+
+    def add_session(self, session_id: str, conversation) -> Session:
+        with self._sessions_lock:
+            session = Session(session_id, conversation)
+            self.sessions[session_id] = session
+            return session
+
+    def session(self, session_id: str) -> Session:
+        with self._sessions_lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            if self.conversation_factory is None:
+                raise KeyError(f"Unknown session {session_id!r}")
+            session = self.add_session(session_id, self.conversation_factory())
+        return session
+
+    @contextmanager
+    def turn(self, session_id: str) -> Iterator[Turn]:
+        session = self.session(session_id)
+        if self.policy == PREEMPT:
+            running = session._current
+            if running is not None and not running.cancelled:
+                running.cancel()
+                session.stats.preempted += 1
+        with session._turn_lock:
+            turn = Turn(session)
+            # A generation waiting for the model gives up as soon as its turn is cancelled
+            turn.token.add_callback(self._wake)
+            session._current = turn
+            session.stats.turns += 1
+            try:
+                yield turn
+            finally:
+                session._current = None
+
+    def current_turn(self, session_id: str) -> Optional[Turn]:
+        with self._sessions_lock:
+            session = self.sessions.get(session_id)
+        return session._current if session is not None else None
+
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self._owner is not None or bool(self._waiting)
+
+    # --- Model access ---
+
+    def chat_stream(self, turn: Turn, messages, tools=None):
+        """LocalLLM.chat_stream, run when this generation's turn on the model comes."""
+        slot = _Slot(self, turn)
+        if not self._acquire(slot):
+            return
+        stream = self.llm.chat_stream(messages, tools=tools, slot=slot, cancel=turn.token)
+        try:
+            for item in stream:
+                if turn.cancelled:
+                    return
+                yield item
+        finally:
+            stream.close()  # Releases the LLM before the next generation gets the model
+            self._release(slot)
+
+    def _has_waiters(self) -> bool:
+        with self._cond:
+            return bool(self._waiting)
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _acquire(self, slot: _Slot) -> bool:
+        start = time.monotonic()
+        with self._cond:
+            self._waiting.append(slot)
+            while self._owner is not None or self._waiting[0] is not slot:
+                if slot.turn.cancelled:
+                    self._waiting.remove(slot)
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait()
+            self._waiting.popleft()
+            self._owner = slot
+        now = time.monotonic()
+        stats = slot.turn.session.stats
+        wait = now - start
+        stats.queue_wait_sec += wait
+        stats.max_queue_wait_sec = max(stats.max_queue_wait_sec, wait)
+        stats.waits += 1
+        slot.slice_start = slot.tokens
+        slot.acquired_at = now
+        return True
+
+    def _release(self, slot: _Slot):
+        with self._cond:
+            if self._owner is not slot:
+                return
+            self._owner = None
+            stats = slot.turn.session.stats
+            stats.decode_sec += time.monotonic() - slot.acquired_at
+            stats.tokens += slot.tokens - slot.slice_start
+            self._cond.notify_all()
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        with self._sessions_lock:
+            sessions = list(self.sessions.values())
+        return [{
+            "session": s.session_id,
+            "turns": s.stats.turns,
+            "preempted": s.stats.preempted,
+            "tokens": s.stats.tokens,
+            "tokens_per_sec": round(s.stats.tokens_per_sec, 1),
+            "avg_queue_wait_sec": round(s.stats.avg_queue_wait_sec, 3),
+            "max_queue_wait_sec": round(s.stats.max_queue_wait_sec, 3),
+            "switches": s.stats.switches,
+            "avg_switch_ms": round(s.stats.avg_switch_sec * 1000, 1),
+        } for s in sessions]
@@ -0,0 +1,183 @@
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+STRONG = "strong"  # End of sentence
+WEAK = "weak"      # Clause break (comma etc.)
+
+_FULLWIDTH_ENDS = "。！？\n"
+_ASCII_ENDS = ".!?"
+_FULLWIDTH_WEAK = "、，；："
+_ASCII_WEAK = ",;:"
+# Attached to the chunk they follow: 「…。」 / "...!" / (…？)
+_CLOSERS = "」』）)]】〕\"'”’"
+_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "inc", "ltd", "co",
+    "no", "fig", "e.g", "i.e", "a.m", "p.m", "u.s", "u.k", "approx",
+}
+_URL_START = re.compile(r"(?:[a-z][a-z0-9+.-]*://|www\.|[^\s@]+@)", re.IGNORECASE)
+
+
+@dataclass
+class SegmenterPolicy:
+    first_min_chars: int = 4   # First chunk may end at a clause break once it has this many chars
+    target_chars: int = 50     # Later chunks gather whole sentences until at least this long
+    growth: float = 2.0        # Each chunk's minimum is this times the previous chunk (capped at target)
+    max_chars: int = 120       # Hard cap; cut at the last clause break / space before this
+
+
+class SentenceSegmenter:
+    """
+    Turns a stream of LLM text deltas into chunks for TTS.
+
+    The first chunk of a response is cut as early as possible (first sentence
+    end, or first clause break once `first_min_chars` long) to minimise
+    time-to-first-audio. Later chunks gather whole sentences, each at least
+    `growth` times the previous one, up to `target_chars`: the next chunk is
+    synthesized while the previous one plays, and longer chunks give the TTS
+    fewer requests and more natural prosody. Dots inside
+    numbers ("3.14"), versions ("v1.2"), abbreviations ("e.g.", "Mr.") and
+    URLs are never boundaries. Boundary characters that need to see what
+    follows them (closing quotes, digits) are decided one delta later.
+    """
+
+    def __init__(self, policy: SegmenterPolicy = None):
+        self.policy = policy or SegmenterPolicy()
+        self.reset()
+
+    def reset(self):
+        self._buf = ""
+        self._scan = 0  # Next index to classify
+        self._boundaries: List[Tuple[int, str]] = []  # (end offset, kind) within _buf
+        self._emitted_any = False
+        self._min_chars = 0  # Minimum length of the next (non-first) chunk
+
+    def feed(self, delta: str) -> List[str]:
+        """Add streamed text; returns the chunks that are ready to speak."""
+        self._buf += delta
+        self._classify(final=False)
+        return self._take_chunks()
+
+    def flush(self) -> List[str]:
+        """End of the response: everything left is spoken."""
+        self._classify(final=True)
+        chunks = self._take_chunks()
+        rest = self._buf.strip()
+        if rest:
+            chunks.append(rest)
+        self.reset()
+        return chunks
+
+    # --- Boundary detection ---
+
+    def _classify(self, final: bool):
+        buf = self._buf
+        n = len(buf)
+        i = self._scan
+        while i < n:
+            c = buf[i]
+            if c in _FULLWIDTH_ENDS:
+                end = self._extend(i + 1)
+                if end == n and not final:
+                    break  # A closing quote may still follow
+                self._boundaries.append((end, STRONG))
+                i = end
+                continue
+
+            if c in _FULLWIDTH_WEAK:
+                self._boundaries.append((i + 1, WEAK))
+                i += 1
+                continue
+
+            if c in _ASCII_ENDS or c in _ASCII_WEAK:
+                if i + 1 == n and not final:
+                    break  # Need the next character to decide ("3." vs "3.14")
+                kind = self._ascii_boundary(i)
+                if kind is not None:
+                    end = self._extend(i + 1) if kind == STRONG else i + 1
+                    if end == n and not final and kind == STRONG:
+                        break
+                    self._boundaries.append((end, kind))
+                    i = end
+                    continue
+            i += 1
+        self._scan = i
+
+    def _extend(self, end: int) -> int:
+        """Swallow repeated end marks ("?!", "...") and closing quotes/brackets."""
+        buf = self._buf
+        while end < len(buf) and (buf[end] in _CLOSERS or buf[end] in _ASCII_ENDS or buf[end] in "。！？"):
+            end += 1
+        return end
+
+    def _ascii_boundary(self, i: int):
+        buf = self._buf
+        c = buf[i]
+        prev = buf[i - 1] if i > 0 else ""
+        nxt = buf[i + 1] if i + 1 < len(buf) else ""
+
+        if self._in_url(i):
+            return None
+        if prev.isdigit() and nxt.isdigit():
+            return None  # 3.14 / 1,000 / 10:30
+        if nxt and nxt.isascii() and not nxt.isspace() and nxt not in _CLOSERS and nxt not in _ASCII_ENDS:
+            return None  # v1.2, example.com, "a,b": ASCII punctuation needs a space (or Japanese) after it
+        if c == "." and self._is_abbreviation(i):
+            return None
+        return STRONG if c in _ASCII_ENDS else WEAK
+
+    def _in_url(self, i: int) -> bool:
+        buf = self._buf
+        start = i
+        while start > 0 and buf[start - 1].isascii() and not buf[start - 1].isspace():
+            start -= 1
+        return bool(_URL_START.match(buf, start, i))
+
+    def _is_abbreviation(self, i: int) -> bool:
+        buf = self._buf
+        start = i
+        while start > 0 and (buf[start - 1].isascii() and (buf[start - 1].isalpha() or buf[start - 1] == ".")):
+            start -= 1
+        word = buf[start:i]
+        if not word:
+            return False
+        return word.lower() in _ABBREVIATIONS or (len(word) == 1 and word.isupper())  # Initials: "J. Smith"
+
+    # --- Chunking policy ---
+
+    def _choose_cut(self) -> int:
+        policy = self.policy
+        if not self._emitted_any:
+            for end, kind in self._boundaries:
+                text = self._buf[:end].strip()
+                if text and (kind == STRONG or len(text) >= policy.first_min_chars):
+                    return end
+        else:
+            for end, kind in self._boundaries:
+                if kind == STRONG and end >= self._min_chars:
+                    return end
+
+        if len(self._buf) >= policy.max_chars:
+            strong = [end for end, kind in self._boundaries if kind == STRONG]
+            if strong:
+                return strong[-1]
+            if self._boundaries:
+                return self._boundaries[-1][0]
+            space = self._buf.rfind(" ", 0, policy.max_chars)
+            return space + 1 if space > 0 else policy.max_chars
+        return 0
+
+    def _take_chunks(self) -> List[str]:
+        chunks = []
+        while True:
+            cut = self._choose_cut()
+            if cut <= 0:
+                return chunks
+            chunk = self._buf[:cut].strip()
+            self._buf = self._buf[cut:]
+            self._scan = max(0, self._scan - cut)
+            self._boundaries = [(end - cut, kind) for end, kind in self._boundaries if end > cut]
+            if chunk:
+                chunks.append(chunk)
+                self._emitted_any = True
+                self._min_chars = min(self.policy.target_chars, int(len(chunk) * self.policy.growth))
@@ -0,0 +1,138 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class StartupError(RuntimeError):
+    """A required component failed to load."""
+
+
+@dataclass
+class ComponentTiming:
+    name: str
+    load_sec: float = 0.0
+    warmup_sec: float = 0.0
+    error: Optional[str] = None
+    warmup_error: Optional[str] = None
+    skipped: bool = False
+
+
+@dataclass
+class _Component:
+    name: str
+    load: Callable[..., Any]
+    warmup: Optional[Callable[[Any], None]]
+    depends_on: Sequence[str]
+    required: bool
+    timing: ComponentTiming = field(init=False)
+
+    def __post_init__(self):
+        self.timing = ComponentTiming(self.name)
+
+
+class StartupOrchestrator:
+    """
+    Loads independent components concurrently, then warms each one up.
+
+    A component's loader receives the loaded dependencies named in
+    `depends_on` as positional arguments and only starts once they are ready
+    (warmed up included). The optional warmup runs right after the load on the
+    same worker, so the first real request doesn't pay lazy-init costs; a
+    failed warmup is reported but not fatal. A failed optional component
+    resolves to None and its dependents are skipped; a failed required
+    component makes `run()` raise StartupError.
+    """
+
+    def __init__(self, max_workers: int = 4, warmup: bool = True):
+        self.max_workers = max_workers
+        self.warmup_enabled = warmup
+        self._components: Dict[str, _Component] = {}
+        self.components: Dict[str, Any] = {}
+        self.total_sec = 0.0
+
+    def add(self, name: str, load: Callable[..., Any], warmup: Optional[Callable[[Any], None]] = None,
+            depends_on: Sequence[str] = (), required: bool = True):
+        if name in self._components:
+            raise ValueError(f"Component {name!r} already registered")
+        for dep in depends_on:
+            if dep not in self._components:
+                raise ValueError(f"{name!r} depends on unknown component {dep!r}")
+        self._components[name] = _Component(name, load, warmup, tuple(depends_on), required)
+
+    @property
+    def timings(self) -> List[ComponentTiming]:
+        return [c.timing for c in self._components.values()]
+
+    def _load(self, component: _Component) -> Any:
+        args = [self.components[dep] for dep in component.depends_on]
+        t0 = time.perf_counter()
+        instance = component.load(*args)
+        component.timing.load_sec = time.perf_counter() - t0
+
+        if component.warmup is not None and self.warmup_enabled and instance is not None:
+            t0 = time.perf_counter()
+            try:
+                component.warmup(instance)
+            except Exception as e:
+                # Still usable; the first real request just pays the cold-start cost
+                component.timing.warmup_error = str(e)
+                print(f"⚠️ Warmup failed for {component.name}: {e}")
+            component.timing.warmup_sec = time.perf_counter() - t0
+        return instance
+
+    def run(self) -> Dict[str, Any]:
+        """Load everything; returns {name: instance}."""
+        start = time.perf_counter()
+        pending = dict(self._components)
+        running: Dict[Future, _Component] = {}
+        failures: List[str] = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="startup") as pool:
+            while pending or running:
+                # Submit everything whose dependencies are resolved
+                for name, component in list(pending.items()):
+                    if not all(dep in self.components for dep in component.depends_on):
+                        continue  # Still loading
+                    del pending[name]
+                    if any(self.components.get(dep) is None for dep in component.depends_on):
+                        component.timing.skipped = True
+                        self.components[name] = None
+                        print(f"⏭️ Skipping {name} (dependency unavailable)")
+                        if component.required:
+                            failures.append(f"{name}: dependency unavailable")
+                        continue
+                    running[pool.submit(self._load, component)] = component
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    component = running.pop(future)
+                    try:
+                        self.components[component.name] = future.result()
+                    except Exception as e:
+                        component.timing.error = str(e)
+                        self.components[component.name] = None
+                        print(f"❌ Failed to load {component.name}: {e}")
+                        if component.required:
+                            failures.append(f"{component.name}: {e}")
+
+        self.total_sec = time.perf_counter() - start
+        if failures:
+            raise StartupError("; ".join(failures))
+        return self.components
+
+    def report(self) -> str:
+        lines = [f"⏱️ Startup {self.total_sec:.2f}s"]
+        for t in self.timings:
+            if t.skipped:
+                status = "skipped"
+            elif t.error:
+                status = f"failed ({t.error})"
+            else:
+                status = f"load {t.load_sec:.2f}s, warmup {t.warmup_sec:.2f}s"
+                if t.warmup_error:
+                    status += f" (warmup failed: {t.warmup_error})"
+            lines.append(f"   - {t.name}: {status}")
+        return "\n".join(lines)
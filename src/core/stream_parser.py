@@ -0,0 +1,88 @@
+from typing import Dict, List, NamedTuple
+
+TEXT = "text"            # Speakable answer text
+THINK = "think"          # Reasoning inside <think>...</think>
+TOOL_CALL = "tool_call"  # Body of one complete <tool_call>...</tool_call> (JSON)
+
+# Tags that end each state, and the state they lead to
+_TRANSITIONS: Dict[str, Dict[str, str]] = {
+    TEXT: {"<think>": THINK, "<tool_call>": TOOL_CALL},
+    THINK: {"</think>": TEXT},
+    TOOL_CALL: {"</tool_call>": TEXT},
+}
+
+
+class StreamEvent(NamedTuple):
+    kind: str
+    text: str
+
+
+class TagStreamParser:
+    """
+    Incremental parser for LLM output containing <think> and <tool_call> blocks.
+
+    Each delta is scanned once. The only text held back between deltas is a
+    possible partial tag at the end (at most len("</tool_call>") - 1 chars),
+    plus the body of an open <tool_call>, which is only useful complete.
+    `feed()` returns events in stream order; consecutive text of the same
+    kind within one delta is merged into one event.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.state = TEXT
+        self._pending = ""    # Possible partial tag carried over to the next delta
+        self._tool_body = []  # Fragments of the open <tool_call>
+
+    def feed(self, delta: str) -> List[StreamEvent]:
+        events: List[StreamEvent] = []
+        buf = self._pending + delta if self._pending else delta
+        self._pending = ""
+        i = 0
+        n = len(buf)
+        while i < n:
+            j = buf.find("<", i)
+            if j < 0:
+                self._emit(events, buf[i:])
+                break
+            tags = _TRANSITIONS[self.state]
+            tag = next((t for t in tags if buf.startswith(t, j)), None)
+            if tag is not None:
+                self._emit(events, buf[i:j])
+                self._enter(events, tags[tag])
+                i = j + len(tag)
+                continue
+            tail = buf[j:]
+            if any(len(tail) < len(t) and t.startswith(tail) for t in tags):
+                # Undecidable until more text arrives
+                self._emit(events, buf[i:j])
+                self._pending = tail
+                break
+            self._emit(events, buf[i:j + 1])
+            i = j + 1
+        return events
+
+    def flush(self) -> List[StreamEvent]:
+        """End of the response. An unterminated <tool_call> is dropped."""
+        events: List[StreamEvent] = []
+        self._emit(events, self._pending)
+        self.reset()
+        return events
+
+    def _emit(self, events: List[StreamEvent], text: str):
+        if not text:
+            return
+        if self.state == TOOL_CALL:
+            self._tool_body.append(text)
+        elif events and events[-1].kind == self.state:
+            events[-1] = StreamEvent(self.state, events[-1].text + text)
+        else:
+            events.append(StreamEvent(self.state, text))
+
+    def _enter(self, events: List[StreamEvent], state: str):
+        if self.state == TOOL_CALL:
+            events.append(StreamEvent(TOOL_CALL, "".join(self._tool_body)))
+            self._tool_body = []
+        self.state = state
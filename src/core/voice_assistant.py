@@ -2,148 +2,240 @@
 import threading
 import json
 import time
-import re
 from typing import Optional, List, Dict
 
+from src.core.cancellation import CancellationToken
 from src.core.conversation import ConversationManager
+from src.core.scheduler import LLMScheduler
+from src.core.sentence_segmenter import SegmenterPolicy, SentenceSegmenter
+from src.core.stream_parser import TEXT, TOOL_CALL, StreamEvent, TagStreamParser
 from src.mcp.mcp_client import MCPClient
 
 class VoiceAssistant:
-    def __init__(self, llm, tts, mcp_client: MCPClient, conversation_manager: ConversationManager):
+    DEFAULT_SESSION = "local"
+
+    def __init__(self, llm, tts, mcp_client: MCPClient, conversation_manager: ConversationManager,
+                 speculative_prefill: bool = True, segmenter_policy: SegmenterPolicy = None,
+                 scheduler: LLMScheduler = None):
         self.llm = llm
         self.tts = tts
         self.mcp_client = mcp_client
+        # History of the local (microphone) session; other sessions get their own from the scheduler
         self.conversation = conversation_manager
-        self.lock = threading.Lock()
+        self.scheduler = scheduler or LLMScheduler(llm)
+        self.scheduler.add_session(self.DEFAULT_SESSION, conversation_manager)
+        self.last_interrupt_latency: Optional[float] = None
+        # How streamed text is cut into TTS requests (short first chunk, then longer ones)
+        self.segmenter_policy = segmenter_policy or SegmenterPolicy()
         
         # Cache tools definition for LLM
         self.tools_def = self.mcp_client.list_tools()
+        # With a tool index, each turn is offered only the tools relevant to it
+        self.tool_index = getattr(mcp_client, "tool_index", None)
+        self._session_tools: Dict[str, List[Dict]] = {}  # Last selection per session (kept when still valid)
+
+        # Speculative prefill: latest partial transcript, consumed by a background thread
+        self.speculative_prefill = speculative_prefill and hasattr(llm, "prefill")
+        self._speculation_text: Optional[str] = None
+        self._speculation_event = threading.Event()
+        self._speculation_thread: Optional[threading.Thread] = None
 
-    def process_input(self, text: str):
+    def speculate(self, partial_text: str):
         """
-        Main entry point for processing user voice input.
-        Thread-safe execution of the conversation loop.
+        Called with the stable prefix of a transcript that is still being spoken.
+        Prefills history + partial user turn into the LLM's KV cache in the background
+        so that only the tail needs evaluating once the final text arrives.
         """
-        if not text.strip():
+        if not self.speculative_prefill or not partial_text.strip():
             return
+        if self.scheduler.busy:
+            return  # A turn is generating; the model is busy anyway
 
-        # Acquire lock to prevent interleaved conversations
-        if not self.lock.acquire(blocking=False):
-            print("⚠️ Busy processing another request.")
+        self._speculation_text = partial_text
+        if self._speculation_thread is None:
+            self._speculation_thread = threading.Thread(target=self._speculation_worker, daemon=True)
+            self._speculation_thread.start()
+        self._speculation_event.set()
+
+    def _speculation_worker(self):
+        while True:
+            self._speculation_event.wait()
+            self._speculation_event.clear()
+            text = self._speculation_text
+            if not text or self.scheduler.busy:
+                continue
+
+            messages = list(self.conversation.get_history()) + [{"role": "user", "content": text}]
+            try:
+                tools = self._select_tools(self.DEFAULT_SESSION, text, commit=False)
+                evaluated = self.llm.prefill(messages, tools=tools)
+                if evaluated:
+                    print(f"⚡ Speculative prefill: {evaluated} tokens")
+            except Exception as e:
+                print(f"⚠️ Speculative prefill failed: {e}")
+
+    def process_input(self, text: str, session_id: str = DEFAULT_SESSION):
+        """
+        Main entry point for processing user voice input.
+        Thread-safe: an utterance arriving during a turn of the same session is
+        queued (or preempts it, per the scheduler policy); other sessions share
+        the model with it.
+        """
+        if not text.strip():
             return
 
         try:
-            print(f"🤔 AI考え中... User: {text}")
-            self.conversation.add_user_message(text)
-            self._run_conversation_loop()
+            with self.scheduler.turn(session_id) as turn:
+                print(f"🤔 AI考え中... User: {text}")
+                turn.session.conversation.add_user_message(text)
+                turn.session.last_speech = None
+                self._run_conversation_loop(turn, self._select_tools(session_id, text))
+                if not turn.cancelled:
+                    # speak() only queues; the turn ends once all of its speech has reached AudioIO
+                    self.tts.flush()
+                    if turn.cancelled:
+                        # Barge-in while the complete answer was being queued: it is already in history
+                        self._trim_to_heard(turn.session, turn.cut_position)
+                if turn.cancelled:
+                    # Drop anything spoken between the interrupt and the loop noticing it.
+                    # Still inside the turn, so the next queued turn's speech is not dropped.
+                    self.tts.cancel()
+                    self.last_interrupt_latency = time.monotonic() - turn.token.cancelled_at
+                    print(f"⏱️ Interrupt -> idle: {self.last_interrupt_latency * 1000:.0f}ms")
         except Exception as e:
             print(f"❌ Error during processing: {e}")
             import traceback
             traceback.print_exc()
-        finally:
-            self.lock.release()
 
-    def _run_conversation_loop(self):
+    def interrupt(self, session_id: str = DEFAULT_SESSION):
+        """
+        Barge-in: stop playback and cancel the session's turn everywhere (LLM
+        generation, queued and in-flight TTS, pending tool calls). History keeps
+        only the sentences the user heard in full.
+        """
+        cut = self.tts.interrupt()
+        turn = self.scheduler.current_turn(session_id)
+        if turn is not None and not turn.cancelled:
+            turn.cut_position = cut
+            turn.cancel()
+        else:
+            # The answer was complete but still playing
+            session = self.scheduler.sessions.get(session_id)
+            if session is not None:
+                self._trim_to_heard(session, cut)
+
+    def _heard_text(self, speech: List, cut_position) -> str:
+        heard = ""
+        for text, handle in speech:
+            if not self.tts.was_heard(handle, cut_position):
+                break
+            heard += text
+        return heard
+
+    def _trim_to_heard(self, session, cut_position):
+        speech, session.last_speech = session.last_speech, None
+        if speech is None or cut_position is None:
+            return
+        heard = self._heard_text(speech, cut_position)
+        if heard != "".join(text for text, _ in speech):
+            session.conversation.revise_last_assistant_message(heard)
+            print(f"✂️ Recorded only what was heard: {heard!r}")
+
+    def _select_tools(self, session_id: str, text: str, commit: bool = True) -> Optional[List[Dict]]:
+        """Tools offered to the LLM for this utterance (None = no tools)."""
+        if self.tool_index is None:
+            return self.tools_def if self.tools_def else None
+        selected = self.tool_index.select(text, self._session_tools.get(session_id), record=commit)
+        if commit:
+            self._session_tools[session_id] = selected
+        return selected or None
+
+    def _run_conversation_loop(self, turn, tools: Optional[List[Dict]] = None):
         """
         Executes the LLM -> Tool -> LLM loop.
+        The same tools are offered on every round of the turn.
         """
-        while True:
+        conversation = turn.session.conversation
+        while not turn.cancelled:
             print(f"🤖 AI Answer: ", end="", flush=True)
             
             content_buffer = ""
             tool_calls_buffer = []
+            speech = []  # (text, handle) per chunk sent to TTS
             
-            # State for parsing explicit <tool_call> tags (Qwen-style)
-            # and <think> tags (Reasoning models)
-            stream_buffer = ""
-            in_tool_tag = False
-            in_think_tag = False
+            # <think> blocks are dropped, Qwen-style <tool_call> blocks parsed
+            parser = TagStreamParser()
+            segmenter = SentenceSegmenter(self.segmenter_policy)
             
             # Get generator from LLM
-            history = self.conversation.get_history()
+            history = conversation.get_history()
             start_time = time.time()
             first_token_received = False
             
-            stream_gen = self.llm.chat_stream(history, tools=self.tools_def if self.tools_def else None)
+            stream_gen = self.scheduler.chat_stream(turn, history, tools=tools)
 
             for type_, data in stream_gen:
                 if type_ == "content":
-                    # [DEBUG] Print data only if not just whitespace to reduce noise, or keep raw
-                    # print(f"[RAW]: {repr(data)}") 
-                    
                     if not first_token_received:
                         ttft = time.time() - start_time
                         print(f" (LLM First Token: {ttft:.2f}s)")
                         first_token_received = True
 
-                    stream_buffer += data
-                    
-                    # --- Think Tag Filtering ---
-                    if "<think>" in stream_buffer:
-                        in_think_tag = True
-                    
-                    if in_think_tag:
-                        if "</think>" in stream_buffer:
-                            # Remove thought block completely
-                            stream_buffer = re.sub(r'<think>.*?</think>', '', stream_buffer, flags=re.DOTALL)
-                            in_think_tag = False
-                        else:
-                            # Still in thought, keep buffering (do NOT output)
-                            continue
-
-                    # --- Qwen/XML Tool Call Parsing Logic ---
-                    if "<tool_call>" in stream_buffer:
-                        in_tool_tag = True
-                    
-                    if in_tool_tag:
-                        if "</tool_call>" in stream_buffer:
-                            # 1. Extract and Parse Tool Calls
-                            tool_blocks = re.findall(r'<tool_call>(.*?)</tool_call>', stream_buffer, re.DOTALL)
-                            for block in tool_blocks:
-                                self._parse_and_buffer_tool_call(block, tool_calls_buffer)
-                            
-                            # 2. Extract Text Content (remove tool calls)
-                            text_part = re.sub(r'<tool_call>.*?</tool_call>', '', stream_buffer, flags=re.DOTALL)
-                            if text_part.strip():
-                                print(text_part, end="", flush=True)
-                                self.tts.speak(text_part, lang="en-us")
-                                content_buffer += text_part
-                            
-                            # 3. Reset Buffer
-                            stream_buffer = ""
-                            in_tool_tag = False
-                    else:
-                        # Encapsulate partial tag check
-                        if not self._is_partial_tag(stream_buffer):
-                            if stream_buffer: # Allow whitespace for spacing in console, but TTS handles strip check
-                                print(stream_buffer, end="", flush=True)
-                                self.tts.speak(stream_buffer, lang="en-us")
-                                content_buffer += stream_buffer
-                            stream_buffer = "" # Consumed
+                    content_buffer += self._handle_events(parser.feed(data), segmenter, tool_calls_buffer, speech)
                 
                 elif type_ == "tool_calls":
                     tool_calls_buffer.extend(data)
 
-            # Flush remaining buffer
-            if stream_buffer and not in_tool_tag and not in_think_tag:
-                 if stream_buffer:
-                    print(stream_buffer, end="", flush=True)
-                    self.tts.speak(stream_buffer, lang="en-us")
-                    content_buffer += stream_buffer
+            if turn.cancelled:
+                # Barge-in: keep what was heard; nothing else is spoken or called
+                print("")
+                heard = self._heard_text(speech, turn.cut_position)
+                if heard:
+                    conversation.add_assistant_message(content=heard)
+                break
+
+            # Flush remaining buffer (a partial tag that never completed is plain text)
+            content_buffer += self._handle_events(parser.flush(), segmenter, tool_calls_buffer, speech)
+            self._speak_chunks(segmenter.flush(), speech)
 
             print("") # End of line
 
             # Record interaction in history
             has_tool_call = len(tool_calls_buffer) > 0
             if content_buffer or has_tool_call:
-                self.conversation.add_assistant_message(content=content_buffer, tool_calls=tool_calls_buffer)
+                conversation.add_assistant_message(content=content_buffer, tool_calls=tool_calls_buffer)
 
             # Exit loop if no tools to call
             if not has_tool_call:
+                # Playback may outlast the turn; a later barge-in trims this message
+                turn.session.last_speech = speech
                 break
 
+            if self.tool_index is not None:
+                for tc in tool_calls_buffer:
+                    self.tool_index.record_call(tc["function"]["name"], tools or [])
+
             # Execute Tools
-            self._execute_tool_calls(tool_calls_buffer)
+            self._execute_tool_calls(tool_calls_buffer, conversation, turn.token)
+
+    def _handle_events(self, events: List[StreamEvent], segmenter: SentenceSegmenter,
+                       tool_calls_buffer: List[Dict], speech: List = None) -> str:
+        """Speak text events, buffer tool calls, drop reasoning. Returns the spoken text."""
+        spoken = ""
+        for kind, text in events:
+            if kind == TEXT:
+                print(text, end="", flush=True)
+                self._speak_chunks(segmenter.feed(text), speech)
+                spoken += text
+            elif kind == TOOL_CALL:
+                self._parse_and_buffer_tool_call(text, tool_calls_buffer)
+        return spoken
+
+    def _speak_chunks(self, chunks: List[str], speech: List = None):
+        for chunk in chunks:
+            handle = self.tts.speak(chunk, lang="en-us")
+            if speech is not None:
+                speech.append((chunk, handle))
 
     def _parse_and_buffer_tool_call(self, json_block: str, buffer: List[Dict]) -> bool:
         try:
@@ -166,24 +258,8 @@ class VoiceAssistant:
             print(f"❌ JSON Parse Error: {e} | Block: {repr(json_block)}")
             return False
 
-    def _is_partial_tag(self, text: str) -> bool:
-        """Check if text ends with a partial start tag (<, <tool, <think, etc)"""
-        if not text:
-            return False
-        # Check for start of tool_call or think
-        return (
-            text.endswith("<") or 
-            text.endswith("<t") or 
-            text.endswith("<to") or 
-            text.endswith("<too") or 
-            text.endswith("<tool") or
-            text.endswith("<th") or
-            text.endswith("<thi") or
-            text.endswith("<thin") or
-            text.endswith("<think")
-        )
-
-    def _execute_tool_calls(self, tool_calls: List[Dict]):
+    def _execute_tool_calls(self, tool_calls: List[Dict], conversation: ConversationManager = None,
+                            cancel: CancellationToken = None):
         # Late import to avoid circular dependency if any (though usually safe here)
         from src.common import config as cfg
         
@@ -195,8 +271,12 @@ class VoiceAssistant:
             print(f"\n🛠️ Calling Tool: {fn_name} args={args_str}")
             
             try:
-                args = json.loads(args_str)
-                result_text = self.mcp_client.call_tool(fn_name, args)
+                if cancel is not None and cancel.cancelled:
+                    # Every tool call still needs an output message
+                    result_text = "Error: Cancelled by the user."
+                else:
+                    args = json.loads(args_str)
+                    result_text = self.mcp_client.call_tool(fn_name, args, cancel=cancel)
             except Exception as e:
                 result_text = f"Error: {e}"
             
@@ -209,4 +289,4 @@ class VoiceAssistant:
                 
             print(f"   -> Result: {text_str[:100]}...")
             
-            self.conversation.add_tool_output(call_id, text_str)
+            (conversation or self.conversation).add_tool_output(call_id, text_str)
@@ -0,0 +1,37 @@
+import os
+import struct
+from typing import NamedTuple
+
+GGUF_MAGIC = b"GGUF"
+SUPPORTED_VERSIONS = (2, 3)
+# magic, version (uint32), tensor count (uint64), metadata key/value count (uint64)
+_HEADER = struct.Struct("<4sIQQ")
+
+
+class GGUFHeader(NamedTuple):
+    version: int
+    n_tensors: int
+    n_kv: int
+    file_size: int
+
+
+def read_gguf_header(path: str) -> GGUFHeader:
+    """
+    Cheap sanity check of a local GGUF file: reads the fixed 24-byte header
+    only (no metadata parsing, no page-in of the weights). Raises
+    FileNotFoundError for a missing file and ValueError for anything that
+    is not a usable GGUF (truncated download, HTML error page, old format).
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Model file not found: {path}")
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"{path} is too small to be a GGUF file ({file_size} bytes)")
+    magic, version, n_tensors, n_kv = _HEADER.unpack(raw)
+    if magic != GGUF_MAGIC:
+        raise ValueError(f"{path} is not a GGUF file (magic {magic!r})")
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"{path} has unsupported GGUF version {version}")
+    return GGUFHeader(version, n_tensors, n_kv, file_size)
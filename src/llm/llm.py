@@ -1,51 +1,271 @@
 import os
-from llama_cpp import Llama
+import threading
+import time
+import numpy as np
+from llama_cpp import Llama, LogitsProcessorList, llama_chat_format
+from src.core.sentence_segmenter import SentenceSegmenter
+from src.llm.gguf import read_gguf_header
+from src.llm.prompt_cache import PromptCache
+from src.llm.speculative import MeteredDraftModel
 
 class LocalLLM:
-    def __init__(self, model_path: str = None, repo_id: str = None, filename: str = None, context_size: int = 512, gpu_layers: int = -1):
-        source = repo_id if repo_id else model_path
+    def __init__(self, model_path: str = None, repo_id: str = None, filename: str = None, context_size: int = 512, gpu_layers: int = -1,
+                 prompt_cache: PromptCache = None, draft_model=None, n_batch: int = 512, n_ubatch: int = 512,
+                 n_threads: int = None, n_threads_batch: int = None, use_mmap: bool = True, use_mlock: bool = False,
+                 verbose: bool = False):
+        """
+        model_path: local GGUF (first shard of a split model), loaded directly with
+        no Hugging Face hub resolution, so it works offline. Takes precedence over
+        repo_id/filename, which download (or find in the hub cache) via from_pretrained.
+        """
+        source = model_path if model_path else f"{repo_id}/{filename}"
         print(f"🧠 LLM Loading... ({source})")
+        start_time = time.time()
         
         # --- 高速化設定 ---
         common_params = {
             "n_gpu_layers": gpu_layers, # -1 = GPUフル使用
             "n_ctx": context_size,      
-            "n_batch": 1024,
+            "n_batch": n_batch,         # Prompt tokens per llama_decode call
+            "n_ubatch": n_ubatch,       # Physical batch (compute buffer size)
+            "n_threads": n_threads,     # None = llama.cpp default
+            "n_threads_batch": n_threads_batch,
+            # mmap: weights are paged in from the OS cache, so warm restarts skip the read
+            "use_mmap": use_mmap,
+            "use_mlock": use_mlock,     # Pin the weights in RAM (needs a high RLIMIT_MEMLOCK)
             "flash_attn": True, 
-            "verbose": True
+            "verbose": verbose,
+            # Speculative decoding: guesses verified in one batch (see src/llm/speculative.py)
+            "draft_model": draft_model,
+            # Verification reads logits for every drafted token. llama-cpp-python then writes
+            # one scores row per evaluated token but only sizes scores for n_ctx rows when
+            # logits_all is passed (n_batch otherwise), so a prompt past n_batch would fail.
+            # Costs n_ctx x n_vocab x 4 bytes of RAM, also copied into every saved state.
+            "logits_all": draft_model is not None
         }
 
-        self.llm = Llama.from_pretrained(
-            repo_id=repo_id,
-            filename=filename,
-            **common_params
-        )
-        
-        print("✅ LLM Ready")
+        if model_path:
+            header = read_gguf_header(model_path)
+            print(f"   GGUF v{header.version}: {header.n_tensors} tensors, {header.file_size / 2**30:.1f} GiB")
+            self.llm = Llama(model_path=model_path, **common_params)
+        else:
+            self.llm = Llama.from_pretrained(
+                repo_id=repo_id,
+                filename=filename,
+                **common_params
+            )
+        if draft_model is not None:
+            print(f"   Drafting keeps logits for every token: {self.llm.scores.nbytes / 2**30:.1f} GiB")
+
+        # The llama context is single-threaded: speculative prefill and generation share it
+        self._lock = threading.Lock()
+        self._abort_prefill = False
+        self._formatter = None
+        self.last_prefill_stats = {}
+        self.last_prompt_stats = {}
+        self.last_decode_stats = {}
+        self.draft_model = draft_model
+
+        # Prompt-prefix KV cache: llama.cpp looks it up before each completion and
+        # stores the final state after it (see PromptCache)
+        self.prompt_cache = prompt_cache
+        if prompt_cache is not None:
+            self.llm.set_cache(prompt_cache)
+
+        print(f"✅ LLM Ready ({time.time() - start_time:.1f}s)")
+
+    def _get_formatter(self):
+        """Chat template formatter equivalent to the one create_chat_completion uses."""
+        if self._formatter is None:
+            eos_id = self.llm.token_eos()
+            bos_id = self.llm.token_bos()
+            self._formatter = llama_chat_format.Jinja2ChatFormatter(
+                template=self.llm.metadata["tokenizer.chat_template"],
+                eos_token=self.llm._model.token_get_text(eos_id) if eos_id != -1 else "",
+                bos_token=self.llm._model.token_get_text(bos_id) if bos_id != -1 else "",
+                stop_token_ids=[eos_id],
+            )
+        return self._formatter
+
+    def _tokenize_prompt(self, messages, tools=None):
+        prompt = self._get_formatter()(messages=messages, tools=tools).prompt
+        return prompt, self.llm.tokenize(prompt.encode("utf-8"), add_bos=False, special=True)
+
+    def count_tokens(self, text: str) -> int:
+        """Token count of `text` with the model's tokenizer (used for history budgets)."""
+        if not text:
+            return 0
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=False))
 
-    def chat_stream(self, messages, tools=None):
+    def prefill(self, messages, tools=None) -> int:
+        """
+        Speculatively evaluate `messages` into the KV cache without generating.
+
+        The last message is treated as an unfinished user turn: only the prompt up
+        to the end of its text is evaluated. A later chat_stream() call reuses the
+        longest matching token prefix (llama.cpp compares against the evaluated
+        tokens), so if the final transcript extends this one only the tail is
+        prefilled, and if it diverges the mismatching part is simply re-evaluated.
+        Returns the number of tokens evaluated; 0 if the model was busy.
+        """
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            partial = messages[-1]["content"]
+            prompt, _ = self._tokenize_prompt(messages, tools)
+            cut = prompt.rfind(partial)
+            if not partial or cut < 0:
+                return 0
+            tokens = self.llm.tokenize(prompt[:cut + len(partial)].encode("utf-8"), add_bos=False, special=True)
+
+            reused = self._restore_prefix(tokens)
+            self.llm.n_tokens = reused
+            start_time = time.time()
+            # Evaluate batch by batch so a real request can take over quickly
+            for i in range(reused, len(tokens), self.llm.n_batch):
+                if self._abort_prefill:
+                    break
+                self.llm.eval(tokens[i:i + self.llm.n_batch])
+
+            evaluated = self.llm.n_tokens - reused
+            self.last_prefill_stats = {
+                "reused": reused,
+                "evaluated": evaluated,
+                "seconds": time.time() - start_time,
+            }
+            return evaluated
+        finally:
+            self._abort_prefill = False
+            self._lock.release()
+
+    def _restore_prefix(self, tokens) -> int:
+        """
+        Longest prefix of `tokens` already in the context, after loading the
+        cached state if the prompt cache holds a longer one. Caller holds the lock.
+        """
+        reused = Llama.longest_token_prefix(self.llm._input_ids.tolist(), tokens)
+        if self.prompt_cache is not None and self.prompt_cache.longest_prefix(tokens) > reused:
+            try:
+                self.llm.load_state(self.prompt_cache[tokens])
+                reused = Llama.longest_token_prefix(self.llm._input_ids.tolist(), tokens)
+            except KeyError:
+                pass
+        return reused
+
+    def save_prefix(self):
+        """Store the current context in the prompt cache (e.g. the warmed-up system prompt)."""
+        if self.prompt_cache is None:
+            return
+        with self._lock:
+            self.prompt_cache[self.llm._input_ids.tolist()] = self.llm.save_state()
+
+    def warmup(self, system_prompt: str, tools=None) -> int:
+        """
+        Evaluate the system prompt (and tool definitions) into the KV cache at startup.
+        Every turn starts with this prefix, so the first one only prefills the user text.
+        With a disk-backed prompt cache the prefix is restored instead of evaluated
+        after the first run.
+        """
+        evaluated = self.prefill([{"role": "system", "content": system_prompt}], tools)
+        self.save_prefix()
+        print(f"🔥 LLM warmup: {self.last_prefill_stats.get('reused', 0)} prompt tokens restored, {evaluated} evaluated")
+        return evaluated
+
+    def close(self):
+        """Persist the in-memory prompt cache so the next start can skip the prefill."""
+        if self.prompt_cache is not None:
+            self.prompt_cache.flush()
+
+    def chat_stream(self, messages, tools=None, slot=None, cancel=None):
         """
         Chat completion with streaming. Handles both text content and tool calls.
         Yields:
-          ("content", text_chunk)
+          ("content", text_delta)  # As generated, not split into sentences
           ("tool_calls", tool_calls_list)
+
+        slot: optional scheduler slot (see src/core/scheduler.py). Every sampled
+        token is reported to `slot.count_token()`. After each chunk, if
+        `slot.should_yield(text)`, the llama.cpp state is saved, the model is
+        released until `slot.wait_turn()` returns, and the state is restored, so
+        other conversations can generate in between; the save + restore time
+        goes to `slot.record_switch()`.
+        cancel: optional CancellationToken; generation stops at the next token
+        once it is cancelled.
         """
+        # Preempt any speculative prefill; it leaves a valid prefix behind
+        self._abort_prefill = True
+        self._lock.acquire()
+        held = True
+        try:
+            self._abort_prefill = False
+            on_token = slot.count_token if slot is not None else None
+            for item in self._chat_stream_locked(messages, tools, cancel, on_token):
+                yield item
+                if slot is not None and slot.should_yield(item[1] if item[0] == "content" else ""):
+                    start = time.perf_counter()
+                    state = self.llm.save_state()
+                    save_sec = time.perf_counter() - start
+                    # The paused completion keeps sampling with this sampler (repetition penalty history)
+                    sampler = getattr(self.llm, "_sampler", None)
+                    self._lock.release()
+                    held = False
+                    if not slot.wait_turn():
+                        return  # Cancelled while another conversation had the model
+                    self._lock.acquire()
+                    held = True
+                    start = time.perf_counter()
+                    self.llm.load_state(state)
+                    switch_sec = save_sec + time.perf_counter() - start
+                    if sampler is not None:
+                        self.llm._sampler = sampler
+                    slot.record_switch(switch_sec)
+                    # KV cache plus the saved logits (one row per token when drafting)
+                    size_mb = (getattr(state, "llama_state_size", 0) + getattr(state.scores, "nbytes", 0)) / 2**20
+                    print(f"\n🔀 Session switch: {size_mb:.0f} MB state saved + restored in {switch_sec * 1000:.0f}ms", end="")
+        finally:
+            if held:
+                self._lock.release()
+
+    def _chat_stream_locked(self, messages, tools=None, cancel=None, on_token=None):
+        # The live context llama.cpp will compare the prompt against (the prompt
+        # itself is only tokenized once, by create_chat_completion)
+        context = self.llm._input_ids.copy()
+
+        # Called once per sampled token, including with speculative decoding
+        sampled = [0]
+        def count_tokens(input_ids, scores):
+            if sampled[0] == 0:
+                # First sample: input_ids is exactly the evaluated prompt
+                self._record_prompt_stats(context, input_ids)
+            sampled[0] += 1
+            if on_token is not None:
+                on_token()
+            return scores
+
+        if isinstance(self.draft_model, MeteredDraftModel):
+            self.draft_model.reset()
         response = self.llm.create_chat_completion(
             messages=messages,
             tools=tools,
             tool_choice="auto" if tools else None,
             stream=True,
-            temperature=0.7
+            temperature=0.7,
+            logits_processor=LogitsProcessorList([count_tokens])
         )
         
-        buffer = ""
-        delimiters = ["。", "！", "？", "\n", "!", "?", "."]
-        
         # Track tool calls
         # We need to accumulate them because they come in chunks
         collected_tool_calls = {} # index -> {id, type, function: {name, arguments}}
         
+        first_token_time = None
         for chunk in response:
+            if cancel is not None and cancel.cancelled:
+                # Checked after every token: a barge-in stops generation within a token
+                response.close()
+                print("\n🛑 LLM generation cancelled", end="")
+                break
+            if first_token_time is None:
+                first_token_time = time.time()
             delta = chunk['choices'][0]['delta']
             
             # Handle Tool Calls
@@ -69,24 +289,54 @@ class LocalLLM:
                             collected_tool_calls[index]["function"]["arguments"] += fn.arguments
                 continue
             
-            # Handle Content
+            # Handle Content: raw deltas; sentence chunking for TTS is the caller's job
             if 'content' in delta and delta['content']:
-                token = delta['content']
-                buffer += token
-                if any(d in token for d in delimiters):
-                    yield ("content", buffer)
-                    buffer = ""
-        
-        # Flush buffer
-        if buffer.strip():
-            yield ("content", buffer)
-            
-        # Flush tool calls
-        if collected_tool_calls:
+                yield ("content", delta['content'])
+
+        self._report_decode(sampled[0], first_token_time, time.time())
+
+        # Flush tool calls (half-generated ones from a cancelled turn are dropped)
+        if collected_tool_calls and not (cancel is not None and cancel.cancelled):
             # Convert dict to list
             final_tool_calls = [collected_tool_calls[i] for i in sorted(collected_tool_calls.keys())]
             yield ("tool_calls", final_tool_calls)
 
+    def _record_prompt_stats(self, context, prompt):
+        """KV prefix reuse for the prompt just evaluated: live context vs. the best cached state."""
+        prompt = np.asarray(prompt).tolist()
+        # Same comparison llama.cpp makes before evaluating
+        context_hit = Llama.longest_token_prefix(context.tolist(), prompt[:-1])
+        cache_hit = self.prompt_cache.longest_prefix(prompt[:-1]) if self.prompt_cache is not None else 0
+        reused = max(context_hit, cache_hit)
+        self.last_prompt_stats = {
+            "prompt_tokens": len(prompt),
+            "context_hit": context_hit,
+            "cache_hit": cache_hit,
+            "saved": reused,
+            "prefill": len(prompt) - reused,
+        }
+        source = "cache" if cache_hit > context_hit else "context"
+        print(f"♻️ KV prefix reuse: {reused}/{len(prompt)} tokens from {source}, prefill {len(prompt) - reused}")
+
+    def _report_decode(self, tokens: int, first_token_time, end_time):
+        """Decode speed for the turn (prefill excluded) and, with a draft model, its acceptance rate."""
+        seconds = end_time - first_token_time if first_token_time else 0.0
+        stats = {
+            "tokens": tokens,
+            "seconds": seconds,
+            # The first token comes out of the prefill, so the rate counts the ones after it
+            "tokens_per_sec": (tokens - 1) / seconds if tokens > 1 and seconds > 0 else 0.0,
+        }
+        message = f"\n🚀 Decode: {tokens} tokens, {stats['tokens_per_sec']:.1f} tok/s"
+        if isinstance(self.draft_model, MeteredDraftModel):
+            draft = self.draft_model
+            stats.update(draft_proposed=draft.proposed, draft_accepted=draft.accepted,
+                         acceptance_rate=draft.acceptance_rate)
+            if draft.proposed:
+                message += f", draft acceptance {draft.acceptance_rate:.0%} ({draft.accepted}/{draft.proposed})"
+        self.last_decode_stats = stats
+        print(message, end="", flush=True)
+
     def generate_stream(self, prompt: str, system_prompt: str = None):
         # Legacy support
         if system_prompt is None:
@@ -97,9 +347,11 @@ class LocalLLM:
             {"role": "user", "content": prompt}
         ]
         
+        segmenter = SentenceSegmenter()
         for type, data in self.chat_stream(messages):
             if type == "content":
-                yield data
+                yield from segmenter.feed(data)
+        yield from segmenter.flush()
 
 # --- 動作確認用 ---
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+Key = Tuple[int, ...]
+
+
+def _state_nbytes(state) -> int:
+    """Approximate memory held by a LlamaState (KV blob + token ids + logits)."""
+    size = getattr(state, "llama_state_size", None) or len(getattr(state, "llama_state", b""))
+    for name in ("input_ids", "scores"):
+        array = getattr(state, name, None)
+        if array is not None:
+            size += np.asarray(array).nbytes
+    return int(size)
+
+
+def _common_prefix(a: np.ndarray, b: np.ndarray) -> int:
+    n = min(len(a), len(b))
+    if n == 0:
+        return 0
+    mismatch = np.flatnonzero(a[:n] != b[:n])
+    return int(mismatch[0]) if len(mismatch) else n
+
+
+class PromptCache:
+    """
+    Prompt-prefix KV cache for llama.cpp, keyed by token sequence.
+
+    Drop-in for llama_cpp's LlamaRAMCache/LlamaDiskCache (`Llama.set_cache`):
+    lookups return the stored state sharing the longest token prefix with the
+    prompt, so llama.cpp restores it and only evaluates the new suffix.
+
+    - RAM tier: LRU bounded by `capacity_bytes`. Storing a state drops
+      entries whose key is a prefix of the new key (the new state covers
+      them).
+    - Disk tier (optional): states evicted from RAM, and everything left on
+      `flush()`, are pickled (llama.cpp state blob via Llama.save_state) to
+      `disk_dir`, bounded by `disk_capacity_bytes`. Token keys are kept in a
+      small sidecar file so the index survives restarts without reading the
+      states.
+    - Writes happen on a background thread: an evicted state (often hundreds
+      of MB) is only queued while llama.cpp holds the cache, and stays
+      servable from memory until it is on disk.
+    """
+
+    def __init__(self, capacity_bytes: int = 2 << 30, disk_dir: Optional[str] = None,
+                 disk_capacity_bytes: int = 8 << 30, min_tokens: int = 0):
+        self.capacity_bytes = capacity_bytes
+        self.disk_dir = disk_dir
+        self.disk_capacity_bytes = disk_capacity_bytes
+        self.min_tokens = min_tokens
+
+        self._ram: "OrderedDict[Key, Any]" = OrderedDict()
+        self._ram_sizes: Dict[Key, int] = {}
+        self._keys: Dict[Key, np.ndarray] = {}  # Token arrays for prefix matching (RAM and disk)
+        self._disk: "OrderedDict[Key, str]" = OrderedDict()  # key -> file stem, oldest first
+        self._disk_sizes: Dict[Key, int] = {}
+        self._pending: "OrderedDict[Key, Any]" = OrderedDict()  # Evicted, waiting for the disk writer
+        self._lock = threading.RLock()
+        self._pending_cond = threading.Condition(self._lock)
+        self._writer: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {"lookups": 0, "ram_hits": 0, "disk_hits": 0, "misses": 0,
+                                      "hit_tokens": 0, "stores": 0, "evictions": 0}
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    # --- BaseLlamaCache interface ---
+
+    @property
+    def cache_size(self) -> int:
+        return sum(self._ram_sizes.values())
+
+    def __contains__(self, key: Sequence[int]) -> bool:
+        return self._find(key)[0] is not None
+
+    def __getitem__(self, key: Sequence[int]):
+        with self._lock:
+            self.stats["lookups"] += 1
+            best, length = self._find(key)
+            if best is None:
+                self.stats["misses"] += 1
+                raise KeyError("No cached prefix")
+            self.stats["hit_tokens"] += length
+
+            if best in self._ram:
+                self._ram.move_to_end(best)
+                self.stats["ram_hits"] += 1
+                return self._ram[best]
+            if best in self._pending:
+                # Evicted but not written yet: still in memory
+                state = self._pending[best]
+                self.stats["ram_hits"] += 1
+                self._put_ram(best, state)
+                return state
+
+            state = self._read(best)
+            if state is None:
+                self._forget_disk(best)
+                self.stats["misses"] += 1
+                raise KeyError("Cached state unreadable")
+            self.stats["disk_hits"] += 1
+            self._put_ram(best, state)
+            return state
+
+    def __setitem__(self, key: Sequence[int], state):
+        key = tuple(key)
+        if len(key) < self.min_tokens:
+            return
+        with self._lock:
+            tokens = np.asarray(key, dtype=np.int64)
+            # Entries that are a prefix of the new key are covered by it
+            for old in [k for k in self._ram if len(k) <= len(key) and _common_prefix(self._keys[k], tokens) == len(k)]:
+                self._drop_ram(old)
+            self._keys[key] = tokens
+            self._put_ram(key, state)
+            self.stats["stores"] += 1
+
+    # --- Queries ---
+
+    def longest_prefix(self, tokens: Sequence[int]) -> int:
+        """Tokens a lookup for `tokens` would restore (no stats, no LRU update)."""
+        return self._find(tokens)[1]
+
+    def _find(self, tokens: Sequence[int]):
+        query = np.asarray(tokens, dtype=np.int64)
+        best, best_len = None, 0
+        with self._lock:
+            for key, array in self._keys.items():
+                length = _common_prefix(array, query)
+                if length > best_len or (length == best_len and best is not None and key in self._ram):
+                    best, best_len = key, length
+        return (best, best_len) if best_len > 0 else (None, 0)
+
+    # --- RAM tier ---
+
+    def _put_ram(self, key: Key, state):
+        size = _state_nbytes(state)
+        if key in self._ram:
+            self._drop_ram(key)
+        self._ram[key] = state
+        self._ram_sizes[key] = size
+        while self.cache_size > self.capacity_bytes and len(self._ram) > 1:
+            old, old_state = next(iter(self._ram.items()))
+            self._spill(old, old_state)
+            self._drop_ram(old)
+            self.stats["evictions"] += 1
+
+    def _drop_ram(self, key: Key):
+        self._ram.pop(key, None)
+        self._ram_sizes.pop(key, None)
+        if key not in self._disk and key not in self._pending:
+            self._keys.pop(key, None)
+
+    # --- Disk tier ---
+
+    def _stem(self, key: Key) -> str:
+        return hashlib.sha256(np.asarray(key, dtype=np.int64).tobytes()).hexdigest()
+
+    def _spill(self, key: Key, state):
+        """Queue `state` for the disk writer (called with the lock held)."""
+        if not self.disk_dir or key in self._disk or key in self._pending:
+            return
+        self._pending[key] = state
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_pending, daemon=True)
+            self._writer.start()
+        self._pending_cond.notify_all()
+
+    def _write_pending(self):
+        while True:
+            with self._lock:
+                self._pending_cond.wait_for(lambda: self._pending)
+                key, state = next(iter(self._pending.items()))
+            # Pickling and writing run without the lock, so lookups and stores don't wait for the disk
+            size = self._write(key, state)
+            with self._lock:
+                if size is not None:
+                    self._add_disk(key, size)
+                self._pending.pop(key, None)
+                if key not in self._ram and key not in self._disk:
+                    self._keys.pop(key, None)
+                self._pending_cond.notify_all()
+
+    def _write(self, key: Key, state) -> Optional[int]:
+        stem = self._stem(key)
+        state_path = os.path.join(self.disk_dir, f"{stem}.state")
+        try:
+            tmp = f"{state_path}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, state_path)
+            np.save(os.path.join(self.disk_dir, f"{stem}.tokens.npy"), np.asarray(key, dtype=np.int64))
+            return os.path.getsize(state_path)
+        except OSError as e:
+            print(f"⚠️ Prompt cache write failed: {e}")
+            return None
+
+    def _add_disk(self, key: Key, size: int):
+        self._keys[key] = np.asarray(key, dtype=np.int64)
+        self._disk[key] = self._stem(key)
+        self._disk_sizes[key] = size
+        while sum(self._disk_sizes.values()) > self.disk_capacity_bytes and len(self._disk) > 1:
+            oldest = next(iter(self._disk))
+            self._forget_disk(oldest, delete=True)
+
+    def wait_for_writes(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued state is on disk. Returns False on timeout."""
+        with self._lock:
+            return self._pending_cond.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def _read(self, key: Key):
+        path = os.path.join(self.disk_dir, f"{self._disk[key]}.state")
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        self._disk.move_to_end(key)
+        return state
+
+    def _forget_disk(self, key: Key, delete: bool = False):
+        stem = self._disk.pop(key, None)
+        self._disk_sizes.pop(key, None)
+        if key not in self._ram:
+            self._keys.pop(key, None)
+        if delete and stem:
+            for suffix in (".state", ".tokens.npy"):
+                try:
+                    os.remove(os.path.join(self.disk_dir, stem + suffix))
+                except OSError:
+                    pass
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".tokens.npy"):
+                continue
+            stem = name[:-len(".tokens.npy")]
+            state_path = os.path.join(self.disk_dir, f"{stem}.state")
+            if not os.path.exists(state_path):
+                continue
+            try:
+                tokens = np.load(os.path.join(self.disk_dir, name))
+            except (OSError, ValueError):
+                continue
+            entries.append((os.path.getmtime(state_path), tuple(int(t) for t in tokens), stem,
+                            os.path.getsize(state_path)))
+        for _, key, stem, size in sorted(entries):
+            self._keys[key] = np.asarray(key, dtype=np.int64)
+            self._disk[key] = stem
+            self._disk_sizes[key] = size
+
+    def flush(self):
+        """Write every RAM entry to the disk tier (e.g. at shutdown) so it survives a restart."""
+        with self._lock:
+            for key, state in list(self._ram.items()):
+                self._spill(key, state)
+        self.wait_for_writes()
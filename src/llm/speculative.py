@@ -0,0 +1,135 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class GGUFDraftModel:
+    """
+    Drafts tokens with a small GGUF model sharing the target's vocabulary
+    (e.g. Qwen3-0.6B for Qwen3-14B). Called by llama-cpp-python's generate()
+    with the target's tokens so far; returns up to `num_draft_tokens` greedy
+    guesses that the target then verifies in one batch.
+
+    The draft keeps its own KV cache and only evaluates tokens past the
+    longest prefix it has already seen, so rejected guesses cost one rollback.
+    Guesses are read from `Llama.scores`, which llama.cpp only fills when the
+    model was loaded with logits_all=True.
+    """
+
+    def __init__(self, llm, num_draft_tokens: int = 4):
+        # llama-cpp-python keeps the constructor's logits_all as Llama._logits_all
+        if not getattr(llm, "_logits_all", False):
+            raise ValueError("The draft model must be loaded with logits_all=True")
+        self.llm = llm
+        self.num_draft_tokens = num_draft_tokens
+
+    @classmethod
+    def from_pretrained(cls, repo_id: str, filename: str, context_size: int, gpu_layers: int = -1,
+                        num_draft_tokens: int = 4, model_path: str = None) -> "GGUFDraftModel":
+        """model_path: local GGUF loaded without the Hugging Face hub (see LocalLLM)."""
+        from llama_cpp import Llama
+
+        params = dict(n_ctx=context_size, n_gpu_layers=gpu_layers, logits_all=True, verbose=False)
+        if model_path:
+            from src.llm.gguf import read_gguf_header
+
+            print(f"🧠 Draft LLM Loading... ({model_path})")
+            read_gguf_header(model_path)
+            llm = Llama(model_path=model_path, **params)
+        else:
+            print(f"🧠 Draft LLM Loading... ({repo_id}/{filename})")
+            llm = Llama.from_pretrained(repo_id=repo_id, filename=filename, **params)
+        return cls(llm, num_draft_tokens=num_draft_tokens)
+
+    def __call__(self, input_ids: np.ndarray, **kwargs) -> np.ndarray:
+        tokens = input_ids.tolist()
+        # input_ids is the whole n_ctx buffer; only the first n_tokens are evaluated
+        reused = self._common_prefix(self.llm._input_ids.tolist(), tokens)
+        # The last token must be (re-)evaluated to get logits for the next one
+        reused = min(reused, len(tokens) - 1)
+        self.llm.n_tokens = reused
+        self.llm.eval(tokens[reused:])
+
+        eos = self.llm.token_eos()
+        draft: List[int] = []
+        for _ in range(self.num_draft_tokens):
+            token = int(np.argmax(self.llm.scores[self.llm.n_tokens - 1]))
+            if token == eos:
+                break
+            draft.append(token)
+            if len(draft) < self.num_draft_tokens:
+                self.llm.eval([token])
+        return np.array(draft, dtype=np.intc)
+
+    @staticmethod
+    def _common_prefix(a: List[int], b: List[int]) -> int:
+        n = 0
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            n += 1
+        return n
+
+
+class MeteredDraftModel:
+    """
+    Wraps a draft model and counts proposed vs. accepted tokens.
+
+    generate() calls the draft once per verification round with the tokens
+    accepted so far, so the guesses from the previous call that reappear at
+    the end of the next call's input were accepted. Guesses are only counted
+    once verified; the last round of a turn (cut short by EOS) is not.
+    """
+
+    def __init__(self, draft):
+        self.draft = draft
+        self.reset()
+
+    def reset(self):
+        self.proposed = 0
+        self.accepted = 0
+        self._last: Optional[Tuple[int, List[int]]] = None  # (input length, guesses)
+
+    def __call__(self, input_ids: np.ndarray, **kwargs) -> np.ndarray:
+        self._settle(input_ids)
+        draft = self.draft(input_ids, **kwargs)
+        guesses = np.asarray(draft).tolist()
+        self._last = (len(input_ids), guesses)
+        return draft
+
+    def _settle(self, input_ids: np.ndarray):
+        if self._last is None:
+            return
+        start, guesses = self._last
+        self._last = None
+        if len(input_ids) <= start:
+            return  # New prompt, not a continuation
+        self.proposed += len(guesses)
+        verified = np.asarray(input_ids[start:start + len(guesses)]).tolist()
+        for guess, token in zip(guesses, verified):
+            if guess != token:
+                break
+            self.accepted += 1
+
+    @property
+    def acceptance_rate(self) -> Optional[float]:
+        return self.accepted / self.proposed if self.proposed else None
+
+
+def create_draft_model(kind: Optional[str], num_pred_tokens: int = 10, max_ngram_size: int = 2,
+                       repo_id: str = None, filename: str = None, context_size: int = 4096,
+                       gpu_layers: int = -1, num_draft_tokens: int = 4, model_path: str = None):
+    """kind: None (off), "prompt_lookup" (n-gram matches in the prompt) or "model" (small GGUF)."""
+    if not kind:
+        return None
+    if kind == "prompt_lookup":
+        from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+        draft = LlamaPromptLookupDecoding(num_pred_tokens=num_pred_tokens, max_ngram_size=max_ngram_size)
+    elif kind == "model":
+        draft = GGUFDraftModel.from_pretrained(repo_id, filename, context_size=context_size,
+                                               gpu_layers=gpu_layers, num_draft_tokens=num_draft_tokens,
+                                               model_path=model_path)
+    else:
+        raise ValueError(f"Unknown draft model: {kind}")
+    return MeteredDraftModel(draft)
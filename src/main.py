@@ -1,3 +1,4 @@
+import os
 import sys
 import threading
 import time
@@ -5,14 +6,25 @@ import time
 # Relative imports for package execution (python -m src.main)
 from .common import config as cfg
 from .stt.stt import WhisperSTT
+from .stt.decode_policy import AdaptiveDecodePolicy
+from .stt.transcription_service import TranscriptionService
+from .stt.vad import create_vad
 from .tts.tts_sbv2 import SBV2TTS
+from .tts.audio_cache import AudioCache
+from .tts.tts_pool import SBV2PoolTTS
 from .common.audio_io import AudioIO
+from .common.audio_backend import SoundDeviceBackend, VirtualAudioBackend
 from .mcp.mcp_client import MCPClient
-from .core.conversation import ConversationManager
+from .core.conversation import ConversationManager, summarize_turns
 from .core.voice_assistant import VoiceAssistant
+from .core.scheduler import LLMScheduler
+from .core.startup import StartupError, StartupOrchestrator
+from .core.sentence_segmenter import SegmenterPolicy
 
 try:
     from .llm.llm import LocalLLM
+    from .llm.prompt_cache import PromptCache
+    from .llm.speculative import create_draft_model
 except ImportError:
     print("⚠️ LocalLLM module not found")
     sys.exit(1)
@@ -21,41 +33,198 @@ def main():
     print("🚀 Initializing Voice Assistant System...")
 
     # 1. Initialize Audio System
-    audio_io = AudioIO(sample_rate=cfg.AUDIO_SAMPLE_RATE)
-    audio_io.start()
+    if cfg.AUDIO_BACKEND == "virtual":
+        # Nothing reads the speaker output back, so don't record it
+        backend = VirtualAudioBackend(input_path=cfg.AUDIO_REPLAY_PATH, speed=cfg.AUDIO_REPLAY_SPEED,
+                                      record_seconds=0)
+    else:
+        backend = SoundDeviceBackend()
+    audio_io = AudioIO(
+        sample_rate=cfg.AUDIO_SAMPLE_RATE,
+        block_size=cfg.AUDIO_BLOCK_SIZE,
+        output_buffer_seconds=cfg.AUDIO_OUTPUT_BUFFER_SECONDS,
+        input_buffer_seconds=cfg.AUDIO_INPUT_BUFFER_SECONDS,
+        backend=backend
+    )
 
-    # 2. Initialize Core Components
-    tts = SBV2TTS(audio_io, api_url=cfg.TTS_API_URL)
-    stt = WhisperSTT(cfg.STT_MODEL_SIZE, device=cfg.STT_DEVICE, compute_type=cfg.STT_COMPUTE_TYPE)
-    
-    # 3. Initialize LLM
-    try:
-        # Use repo_id/filename if available
-        llm_repo = getattr(cfg, "LLM_REPO_ID", None)
-        llm_filename = getattr(cfg, "LLM_FILENAME", None)
-        
-        llm = LocalLLM(
-            repo_id=llm_repo,
-            filename=llm_filename,
-            context_size=cfg.LLM_CONTEXT_SIZE
+    # 2. Load models and services in parallel, warming each one up.
+    # The mic is only opened once everything is ready.
+    startup = StartupOrchestrator(max_workers=cfg.STARTUP_MAX_WORKERS, warmup=cfg.STARTUP_WARMUP)
+    def warm_tts(tts):
+        tts.warmup()
+        synthesized = tts.prewarm(cfg.TTS_PREWARM_PHRASES)
+        print(f"🗂️ TTS cache: {synthesized} phrases synthesized, {len(tts.cache)} in memory")
+
+    def load_tts():
+        cache = AudioCache(max_bytes=cfg.TTS_CACHE_MAX_MB * 1024 * 1024,
+                           disk_dir=cfg.TTS_CACHE_DIR,
+                           max_disk_bytes=cfg.TTS_CACHE_MAX_DISK_MB * 1024 * 1024)
+        common = dict(connect_timeout=cfg.TTS_CONNECT_TIMEOUT, read_timeout=cfg.TTS_READ_TIMEOUT,
+                      stream_chunk_bytes=cfg.TTS_STREAM_CHUNK_BYTES,
+                      cache=cache, cache_max_text_chars=cfg.TTS_CACHE_MAX_TEXT_CHARS)
+        if len(cfg.TTS_API_URLS) > 1:
+            return SBV2PoolTTS(audio_io, cfg.TTS_API_URLS, per_endpoint_in_flight=cfg.TTS_PER_ENDPOINT_IN_FLIGHT,
+                               failure_threshold=cfg.TTS_FAILURE_THRESHOLD,
+                               health_interval=cfg.TTS_HEALTH_INTERVAL, hedge=cfg.TTS_HEDGE, **common)
+        return SBV2TTS(audio_io, api_url=cfg.TTS_API_URLS[0], max_in_flight=cfg.TTS_MAX_IN_FLIGHT, **common)
+
+    startup.add("tts", load_tts, warmup=warm_tts)
+    # One Whisper model shared by every STT session (this process has a single mic)
+    startup.add(
+        "whisper",
+        lambda: TranscriptionService.from_model_size(
+            cfg.STT_MODEL_SIZE,
+            device=cfg.STT_DEVICE,
+            compute_type=cfg.STT_COMPUTE_TYPE,
+            num_workers=cfg.STT_NUM_WORKERS,
+            max_batch_size=cfg.STT_MAX_BATCH_SIZE,
+            initial_prompt="This is a polite English conversation."
+        ),
+        warmup=lambda service: service.warmup()
+    )
+    startup.add(
+        "vad",
+        lambda: create_vad(cfg.VAD_BACKEND, num_threads=cfg.VAD_NUM_THREADS, onnx_path=cfg.VAD_ONNX_PATH),
+        warmup=lambda vad: vad.warmup()
+    )
+    startup.add(
+        "stt",
+        lambda service, vad: WhisperSTT(
+            service=service,
+            session_id="mic",
+            vad=vad,
+            vad_backend=cfg.VAD_BACKEND,
+            vad_num_threads=cfg.VAD_NUM_THREADS,
+            vad_onnx_path=cfg.VAD_ONNX_PATH,
+            utterance_queue_size=cfg.STT_UTTERANCE_QUEUE_SIZE,
+            streaming=cfg.STT_STREAMING,
+            partial_interval_sec=cfg.STT_PARTIAL_INTERVAL_SEC,
+            partial_min_sec=cfg.STT_PARTIAL_MIN_SEC,
+            agreement_n=cfg.STT_AGREEMENT_N,
+            decode_policy=AdaptiveDecodePolicy.from_config(
+                cfg.STT_DECODE_TIERS,
+                min_avg_logprob=cfg.STT_MIN_AVG_LOGPROB,
+                max_compression_ratio=cfg.STT_MAX_COMPRESSION_RATIO,
+                no_speech_threshold=cfg.STT_NO_SPEECH_THRESHOLD
+            ),
+            word_timestamps=cfg.STT_WORD_TIMESTAMPS,
+            max_utterance_sec=cfg.STT_MAX_UTTERANCE_SEC,
+            preroll_sec=cfg.STT_PREROLL_SEC
+        ),
+        depends_on=["whisper", "vad"]
+    )
+    # Drafting keeps logits for every context position, so its context is capped
+    llm_context_size = min(cfg.LLM_CONTEXT_SIZE, cfg.LLM_DRAFT_MAX_CONTEXT) if cfg.LLM_DRAFT else cfg.LLM_CONTEXT_SIZE
+
+    def load_prompt_cache():
+        if not cfg.LLM_PROMPT_CACHE_RAM_MB:
+            return None
+        disk_dir = None
+        if cfg.LLM_PROMPT_CACHE_DIR:
+            # States are only valid for the model and context size that produced them
+            # (and with drafting, they carry per-token logits)
+            model_file = os.path.basename(cfg.LLM_MODEL_PATH) if cfg.LLM_MODEL_PATH else getattr(cfg, "LLM_FILENAME", None)
+            model_name = os.path.splitext(model_file or "model")[0]
+            suffix = "-logits" if cfg.LLM_DRAFT else ""
+            disk_dir = os.path.join(cfg.LLM_PROMPT_CACHE_DIR, f"{model_name}-ctx{llm_context_size}{suffix}")
+        return PromptCache(capacity_bytes=cfg.LLM_PROMPT_CACHE_RAM_MB * 1024 * 1024,
+                           disk_dir=disk_dir,
+                           disk_capacity_bytes=cfg.LLM_PROMPT_CACHE_DISK_MB * 1024 * 1024,
+                           min_tokens=cfg.LLM_PROMPT_CACHE_MIN_TOKENS)
+
+    # Local GGUF if configured (offline), otherwise repo_id/filename through the hub
+    startup.add(
+        "llm",
+        lambda: LocalLLM(
+            model_path=cfg.LLM_MODEL_PATH,
+            repo_id=getattr(cfg, "LLM_REPO_ID", None),
+            filename=getattr(cfg, "LLM_FILENAME", None),
+            context_size=llm_context_size,
+            n_batch=cfg.LLM_N_BATCH,
+            n_ubatch=cfg.LLM_N_UBATCH,
+            n_threads=cfg.LLM_N_THREADS,
+            n_threads_batch=cfg.LLM_N_THREADS_BATCH,
+            use_mmap=cfg.LLM_USE_MMAP,
+            use_mlock=cfg.LLM_USE_MLOCK,
+            verbose=cfg.LLM_VERBOSE,
+            prompt_cache=load_prompt_cache(),
+            draft_model=create_draft_model(
+                cfg.LLM_DRAFT,
+                num_pred_tokens=cfg.LLM_DRAFT_NUM_PRED_TOKENS,
+                max_ngram_size=cfg.LLM_DRAFT_MAX_NGRAM_SIZE,
+                model_path=cfg.LLM_DRAFT_MODEL_PATH,
+                repo_id=cfg.LLM_DRAFT_REPO_ID,
+                filename=cfg.LLM_DRAFT_FILENAME,
+                context_size=llm_context_size,
+                gpu_layers=cfg.LLM_DRAFT_GPU_LAYERS,
+                num_draft_tokens=cfg.LLM_DRAFT_TOKENS
+            )
         )
-    except Exception as e:
-        print(f"❌ Failed to load LLM: {e}")
+    )
+    startup.add("mcp", lambda: MCPClient(config_path=cfg.MCP_CONFIG_PATH,
+                                         tool_top_k=cfg.TOOL_SELECTION_TOP_K,
+                                         pinned_tools=cfg.TOOL_PINNED,
+                                         tool_keywords=cfg.TOOL_KEYWORDS))
+    if cfg.STARTUP_WARMUP:
+        # System prompt + tool definitions are the fixed prefix of every turn
+        # (with tool selection, what a turn with no tool match is offered: the pinned tools, or all of them)
+        startup.add(
+            "llm_prompt",
+            lambda llm, mcp: llm.warmup(cfg.SYSTEM_PROMPT,
+                                        tools=(mcp.tool_index.select("", record=False) if mcp.tool_index
+                                               else mcp.list_tools()) or None),
+            depends_on=["llm", "mcp"],
+            required=False
+        )
+
+    try:
+        components = startup.run()
+    except StartupError as e:
+        print(startup.report())
+        print(f"❌ Startup failed: {e}")
+        if startup.components.get("mcp"):
+            startup.components["mcp"].close()
         return
+    print(startup.report())
 
-    # 4. Initialize MCP
-    mcp_client = MCPClient(config_path=cfg.MCP_CONFIG_PATH)
+    tts, stt, llm, mcp_client = components["tts"], components["stt"], components["llm"], components["mcp"]
+    stt_service = components["whisper"]
 
-    # 5. Initialize Assistant Logic
-    conversation = ConversationManager(system_prompt=cfg.SYSTEM_PROMPT)
-    assistant = VoiceAssistant(llm, tts, mcp_client, conversation)
+    # 3. Initialize Assistant Logic
+    def new_conversation():
+        return ConversationManager(
+            system_prompt=cfg.SYSTEM_PROMPT,
+            token_budget=min(cfg.CONVERSATION_TOKEN_BUDGET, llm_context_size // 2),
+            token_counter=llm.count_tokens,
+            evict_fraction=cfg.CONVERSATION_EVICT_FRACTION,
+            summarizer=(lambda evicted, previous: summarize_turns(
+                evicted, previous, max_chars=cfg.CONVERSATION_SUMMARY_MAX_CHARS)) if cfg.CONVERSATION_SUMMARY else None
+        )
+
+    conversation = new_conversation()
+    scheduler = LLMScheduler(llm,
+                             conversation_factory=new_conversation,
+                             quantum_tokens=cfg.LLM_SCHEDULER_QUANTUM_TOKENS,
+                             policy=cfg.LLM_SESSION_POLICY)
+    assistant = VoiceAssistant(llm, tts, mcp_client, conversation,
+                               speculative_prefill=cfg.LLM_SPECULATIVE_PREFILL,
+                               scheduler=scheduler,
+                               segmenter_policy=SegmenterPolicy(
+                                   first_min_chars=cfg.TTS_SEGMENT_FIRST_MIN_CHARS,
+                                   target_chars=cfg.TTS_SEGMENT_TARGET_CHARS,
+                                   growth=cfg.TTS_SEGMENT_GROWTH,
+                                   max_chars=cfg.TTS_SEGMENT_MAX_CHARS
+                               ))
 
-    # 6. Start STT Callback
+    # 4. Start STT Callback
     def on_stt_text(text):
         # Dispatch to assistant in a separate thread to not block STT
         threading.Thread(target=assistant.process_input, args=(text,)).start()
 
-    stt.start(audio_io, on_text_callback=on_stt_text)
+    # 5. Open the mic last, when everything is warm
+    audio_io.start()
+    stt.start(audio_io, on_text_callback=on_stt_text, on_partial_text=assistant.speculate,
+              on_barge_in=assistant.interrupt)
 
     print("\n🎤 Ready! Speak into the microphone. (Ctrl+C to exit)\n")
 
@@ -64,8 +233,21 @@ def main():
             time.sleep(0.1)
     except KeyboardInterrupt:
         print("\n🛑 Shutting down...")
+        print(f"📊 Audio: {audio_io.telemetry_snapshot().summary()}")
+        print(f"📊 TTS cache: {tts.cache.stats}")
+        if isinstance(tts, SBV2PoolTTS):
+            print(f"📊 TTS pool: {tts.pool.stats} {tts.pool.snapshot()}")
+        print(f"📊 LLM sessions: {scheduler.metrics()}")
+        print(f"📊 History: {conversation.total_tokens} tokens, {conversation.stats}")
+        if mcp_client.tool_index is not None:
+            print(f"📊 Tool selection: {mcp_client.tool_index.summary()}")
+        if llm.prompt_cache is not None:
+            print(f"📊 LLM prompt cache: {llm.prompt_cache.stats}")
+        tts.cancel()
         audio_io.stop()
         stt.is_running = False
+        stt_service.stop()
+        llm.close()
         mcp_client.close()
         print("✅ Shutdown complete.")
 
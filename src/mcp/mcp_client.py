@@ -1,4 +1,5 @@
 import asyncio
+import concurrent.futures
 import threading
 import json
 import os
@@ -7,13 +8,21 @@ from contextlib import AsyncExitStack
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+from src.mcp.tool_index import ToolIndex
+
 class MCPClient:
-    def __init__(self, config_path):
+    def __init__(self, config_path, tool_top_k=None, pinned_tools=(), tool_keywords=None):
+        """
+        tool_top_k: build a ToolIndex once connected so each turn is offered only
+        the most relevant tools (plus `pinned_tools`); None = always offer all.
+        """
         self.config_path = config_path
         self.loop = asyncio.new_event_loop()
         self.thread = threading.Thread(target=self._run_loop, daemon=True)
         self.sessions = {} # tool_name -> session
         self.tools = []    # LLM-ready tool definitions
+        self.tool_servers = {}  # tool_name -> MCP server name
+        self.tool_index = None
         self._ready = threading.Event()
         self._shutdown = asyncio.Event()
 
@@ -23,6 +32,9 @@ class MCPClient:
             print("❌ MCP Connection Timed Out")
         else:
             print(f"✅ MCP Connected. Loaded {len(self.tools)} tools.")
+        if tool_top_k:
+            self.tool_index = ToolIndex(self.tools, top_k=tool_top_k, pinned=pinned_tools,
+                                        keywords=tool_keywords, servers=self.tool_servers)
 
     def _run_loop(self):
         if sys.platform.startswith('win'):
@@ -66,6 +78,7 @@ class MCPClient:
                     result = await session.list_tools()
                     for tool in result.tools:
                         self.sessions[tool.name] = session
+                        self.tool_servers[tool.name] = name
                         self.tools.append({
                             "type": "function",
                             "function": {
@@ -86,20 +99,29 @@ class MCPClient:
     def list_tools(self):
         return self.tools
 
-    def call_tool(self, name, arguments):
+    def call_tool(self, name, arguments, cancel=None):
+        """cancel: optional CancellationToken; cancelling it aborts the pending call."""
         if name not in self.sessions:
             return f"Error: Tool '{name}' not found."
         
         session = self.sessions[name]
         future = asyncio.run_coroutine_threadsafe(session.call_tool(name, arguments), self.loop)
+        if cancel is not None:
+            # Cancelling the concurrent future also cancels the task on the MCP loop
+            cancel.add_callback(future.cancel)
         try:
             result = future.result(timeout=60) # 60s timeout for tool execution
             if result.content:
                 # Concatenate text content
                 return "".join([c.text for c in result.content if c.type == 'text'])
             return "OK" # No content
+        except concurrent.futures.CancelledError:
+            return f"Error: Tool {name} was cancelled."
         except Exception as e:
             return f"Error executing tool {name}: {e}"
+        finally:
+            if cancel is not None:
+                cancel.remove_callback(future.cancel)
 
     def close(self):
         self.loop.call_soon_threadsafe(self._shutdown.set)
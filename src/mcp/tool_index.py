@@ -0,0 +1,150 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+_CAMEL = re.compile(r"([a-z0-9])([A-Z])")
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")  # Kana and kanji
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Index terms: lowercase ASCII words (snake_case and camelCase split) plus
+    character bigrams of Japanese/CJK runs, which have no spaces to split on.
+    """
+    if not text:
+        return []
+    terms = _WORD.findall(_CAMEL.sub(r"\1 \2", text).lower())
+    for run in _CJK.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _tool_name(tool: Dict[str, Any]) -> str:
+    return tool["function"]["name"]
+
+
+def _tool_text(tool: Dict[str, Any]) -> str:
+    """Name, description and parameter names/descriptions of an LLM tool definition."""
+    fn = tool["function"]
+    parts = [fn["name"], fn.get("description") or ""]
+    properties = (fn.get("parameters") or {}).get("properties") or {}
+    for name, schema in properties.items():
+        parts.append(name)
+        if isinstance(schema, dict):
+            parts.append(schema.get("description") or "")
+    return " ".join(parts)
+
+
+class ToolIndex:
+    """
+    Offline BM25 index over MCP tool definitions, used to send the LLM only
+    the tools relevant to the current utterance instead of every schema.
+
+    Built once when MCP connects. `select()` returns the `top_k` best
+    matching tools plus the `pinned` ones, always in the original MCP order
+    so the same selection renders to the same prompt prefix. A query that
+    matches nothing, with no previous selection and no pinned tools, gets
+    every tool rather than none. `keywords`
+    adds search terms per tool name or MCP server name (e.g. Japanese words
+    for English descriptions). `record_call()` tracks whether the tools the
+    LLM called had been offered (selection hit rate).
+    """
+
+    def __init__(self, tools: Sequence[Dict[str, Any]], top_k: int = 6, pinned: Iterable[str] = (),
+                 keywords: Dict[str, Sequence[str]] = None, servers: Dict[str, str] = None,
+                 k1: float = 1.2, b: float = 0.75):
+        self.tools = list(tools)
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        names = [_tool_name(t) for t in self.tools]
+        self.pinned = {name for name in pinned if name in names}
+        keywords = keywords or {}
+        servers = servers or {}
+
+        self._docs: List[Counter] = []
+        for tool in self.tools:
+            name = _tool_name(tool)
+            extra = list(keywords.get(name, ())) + list(keywords.get(servers.get(name), ()))
+            self._docs.append(Counter(tokenize(" ".join([_tool_text(tool)] + extra))))
+        self._lengths = [sum(doc.values()) for doc in self._docs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths) or 1.0) if self._lengths else 1.0
+        document_frequency = Counter(term for doc in self._docs for term in doc)
+        n = len(self._docs)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"selections": 0, "reused": 0, "fallbacks": 0, "tools_offered": 0, "tools_total": 0,
+                                      "calls": 0, "hits": 0}
+
+    def scores(self, query: str) -> List[float]:
+        terms = [t for t in tokenize(query) if t in self._idf]
+        result = []
+        for doc, length in zip(self._docs, self._lengths):
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if tf:
+                    norm = self.k1 * (1 - self.b + self.b * length / self._avg_length)
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+    def relevant(self, query: str) -> List[str]:
+        """Names of the `top_k` tools matching `query` (score > 0), best first."""
+        scores = self.scores(query)
+        ranked = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: (-scores[i], i))
+        return [_tool_name(self.tools[i]) for i in ranked[:self.top_k]]
+
+    def select(self, query: str, previous: Optional[Sequence[Dict[str, Any]]] = None,
+               record: bool = True) -> List[Dict[str, Any]]:
+        """
+        Tools to offer for `query`. If every relevant tool is already in
+        `previous` (the session's last selection), that selection is returned
+        unchanged, so follow-up turns keep the same prompt prefix.
+        """
+        relevant = self.relevant(query)
+        reused = previous is not None and set(relevant) <= {_tool_name(t) for t in previous}
+        # An every-tool fallback is kept only until something matches
+        if reused and relevant and len(previous) == len(self.tools):
+            reused = False
+        fallback = False
+        if reused:
+            selected = list(previous)
+        else:
+            wanted = self.pinned | set(relevant)
+            selected = [t for t in self.tools if _tool_name(t) in wanted]
+            fallback = not selected
+            if fallback:
+                selected = list(self.tools)
+        if record:
+            with self._lock:
+                self.stats["selections"] += 1
+                self.stats["reused"] += int(reused)
+                self.stats["fallbacks"] += int(fallback and bool(self.tools))
+                self.stats["tools_offered"] += len(selected)
+                self.stats["tools_total"] += len(self.tools)
+        return selected
+
+    def record_call(self, name: str, offered: Sequence[Dict[str, Any]]):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["hits"] += int(any(_tool_name(t) == name for t in offered))
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """Share of tool calls whose tool was among the offered ones."""
+        return self.stats["hits"] / self.stats["calls"] if self.stats["calls"] else None
+
+    def summary(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        selections = stats["selections"]
+        stats["avg_tools_offered"] = round(stats["tools_offered"] / selections, 1) if selections else 0.0
+        stats["hit_rate"] = self.hit_rate
+        return stats
@@ -0,0 +1,97 @@
+import queue
+from typing import Optional
+
+import numpy as np
+
+
+class CaptureBuffer:
+    """
+    Fixed-capacity, contiguous store for one utterance.
+    `view()` hands Whisper the captured audio without copying it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self.length = 0
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.length
+
+    @property
+    def full(self) -> bool:
+        return self.length >= self.capacity
+
+    def append(self, samples: np.ndarray) -> int:
+        """Copy as many samples as fit. Returns the number written."""
+        n = min(len(samples), self.free)
+        self._buf[self.length:self.length + n] = samples[:n]
+        self.length += n
+        return n
+
+    def view(self) -> np.ndarray:
+        """Read-only, zero-copy view of the captured samples."""
+        view = self._buf[:self.length]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self.length = 0
+
+
+class PreRoll:
+    """Keeps the most recent `capacity` samples heard before speech started."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self._pos = 0     # Next write index
+        self.length = 0
+
+    def push(self, samples: np.ndarray):
+        if self.capacity == 0:
+            return
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        first = min(n, self.capacity - self._pos)
+        self._buf[self._pos:self._pos + first] = samples[:first]
+        self._buf[:n - first] = samples[first:]
+        self._pos = (self._pos + n) % self.capacity
+        self.length = min(self.capacity, self.length + n)
+
+    def drain_into(self, capture: CaptureBuffer):
+        """Append the pre-roll (oldest first) to `capture` and clear it."""
+        start = (self._pos - self.length) % self.capacity if self.capacity else 0
+        first = min(self.length, self.capacity - start)
+        capture.append(self._buf[start:start + first])
+        capture.append(self._buf[:self.length - first])
+        self.length = 0
+
+
+class CapturePool:
+    """
+    Preallocated set of CaptureBuffers shared by the VAD stage and the executor.
+    The VAD stage acquires a buffer per utterance; whoever finishes with the
+    utterance (executor, or the queue when it drops one) releases it.
+    """
+
+    def __init__(self, count: int, capacity: int):
+        self._free: "queue.Queue[CaptureBuffer]" = queue.Queue()
+        for _ in range(count):
+            self._free.put(CaptureBuffer(capacity))
+
+    def acquire(self) -> Optional[CaptureBuffer]:
+        try:
+            buf = self._free.get_nowait()
+        except queue.Empty:
+            return None
+        buf.clear()
+        return buf
+
+    def release(self, buf: CaptureBuffer):
+        self._free.put(buf)
+
+    @property
+    def available(self) -> int:
+        return self._free.qsize()
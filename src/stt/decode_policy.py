@@ -0,0 +1,75 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# (audio, beam_size, prefix, word_timestamps) -> list of faster-whisper segments
+TranscribeFn = Callable[[np.ndarray, int, Optional[str], bool], List[Any]]
+
+
+@dataclass
+class DecodeTier:
+    name: str
+    beam_size: int
+
+
+@dataclass
+class DecodeResult:
+    segments: List[Any]
+    tier: str
+    attempts: int
+    confident: bool
+    no_speech: bool = False
+
+
+class AdaptiveDecodePolicy:
+    """
+    Decode cheaply first and escalate to wider beams only when confidence is low.
+
+    A decode is accepted when every segment clears the avg_logprob and
+    compression-ratio thresholds. Segments Whisper flags as non-speech with
+    low log-probability are treated as silence and accepted as-is, since a
+    wider beam won't find words that aren't there. The last tier is always
+    accepted.
+    """
+
+    def __init__(self, tiers: Sequence[DecodeTier], min_avg_logprob: float = -0.7,
+                 max_compression_ratio: float = 2.4, no_speech_threshold: float = 0.6):
+        if not tiers:
+            raise ValueError("At least one decode tier is required")
+        self.tiers = list(tiers)
+        self.min_avg_logprob = min_avg_logprob
+        self.max_compression_ratio = max_compression_ratio
+        self.no_speech_threshold = no_speech_threshold
+        self.tier_counts: Counter = Counter()
+
+    @classmethod
+    def from_config(cls, tiers: Sequence[Dict[str, Any]], **thresholds) -> "AdaptiveDecodePolicy":
+        return cls([DecodeTier(t["name"], t["beam_size"]) for t in tiers], **thresholds)
+
+    def _is_silence(self, segment) -> bool:
+        return (segment.no_speech_prob > self.no_speech_threshold and
+                segment.avg_logprob < self.min_avg_logprob)
+
+    def is_confident(self, segments: List[Any]) -> bool:
+        for segment in segments:
+            if self._is_silence(segment):
+                continue
+            if segment.avg_logprob < self.min_avg_logprob:
+                return False
+            if segment.compression_ratio > self.max_compression_ratio:
+                return False
+        return True
+
+    def decode(self, transcribe: TranscribeFn, audio: np.ndarray, prefix: Optional[str] = None,
+               word_timestamps: bool = False) -> DecodeResult:
+        segments: List[Any] = []
+        for attempt, tier in enumerate(self.tiers, start=1):
+            segments = transcribe(audio, tier.beam_size, prefix, word_timestamps)
+            confident = self.is_confident(segments)
+            if confident or attempt == len(self.tiers):
+                self.tier_counts[tier.name] += 1
+                no_speech = bool(segments) and all(self._is_silence(s) for s in segments)
+                return DecodeResult(segments, tier.name, attempt, confident, no_speech)
+        raise AssertionError("unreachable")
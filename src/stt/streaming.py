@@ -0,0 +1,64 @@
+import re
+from typing import List
+
+# ASCII words/numbers stay whole; every other non-space character (kana, kanji,
+# punctuation) is its own token, so Japanese hypotheses can be compared without
+# a morphological analyser. Whitespace is kept so tokens join back losslessly.
+_TOKEN_RE = re.compile(r"[A-Za-z0-9']+|\s+|[^\sA-Za-z0-9']")
+
+
+def tokenize_hypothesis(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+
+class LocalAgreement:
+    """
+    LocalAgreement-n commit policy for re-decoded streaming hypotheses.
+
+    A token is committed once the last `n` hypotheses agree on it (longest
+    common prefix). Committed tokens are never retracted, so downstream
+    consumers can act on them immediately.
+    """
+
+    def __init__(self, n: int = 2):
+        if n < 2:
+            raise ValueError("LocalAgreement needs at least 2 hypotheses to agree")
+        self.n = n
+        self.reset()
+
+    def reset(self):
+        self.committed: List[str] = []
+        self._history: List[List[str]] = []
+
+    @property
+    def committed_text(self) -> str:
+        return "".join(self.committed)
+
+    def update(self, hypothesis: List[str]) -> List[str]:
+        """Add a hypothesis (full utterance so far). Returns the newly committed tokens."""
+        self._history.append(hypothesis)
+        if len(self._history) > self.n:
+            self._history.pop(0)
+        if len(self._history) < self.n:
+            return []
+
+        agreed = self._common_prefix(self._history)
+        # Trailing whitespace is not worth committing on its own
+        while agreed and agreed[-1].isspace():
+            agreed.pop()
+
+        start = len(self.committed)
+        if len(agreed) <= start or agreed[:start] != self.committed:
+            return []
+        new_tokens = agreed[start:]
+        self.committed.extend(new_tokens)
+        return new_tokens
+
+    @staticmethod
+    def _common_prefix(hypotheses: List[List[str]]) -> List[str]:
+        prefix = []
+        for tokens in zip(*hypotheses):
+            if any(t != tokens[0] for t in tokens[1:]):
+                break
+            prefix.append(tokens[0])
+        return prefix
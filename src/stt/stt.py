@@ -2,136 +2,319 @@ import queue
 import threading
 import sys
 import numpy as np
-import sounddevice as sd
-import torch
 import time
-from faster_whisper import WhisperModel
+from dataclasses import dataclass
+from typing import Optional
+
+from src.stt.capture_buffer import CaptureBuffer, CapturePool, PreRoll
+from src.stt.decode_policy import AdaptiveDecodePolicy, DecodeTier
+from src.stt.streaming import LocalAgreement, tokenize_hypothesis
+from src.stt.transcription_service import TranscriptionService
+from src.stt.vad import create_vad, VADEngine, VAD_WINDOW
+
+@dataclass
+class Utterance:
+    """A speech segment handed from the VAD stage to the transcription executor."""
+    audio: np.ndarray
+    ended_at: float  # time.monotonic() when endpointing fired (or the snapshot was taken)
+    utterance_id: int = 0
+    is_partial: bool = False  # Snapshot of a still-growing utterance for streaming decode
+    capture: Optional[CaptureBuffer] = None  # Owning buffer, returned to the pool after decoding
 
 class WhisperSTT:
-    def __init__(self, model_size="large-v3", device="auto", compute_type="float32"):
-        print(f"🔄 Whisperモデル読み込み中 ({model_size})...")
-        self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
-        self.audio_queue = queue.Queue()
+    def __init__(self, model_size="large-v3", device="auto", compute_type="float32",
+                 vad_backend="torch", vad_num_threads=1, vad_onnx_path=None,
+                 utterance_queue_size=4, streaming=True, partial_interval_sec=1.0,
+                 partial_min_sec=1.0, agreement_n=2, decode_policy: AdaptiveDecodePolicy = None,
+                 word_timestamps=False, max_utterance_sec=30.0, preroll_sec=0.32,
+                 service: TranscriptionService = None, session_id="local", vad: VADEngine = None):
+        # Decoding runs on a (possibly shared) TranscriptionService; this instance is one session
+        if service is None:
+            service = TranscriptionService.from_model_size(
+                model_size, device=device, compute_type=compute_type,
+                initial_prompt="This is a polite English conversation."
+            )
+        self.service = service
+        self.model = service.model
+        self.session = service.open_session(session_id)
         self.is_running = False
         self.sample_rate = 16000
         self.block_size = 512
+        self.vad_backend = vad_backend
+        self.vad_num_threads = vad_num_threads
+        self.vad_onnx_path = vad_onnx_path
+        self.vad = vad  # Preloaded engine (startup); otherwise created when the VAD stage starts
+        # Bounded hand-off between the realtime VAD stage and the Whisper executor
+        self.utterance_queue = queue.Queue(maxsize=utterance_queue_size)
+        self.dropped_utterances = 0
+
+        # Fixed memory for utterance audio: one buffer being filled, one being decoded,
+        # and one per queued utterance. Utterances longer than the cap are force-segmented.
+        self.max_utterance_sec = max_utterance_sec
+        preroll_samples = int(preroll_sec * self.sample_rate)
+        self.preroll = PreRoll(preroll_samples)
+        self.capture_pool = CapturePool(
+            utterance_queue_size + 2, int(max_utterance_sec * self.sample_rate) + preroll_samples
+        )
+
+        # Streaming partials: re-decode the growing utterance and commit stable prefixes
+        self.streaming = streaming
+        self.partial_interval = int(partial_interval_sec * self.sample_rate)
+        self.partial_min = int(partial_min_sec * self.sample_rate)
+        self.agreement = LocalAgreement(n=agreement_n)
+        self._partial_pending = False
+
+        # Greedy first, wide beam only on low confidence
+        self.decode_policy = decode_policy or AdaptiveDecodePolicy(
+            [DecodeTier("greedy", 1), DecodeTier("wide", 10)]
+        )
+        # Word timestamps cost an extra alignment pass; only compute them if a consumer wants them
+        self.word_timestamps = word_timestamps
+        self.last_decode_tier = None
+        # Called on barge-in instead of just cancelling playback (see start())
+        self.on_barge_in = None
+
+    def load_vad(self):
+        if self.vad is None:
+            print(f"🔄 VADモデル読み込み中 ({self.vad_backend})...")
+            self.vad = create_vad(self.vad_backend, num_threads=self.vad_num_threads, onnx_path=self.vad_onnx_path)
+        return self.vad
+
+    def _vad_worker(self):
+        """
+        Realtime stage: VAD, endpointing and barge-in.
+        Never waits on Whisper; finished utterances go to utterance_queue.
+        """
+        vad = self.load_vad()
 
-    def _transcribe_worker(self, on_text_callback):
-        print("🔄 VADモデル読み込み中...")
-        vad_model, utils = torch.hub.load(repo_or_dir='snakers4/silero-vad',
-                                          model='silero_vad',
-                                          force_reload=False,
-                                          trust_repo=True)
-        # We only need the model for manual inference
-        
         print(f"\n🎧 待機中... 話しかけてください (Ctrl+C で終了)\n")
 
-        current_speech_buffer = []
+        capture = None
         is_speaking = False
+        speech_onset = False  # Barge-in already handled for the current speech
         silence_counter = 0
+        utterance_id = 0
+        samples_since_partial = 0
 
-        # VAD requires exactly 512 samples for 16kHz
-        VAD_WINDOW = 512 
-        buffer_accum = np.zeros(0, dtype='float32')
+        # Preallocated staging area: leftover (<1 window) samples + one read
+        read_size = VAD_WINDOW * 32
+        stage = np.zeros(read_size + VAD_WINDOW, dtype='float32')
+        pending = 0
 
         while self.is_running:
-            try:
-                data = self.audio_queue.get(timeout=1.0) 
-            except queue.Empty:
+            n = self.audio_io.read_input(stage[pending:pending + read_size], timeout=1.0)
+            if n == 0:
                 continue
+            total = pending + n
 
-            # Accumulate buffer
-            buffer_accum = np.concatenate((buffer_accum, data.flatten()))
-            
-            # Process in 512-sample chunks
-            while len(buffer_accum) >= VAD_WINDOW:
-                # Extract 512 samples
-                audio_chunk_np = buffer_accum[:VAD_WINDOW]
-                buffer_accum = buffer_accum[VAD_WINDOW:]
-                
-                audio_chunk = torch.from_numpy(audio_chunk_np)
-                
-                # Dynamic Threshold Logic
-                # If AI is playing, set high threshold (only loud inputs)
-                # If silent, set low threshold (sensitive)
-                if self.audio_io and self.audio_io.is_playing:
-                    threshold = 0.8
-                else:
-                    threshold = 0.4
-                    
-                # Manual Inference
-                # Note: Silero VAD model expects (batch, samples) or just samples?
-                # Usually (1, samples) or (samples,).
-                speech_prob = vad_model(audio_chunk, 16000).item()
-                
+            # Score every complete 512-sample window in the backlog with one VAD call
+            n_windows = total // VAD_WINDOW
+            if n_windows == 0:
+                pending = total
+                continue
+            windows = stage[:n_windows * VAD_WINDOW].reshape(n_windows, VAD_WINDOW)
+            speech_probs = vad.process(windows)
+
+            # Dynamic Threshold Logic
+            # If AI is playing, set high threshold (only loud inputs)
+            # If silent, set low threshold (sensitive)
+            if self.audio_io and self.audio_io.is_playing:
+                threshold = 0.8
+            else:
+                threshold = 0.4
+
+            for audio_chunk_np, speech_prob in zip(windows, speech_probs):
                 if speech_prob > threshold:
                     silence_counter = 0
                     if not is_speaking:
-                        # Start of speech (Barge-in)
-                        if self.audio_io and self.audio_io.is_playing:
-                             sys.stdout.write("\n🛑 割り込み検知 (Barge-in) -> 再生停止\n")
-                             self.audio_io.cancel_playback()
-                             
+                        if not speech_onset:
+                            speech_onset = True
+                            # Start of speech (Barge-in), even if there is no buffer to record it in
+                            if self.audio_io and self.audio_io.is_playing:
+                                 sys.stdout.write("\n🛑 割り込み検知 (Barge-in) -> 再生停止\n")
+                                 if self.on_barge_in:
+                                     self.on_barge_in()  # Stops playback and the turn that produced it
+                                 else:
+                                     self.audio_io.cancel_playback()
+
+                        capture = self.capture_pool.acquire()
+                        if capture is None:
+                            print("⚠️ No free capture buffer (STT executor is behind). Ignoring speech.")
+                            continue
+
                         sys.stdout.write("🗣️  認識開始...\r")
                         sys.stdout.flush()
                         is_speaking = True
-                        current_speech_buffer = current_speech_buffer[-10:] # Keep pre-roll
-                    current_speech_buffer.append(audio_chunk_np)
+                        utterance_id += 1
+                        samples_since_partial = 0
+                        self.preroll.drain_into(capture)
+                    capture.append(audio_chunk_np)
+                    samples_since_partial += VAD_WINDOW
+
+                    if capture.full:
+                        # Forced segmentation: hand over what we have and keep listening
+                        print(f"\n✂️ Utterance reached {self.max_utterance_sec:.0f}s. Segmenting.")
+                        self._submit_utterance(Utterance(capture.view(), time.monotonic(), utterance_id, capture=capture))
+                        capture = self.capture_pool.acquire()
+                        if capture is None:
+                            is_speaking = False
+                            continue
+                        utterance_id += 1
+                        samples_since_partial = 0
+                    elif self.streaming and samples_since_partial >= self.partial_interval:
+                        if self._submit_partial(capture, utterance_id):
+                            samples_since_partial = 0
                 else:
                     if is_speaking:
                         silence_counter += 1
-                        current_speech_buffer.append(audio_chunk_np) # Keep trailing silence for a bit
+                        capture.append(audio_chunk_np) # Keep trailing silence for a bit
                         
                         # End of speech detection (e.g. 500ms silence = ~16 chunks of 512sa)
-                        if silence_counter > 20: 
+                        if silence_counter > 20 or capture.full:
                             sys.stdout.write("                   \r")
-                            # Process Audio
-                            if len(current_speech_buffer) > 0:
-                                full_audio = np.concatenate(current_speech_buffer, axis=0).flatten()
-                                
-                                start_time = time.time()
-                                segments, _ = self.model.transcribe(
-                                    full_audio,
-                                    beam_size=10,
-                                    language="ja",
-                                    condition_on_previous_text=False, # Reduce hallucinations in streaming
-                                    initial_prompt="This is a polite English conversation.",
-                                    word_timestamps=True
-                                )
-
-                                segments = list(segments)
-                                text_result = "".join([s.text for s in segments]).strip()
-                                
-                                latency = time.time() - start_time
-                                
-                                if text_result:
-                                    print(f"User: {text_result} (STT Latency: {latency:.2f}s)")
-                                    on_text_callback(text_result)
-                                    
-                                    for segment in segments:
-                                        if segment.words:
-                                            for word in segment.words:
-                                                print(f"[{word.start:.2f}s -> {word.end:.2f}s] {word.word}")
-
-                                print("---------------------------")
-                            
+                            # Hand off to the transcription executor (zero-copy view)
+                            self._submit_utterance(Utterance(capture.view(), time.monotonic(), utterance_id, capture=capture))
+
                             is_speaking = False
-                            current_speech_buffer = []
+                            speech_onset = False
+                            capture = None
                             silence_counter = 0
                             # vad_model.reset_states() # If model is stateful? Silero standard model is usually stateless per forward? 
                             # Actually Silero V5 is stateful but standard hub load might be v4.
                             # Standard usage `model(x, sr)` is often stateless context-wise unless state is passed.
+                    else:
+                        speech_onset = False
+                        self.preroll.push(audio_chunk_np)
+
+            # Carry the incomplete window over to the next read
+            pending = total - n_windows * VAD_WINDOW
+            stage[:pending] = stage[n_windows * VAD_WINDOW:total]
 
-    def start(self, audio_io, on_text_callback):
+    def _release(self, utterance: Utterance):
+        if utterance.capture is not None:
+            self.capture_pool.release(utterance.capture)
+
+    def _submit_utterance(self, utterance: Utterance):
+        """Enqueue without blocking the VAD stage; drop the oldest utterance if the executor is behind."""
+        while True:
+            try:
+                self.utterance_queue.put_nowait(utterance)
+                return
+            except queue.Full:
+                try:
+                    dropped = self.utterance_queue.get_nowait()
+                    if dropped.is_partial:
+                        self._partial_pending = False
+                    else:
+                        self._release(dropped)
+                        self.dropped_utterances += 1
+                        print("⚠️ STT executor is behind. Dropped the oldest pending utterance.")
+                except queue.Empty:
+                    pass
+
+    def _submit_partial(self, capture, utterance_id) -> bool:
+        """Queue a snapshot of the growing utterance, at most one at a time. Never evicts finals."""
+        if self._partial_pending:
+            return False
+        if capture.length < self.partial_min:
+            return False
+        # Zero-copy: later appends only write past the snapshot's end
+        snapshot = capture.view()
+        try:
+            self.utterance_queue.put_nowait(Utterance(snapshot, time.monotonic(), utterance_id, is_partial=True))
+        except queue.Full:
+            return False
+        self._partial_pending = True
+        return True
+
+    def _run_model(self, audio, beam_size, prefix=None, word_timestamps=False):
+        return self.session.transcribe(audio, beam_size, prefix, word_timestamps)
+
+    @staticmethod
+    def _segments_text(segments, prefix=None):
+        text = "".join([s.text for s in segments]).strip()
+        # Whisper continues after the forced prefix; the prefix itself is not in the output
+        if prefix and not text.startswith(prefix):
+            text = prefix + text
+        return text
+
+    def _transcribe_partial(self, utterance, on_partial_text):
+        # Partials always use the cheapest tier; the final decode can still escalate
+        prefix = self.agreement.committed_text
+        beam_size = self.decode_policy.tiers[0].beam_size
+        text = self._segments_text(self._run_model(utterance.audio, beam_size, prefix), prefix)
+        new_tokens = self.agreement.update(tokenize_hypothesis(text))
+        if new_tokens:
+            stable = self.agreement.committed_text
+            sys.stdout.write(f"📝 {stable}\r")
+            sys.stdout.flush()
+            if on_partial_text:
+                on_partial_text(stable)
+
+    def _transcribe_worker(self, on_text_callback, on_partial_text=None):
+        """Executor stage: runs Whisper on utterances produced by _vad_worker."""
+        current_id = None
+        while self.is_running:
+            try:
+                utterance = self.utterance_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if utterance.utterance_id != current_id:
+                # New utterance: earlier commits belong to the previous one
+                current_id = utterance.utterance_id
+                self.agreement.reset()
+
+            if utterance.is_partial:
+                try:
+                    self._transcribe_partial(utterance, on_partial_text)
+                finally:
+                    self._partial_pending = False
+                continue
+
+            start_time = time.time()
+            queue_wait = time.monotonic() - utterance.ended_at
+            # Committed partial text is forced as a prefix, so only the tail is decoded here
+            committed = self.agreement.committed_text
+            try:
+                result = self.decode_policy.decode(
+                    self._run_model, utterance.audio, prefix=committed, word_timestamps=self.word_timestamps
+                )
+            finally:
+                self._release(utterance)
+            self.last_decode_tier = result.tier
+            segments = result.segments
+            text_result = "" if result.no_speech else self._segments_text(segments, committed)
+            self.agreement.reset()
+
+            latency = time.time() - start_time
+
+            if text_result:
+                print(f"User: {text_result} (STT Latency: {latency:.2f}s, Queue: {queue_wait:.2f}s, "
+                      f"Pre-committed: {len(committed)} chars, Tier: {result.tier} x{result.attempts})")
+                on_text_callback(text_result)
+
+                for segment in segments:
+                    if segment.words:
+                        for word in segment.words:
+                            print(f"[{word.start:.2f}s -> {word.end:.2f}s] {word.word}")
+
+            print("---------------------------")
+
+    def start(self, audio_io, on_text_callback, on_partial_text=None, on_barge_in=None):
         self.is_running = True
         self.audio_io = audio_io
-        self.audio_queue = audio_io.input_queue 
+        self.on_barge_in = on_barge_in
+        self.service.start()
 
-        
+        self.vad_thread = threading.Thread(
+            target=self._vad_worker,
+            daemon=True
+        )
         self.worker_thread = threading.Thread(
             target=self._transcribe_worker, 
-            args=(on_text_callback,), 
+            args=(on_text_callback, on_partial_text),
             daemon=True
         )
         self.worker_thread.start()
-
+        self.vad_thread.start()
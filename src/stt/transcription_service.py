@@ -0,0 +1,249 @@
+import dataclasses
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Whisper decodes fixed 30s windows; batched utterances each get one padded slot
+SLOT_SECONDS = 30
+SLOT_SAMPLES = SLOT_SECONDS * SAMPLE_RATE
+
+
+@dataclass
+class TranscriptionJob:
+    session_id: str
+    audio: np.ndarray
+    beam_size: int
+    prefix: Optional[str] = None
+    word_timestamps: bool = False
+    future: Future = field(default_factory=Future)
+    submitted_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def batch_key(self):
+        """Jobs can share a batched decode only if their decode options match."""
+        if self.prefix or self.word_timestamps or len(self.audio) > SLOT_SAMPLES:
+            return None  # Not supported by the batched pipeline; decoded on its own
+        return ("batch", self.beam_size)
+
+
+class TranscriptionSession:
+    """One client (room, stream) of a shared TranscriptionService."""
+
+    def __init__(self, service: "TranscriptionService", session_id: str):
+        self.service = service
+        self.session_id = session_id
+
+    def submit(self, audio: np.ndarray, beam_size: int, prefix: Optional[str] = None,
+               word_timestamps: bool = False) -> Future:
+        job = TranscriptionJob(self.session_id, audio, beam_size, prefix, word_timestamps)
+        self.service._enqueue(job)
+        return job.future
+
+    def transcribe(self, audio: np.ndarray, beam_size: int, prefix: Optional[str] = None,
+                   word_timestamps: bool = False) -> List[Any]:
+        """Blocking decode; same signature as the decode policy's TranscribeFn."""
+        return self.submit(audio, beam_size, prefix, word_timestamps).result()
+
+    def close(self):
+        self.service.close_session(self.session_id)
+
+
+class TranscriptionService:
+    """
+    Shares one WhisperModel between many sessions.
+
+    Pending jobs are kept per session and served round-robin, one job per
+    session per batch, so a chatty session cannot starve the others.
+    Compatible jobs from different sessions are decoded together with
+    faster-whisper's BatchedInferencePipeline; `num_workers` threads (and
+    CTranslate2 workers) run batches in parallel.
+    """
+
+    def __init__(self, model, num_workers: int = 1, max_batch_size: int = 8,
+                 batch_pipeline=None, language: str = "ja", initial_prompt: Optional[str] = None):
+        self.model = model
+        self.num_workers = num_workers
+        self.max_batch_size = max_batch_size
+        self.language = language
+        self.initial_prompt = initial_prompt
+        self._batch_pipeline = batch_pipeline
+
+        self._queues: "OrderedDict[str, Deque[TranscriptionJob]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._running = False
+        self._workers: List[threading.Thread] = []
+
+        self.stats: Dict[str, Any] = {"jobs": 0, "batches": 0, "batched_jobs": 0, "queue_wait_total": 0.0}
+
+    @classmethod
+    def from_model_size(cls, model_size: str, device: str = "auto", compute_type: str = "float32",
+                        num_workers: int = 1, **kwargs) -> "TranscriptionService":
+        from faster_whisper import WhisperModel
+        print(f"🔄 Whisperモデル読み込み中 ({model_size}, workers={num_workers})...")
+        model = WhisperModel(model_size, device=device, compute_type=compute_type, num_workers=num_workers)
+        return cls(model, num_workers=num_workers, **kwargs)
+
+    # --- Sessions ---
+
+    def open_session(self, session_id: str) -> TranscriptionSession:
+        with self._cond:
+            self._queues.setdefault(session_id, deque())
+        return TranscriptionSession(self, session_id)
+
+    def close_session(self, session_id: str):
+        with self._cond:
+            pending = self._queues.pop(session_id, deque())
+        for job in pending:
+            job.future.cancel()
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Start the decode workers. Idempotent; every session owner may call it."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker, name=f"stt-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.join(timeout=5.0)
+
+    def warmup(self, seconds: float = 1.0):
+        """One throwaway decode so CUDA kernels and CTranslate2 buffers exist before the first user."""
+        job = TranscriptionJob("warmup", np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32), beam_size=1)
+        self._decode_single(job)
+
+    # --- Scheduling ---
+
+    def _enqueue(self, job: TranscriptionJob):
+        with self._cond:
+            if job.session_id not in self._queues:
+                raise KeyError(f"Session {job.session_id!r} is not open")
+            self._queues[job.session_id].append(job)
+            self._cond.notify()
+
+    def _next_batch(self) -> List[TranscriptionJob]:
+        """Pick jobs fairly. Caller holds the lock."""
+        ready = [sid for sid, q in self._queues.items() if q]
+        if not ready:
+            return []
+
+        # Head of the round-robin order decides the batch's decode options
+        lead = ready[0]
+        batch = [self._queues[lead].popleft()]
+        key = batch[0].batch_key
+        self._queues.move_to_end(lead)  # Lead session goes to the back of the line
+
+        if key is not None:
+            for sid in ready[1:]:
+                if len(batch) >= self.max_batch_size:
+                    break
+                queue = self._queues[sid]
+                if queue[0].batch_key == key:
+                    batch.append(queue.popleft())
+                    self._queues.move_to_end(sid)
+        return batch
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+                while not batch:
+                    if not self._running:
+                        return
+                    self._cond.wait(timeout=1.0)
+                    batch = self._next_batch()
+
+            batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            now = time.monotonic()
+            with self._cond:
+                self.stats["jobs"] += len(batch)
+                self.stats["queue_wait_total"] += sum(now - job.submitted_at for job in batch)
+                if len(batch) > 1:
+                    self.stats["batches"] += 1
+                    self.stats["batched_jobs"] += len(batch)
+            try:
+                if len(batch) == 1:
+                    results = [self._decode_single(batch[0])]
+                else:
+                    results = self._decode_batch(batch)
+                for job, segments in zip(batch, results):
+                    job.future.set_result(segments)
+            except Exception as e:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+    # --- Decoding ---
+
+    def _decode_single(self, job: TranscriptionJob) -> List[Any]:
+        segments, _ = self.model.transcribe(
+            job.audio,
+            beam_size=job.beam_size,
+            language=self.language,
+            condition_on_previous_text=False, # Reduce hallucinations in streaming
+            initial_prompt=self.initial_prompt,
+            prefix=job.prefix or None,
+            word_timestamps=job.word_timestamps
+        )
+        return list(segments)
+
+    def _get_batch_pipeline(self):
+        if self._batch_pipeline is None:
+            from faster_whisper import BatchedInferencePipeline
+            self._batch_pipeline = BatchedInferencePipeline(model=self.model)
+        return self._batch_pipeline
+
+    def _decode_batch(self, batch: List[TranscriptionJob]) -> List[List[Any]]:
+        # Each utterance gets its own zero-padded 30s slot, so every clip is
+        # exactly one Whisper window and the pipeline never merges two sessions.
+        audio = np.zeros(SLOT_SAMPLES * len(batch), dtype=np.float32)
+        clips = []
+        for i, job in enumerate(batch):
+            start = i * SLOT_SAMPLES
+            audio[start:start + len(job.audio)] = job.audio
+            # faster-whisper takes clip_timestamps in seconds
+            clips.append({"start": i * SLOT_SECONDS, "end": (i + 1) * SLOT_SECONDS})
+
+        segments, _ = self._get_batch_pipeline().transcribe(
+            audio,
+            beam_size=batch[0].beam_size,
+            language=self.language,
+            initial_prompt=self.initial_prompt,
+            vad_filter=False,
+            clip_timestamps=clips,
+            batch_size=len(batch),
+        )
+
+        results: List[List[Any]] = [[] for _ in batch]
+        for segment in segments:
+            slot = min(int(segment.start // SLOT_SECONDS), len(batch) - 1)
+            results[slot].append(_shift_segment(segment, -slot * SLOT_SECONDS))
+        return results
+
+
+def _shift_segment(segment, offset: float):
+    """Make a batched segment's times relative to its own utterance."""
+    if offset == 0:
+        return segment
+    if dataclasses.is_dataclass(segment):
+        return dataclasses.replace(segment, start=segment.start + offset, end=segment.end + offset)
+    return segment._replace(start=segment.start + offset, end=segment.end + offset)
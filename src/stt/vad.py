@@ -0,0 +1,120 @@
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# Silero VAD operates on fixed 512-sample windows at 16kHz
+VAD_SAMPLE_RATE = 16000
+VAD_WINDOW = 512
+
+
+class VADEngine(ABC):
+    """Streaming voice activity detector that scores a batch of consecutive windows per call."""
+
+    window_size = VAD_WINDOW
+
+    @abstractmethod
+    def process(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Score consecutive windows of shape (n, window_size), oldest first.
+        Returns n speech probabilities. Recurrent state carries over between
+        windows and between calls exactly as with one call per window.
+        """
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """Clear recurrent state (e.g. at the end of an utterance)."""
+        pass
+
+    def warmup(self):
+        """Run one batch so lazy initialisation happens before the mic opens."""
+        self.process(np.zeros((4, self.window_size), dtype=np.float32))
+        self.reset()
+
+
+class TorchSileroVAD(VADEngine):
+    """Silero VAD via torch.hub, run without autograd and with a pinned thread count."""
+
+    def __init__(self, num_threads: int = 1):
+        import torch
+        self.torch = torch
+
+        # Keep torch from spreading VAD over every core (Whisper and llama.cpp need them)
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Can only be set once per process
+
+        self.model, _ = torch.hub.load(repo_or_dir='snakers4/silero-vad',
+                                       model='silero_vad',
+                                       force_reload=False,
+                                       trust_repo=True)
+        self.model.eval()
+
+    def process(self, windows: np.ndarray) -> np.ndarray:
+        torch = self.torch
+        with torch.inference_mode():
+            # One tensor wrap for the whole backlog, and a single device->host sync at the end
+            frames = torch.from_numpy(np.ascontiguousarray(windows, dtype=np.float32))
+            probs = [self.model(frames[i:i + 1], VAD_SAMPLE_RATE) for i in range(len(frames))]
+            return torch.cat(probs).reshape(-1).numpy()
+
+    def reset(self):
+        self.model.reset_states()
+
+
+class OnnxSileroVAD(VADEngine):
+    """Silero VAD on ONNX Runtime: numpy in/out, no torch dispatch overhead."""
+
+    CONTEXT = 64  # Samples of the previous window prepended to each input (v5 model)
+
+    def __init__(self, model_path: str = None, num_threads: int = 1):
+        import onnxruntime as ort
+
+        model_path = model_path or self._default_model_path()
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"Silero VAD ONNX model not found at {model_path} (set VAD_ONNX_PATH in config.py)"
+            )
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self._sr = np.array(VAD_SAMPLE_RATE, dtype=np.int64)
+        # Preallocated model input: [context | window]
+        self._input = np.zeros((1, self.CONTEXT + VAD_WINDOW), dtype=np.float32)
+        self.reset()
+
+    @staticmethod
+    def _default_model_path() -> str:
+        # The torch.hub checkout of silero-vad ships the ONNX export as well
+        hub_dir = os.path.join(os.path.expanduser("~"), ".cache", "torch", "hub")
+        return os.path.join(hub_dir, "snakers4_silero-vad_master", "src", "silero_vad", "data", "silero_vad.onnx")
+
+    def process(self, windows: np.ndarray) -> np.ndarray:
+        probs = np.empty(len(windows), dtype=np.float32)
+        for i, window in enumerate(windows):
+            self._input[0, self.CONTEXT:] = window
+            out, self._state = self.session.run(
+                None, {"input": self._input, "state": self._state, "sr": self._sr}
+            )
+            probs[i] = out[0, 0]
+            # Last samples of this window become the next window's context
+            self._input[0, :self.CONTEXT] = window[-self.CONTEXT:]
+        return probs
+
+    def reset(self):
+        self._state = np.zeros((2, 1, 128), dtype=np.float32)
+        self._input[:] = 0.0
+
+
+def create_vad(backend: str = "torch", num_threads: int = 1, onnx_path: str = None) -> VADEngine:
+    if backend == "torch":
+        return TorchSileroVAD(num_threads=num_threads)
+    if backend == "onnx":
+        return OnnxSileroVAD(model_path=onnx_path, num_threads=num_threads)
+    raise ValueError(f"Unknown VAD backend: {backend}")
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def cache_key(text: str, model_id, style: str, style_weight: float, length: float, sample_rate: int) -> str:
+    """Content address of one synthesized utterance: everything that changes the audio."""
+    spec = json.dumps([text, model_id, style, float(style_weight), float(length), int(sample_rate)],
+                      ensure_ascii=False)
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Synthesized speech, already resampled to the output rate.
+
+    Memory tier: LRU bounded by total bytes. Optional disk tier: one `.npy`
+    per key in `disk_dir`, loaded memory-mapped so a hit after a restart costs
+    a page-in rather than a synthesis. Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(os.path.getsize(p) for p in self._disk_files())
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.disk_dir is not None and os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return audio
+
+        audio = self._load(key)
+        with self._lock:
+            if audio is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._insert(key, audio)
+        return audio
+
+    def put(self, key: str, audio: np.ndarray):
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        audio.flags.writeable = False  # Shared by every playback of this phrase
+        with self._lock:
+            self._insert(key, audio)
+        if self.disk_dir:
+            self._store(key, audio)
+
+    def _insert(self, key: str, audio: np.ndarray):
+        """Caller holds the lock."""
+        if audio.nbytes > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._entries[key] = audio
+        self._bytes += audio.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+
+    # --- Disk tier ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def _disk_files(self):
+        return [os.path.join(self.disk_dir, f) for f in os.listdir(self.disk_dir) if f.endswith(".npy")]
+
+    def _load(self, key: str) -> Optional[np.ndarray]:
+        if not self.disk_dir:
+            return None
+        try:
+            audio = np.load(self._path(key), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(self._path(key))  # Recency for disk eviction
+        except OSError:
+            pass
+        return audio
+
+    def _store(self, key: str, audio: np.ndarray):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, audio)
+            os.replace(tmp, path)  # Readers never see a half-written file
+        except OSError as e:
+            print(f"⚠️ TTS cache write failed: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._trim_disk()
+
+    def _trim_disk(self):
+        """Drop least recently used files until under the limit. Caller holds the lock."""
+        files = sorted(self._disk_files(), key=os.path.getmtime)
+        for path in files:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
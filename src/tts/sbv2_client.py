@@ -0,0 +1,62 @@
+from typing import Any, Dict, Iterator, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.tts.wav_stream import WavStreamDecoder
+
+
+class SBV2APIError(RuntimeError):
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"SBV2 API Error {status_code}: {body}")
+        self.status_code = status_code
+
+
+class SBV2Client:
+    """
+    HTTP client for the Style-Bert-VITS2 API server.
+
+    Uses one keep-alive session with a connection pool sized for the number
+    of concurrent synthesis requests, explicit (connect, read) timeouts, and
+    streams the WAV body: audio is decoded and yielded as soon as the first
+    PCM bytes arrive instead of after the whole file has been downloaded.
+    """
+
+    def __init__(self, api_url: str = "http://127.0.0.1:5000", pool_size: int = 2,
+                 connect_timeout: float = 3.0, read_timeout: float = 30.0, chunk_bytes: int = 8192):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.chunk_bytes = chunk_bytes
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def stream_voice(self, params: Dict[str, Any]) -> Iterator[Tuple[int, np.ndarray]]:
+        """GET /voice and yield (sample_rate, mono float32 samples) blocks as they arrive."""
+        # Official endpoint (server_fastapi.py): GET /voice
+        with self.session.get(f"{self.api_url}/voice", params=params,
+                              timeout=self.timeout, stream=True) as response:
+            if response.status_code != 200:
+                raise SBV2APIError(response.status_code, response.text)
+
+            decoder = WavStreamDecoder()
+            for data in response.iter_content(chunk_size=self.chunk_bytes):
+                samples = decoder.feed(data)
+                if len(samples):
+                    yield decoder.sample_rate, samples
+            # Leaving the with-block after a full read returns the connection to the pool
+
+    def ping(self, path: str = "/models/info") -> bool:
+        """Cheap liveness probe (the server lists its loaded models)."""
+        try:
+            response = self.session.get(f"{self.api_url}{path}", timeout=self.timeout)
+            response.close()
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def close(self):
+        self.session.close()
@@ -7,3 +7,27 @@ class TTSInterface(ABC):
         Convert text to speech and output via AudioIO.
         """
         pass
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Wait until everything passed to speak() has been handed to AudioIO.
+        Returns False on timeout. Synchronous engines are always flushed.
+        """
+        return True
+
+    def cancel(self):
+        """Drop speech that is queued but not yet handed to AudioIO."""
+        pass
+
+    def interrupt(self):
+        """
+        Barge-in: stop playback now and drop queued speech.
+        Returns the playback position where speech was cut (see was_heard), or
+        None if the engine cannot tell.
+        """
+        self.cancel()
+        return None
+
+    def was_heard(self, handle, cut_position) -> bool:
+        """Whether the speech `speak()` returned `handle` for was fully played before `cut_position`."""
+        return True
@@ -0,0 +1,147 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Optional
+
+import numpy as np
+
+# text, options -> output-rate audio chunks, in playback order
+SynthesizeFn = Callable[..., Iterable[np.ndarray]]
+
+_DONE = object()  # End-of-job marker in a job's chunk queue
+
+
+class TTSJob:
+    def __init__(self, text: str, options: Dict[str, Any]):
+        self.text = text
+        self.options = options
+        self.chunks: "queue.Queue" = queue.Queue()
+        self.cancelled = False
+        # Sink position right after the job's last sample (set once fully delivered)
+        self.end_position: Optional[int] = None
+
+
+class TTSPipeline:
+    """
+    Non-blocking, ordered speech synthesis.
+
+    `submit()` returns immediately. Up to `max_in_flight` jobs synthesize
+    concurrently, each streaming its chunks into its own queue; a single
+    delivery thread drains the jobs strictly in submission order into `sink`
+    (normally AudioIO.enqueue_output), so a short sentence that finishes
+    early still waits for the one before it. With `position` (samples
+    written to the sink so far), each delivered job records its end
+    position, which tells whether it was heard before a playback cut.
+    """
+
+    def __init__(self, synthesize: SynthesizeFn, sink: Callable[[np.ndarray], Any], max_in_flight: int = 2,
+                 position: Callable[[], Optional[int]] = None):
+        self.synthesize = synthesize
+        self.sink = sink
+        self.position = position
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="tts-synth")
+
+        self._jobs: Deque[TTSJob] = deque()  # Submitted, not yet fully delivered
+        self._cond = threading.Condition()
+        self._closed = False
+        self._delivery_thread = threading.Thread(target=self._deliver, name="tts-delivery", daemon=True)
+        self._delivery_thread.start()
+
+    def submit(self, text: str, **options) -> TTSJob:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("TTSPipeline is closed")
+            job = TTSJob(text, options)
+            self._jobs.append(job)
+            self._cond.notify_all()
+        self._executor.submit(self._synthesize_job, job)
+        return job
+
+    def submit_audio(self, text: str, audio: np.ndarray) -> TTSJob:
+        """Queue audio that is already at the output rate (e.g. a cache hit); no synthesis slot is used."""
+        job = TTSJob(text, {})
+        job.chunks.put(audio)
+        job.chunks.put(_DONE)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("TTSPipeline is closed")
+            self._jobs.append(job)
+            self._cond.notify_all()
+        return job
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every submitted job has been handed to the sink.
+        Returns False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs, timeout=timeout)
+
+    def cancel(self):
+        """Drop everything queued or synthesizing; audio already in the sink is not touched."""
+        with self._cond:
+            for job in self._jobs:
+                job.cancelled = True
+                job.chunks.put(_DONE)  # Unblock the delivery thread if it waits on this job
+            self._jobs.clear()
+            self._cond.notify_all()
+
+    def close(self):
+        self.cancel()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def _synthesize_job(self, job: TTSJob):
+        try:
+            if job.cancelled:
+                return
+            for chunk in self.synthesize(job.text, **job.options):
+                if job.cancelled:
+                    return
+                if len(chunk):
+                    job.chunks.put(chunk)
+        except Exception as e:
+            print(f"❌ TTS Error: {e}")
+        finally:
+            job.chunks.put(_DONE)
+
+    def _deliver(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jobs or self._closed)
+                if not self._jobs:
+                    return
+                job = self._jobs[0]
+
+            try:
+                self._play(job)
+            except Exception as e:
+                # A failing sink loses this job only; the thread keeps delivering
+                job.cancelled = True
+                print(f"❌ TTS playback error ({job.text!r}): {e}")
+            finally:
+                with self._cond:
+                    if self._jobs and self._jobs[0] is job:
+                        self._jobs.popleft()
+                    self._cond.notify_all()
+
+    def _play(self, job: TTSJob):
+        while not job.cancelled:
+            chunk = job.chunks.get()
+            if chunk is _DONE or job.cancelled:
+                break
+            self.sink(chunk)
+        if not job.cancelled and self.position is not None:
+            try:
+                job.end_position = self.position()
+            except Exception as e:
+                print(f"⚠️ TTS position unavailable: {e}")
@@ -0,0 +1,306 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.tts.sbv2_client import SBV2APIError, SBV2Client
+from src.tts.tts_sbv2 import SBV2TTS
+
+
+class NoHealthyEndpointError(RuntimeError):
+    pass
+
+
+class Endpoint:
+    """One SBV2 server: its client, load and health."""
+
+    def __init__(self, url: str, client: SBV2Client, latency_window: int = 50):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.down_since = 0.0
+        self.requests = 0
+        self.failures = 0
+        self._ttfb: Deque[float] = deque(maxlen=latency_window)  # Time to first audio chunk
+
+    def record_latency(self, seconds: float):
+        self._ttfb.append(seconds)
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if not self._ttfb:
+            return None
+        return float(np.percentile(self._ttfb, q))
+
+    @property
+    def latency_samples(self) -> int:
+        return len(self._ttfb)
+
+
+class _Attempt:
+    def __init__(self, endpoint: Endpoint):
+        self.endpoint = endpoint
+        self.cancelled = False
+
+
+class EndpointPool:
+    """
+    Spreads SBV2 requests over several servers.
+
+    - Dispatch: least outstanding requests among healthy endpoints, ties
+      broken by lower p50 time-to-first-chunk.
+    - Passive health: `failure_threshold` consecutive transport/5xx errors
+      take an endpoint out of rotation.
+    - Active health: a background thread pings every endpoint each
+      `health_interval` seconds; a successful ping puts it back.
+    - Hedging: if no audio has arrived by the endpoint's p95 time-to-first-
+      chunk, the same request is sent to another endpoint and whichever
+      answers first is streamed; the other is abandoned.
+    - Failover: an error before the first chunk retries on another endpoint.
+
+    Exposes the same `stream_voice(params)` as SBV2Client, so SBV2TTS can use
+    it as its client.
+    """
+
+    def __init__(self, urls: Sequence[str], per_endpoint_in_flight: int = 2, connect_timeout: float = 3.0,
+                 read_timeout: float = 30.0, chunk_bytes: int = 8192, failure_threshold: int = 2,
+                 health_interval: float = 5.0, health_path: str = "/models/info", hedge: bool = True,
+                 hedge_min_samples: int = 10, hedge_min_delay: float = 0.2, clients: Sequence[Any] = None):
+        if not urls:
+            raise ValueError("At least one TTS endpoint is required")
+        if clients is None:
+            clients = [SBV2Client(url, pool_size=per_endpoint_in_flight * 2, connect_timeout=connect_timeout,
+                                  read_timeout=read_timeout, chunk_bytes=chunk_bytes) for url in urls]
+        self.endpoints: List[Endpoint] = [Endpoint(url, client) for url, client in zip(urls, clients)]
+        self.failure_threshold = failure_threshold
+        self.health_interval = health_interval
+        self.health_path = health_path
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+
+        self._stop = threading.Event()
+        self._health_thread = None
+        if health_interval and health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name="tts-health", daemon=True)
+            self._health_thread.start()
+
+    # --- Dispatch ---
+
+    def acquire(self, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        """Pick the least-loaded healthy endpoint (or, if none is healthy, the one down the longest)."""
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.healthy]
+            if healthy:
+                endpoint = min(healthy, key=lambda e: (e.outstanding, e.latency_percentile(50) or 0.0))
+            else:
+                # Better to try a server that may have recovered than to drop the sentence
+                endpoint = min(candidates, key=lambda e: e.down_since)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, ok: Optional[bool]):
+        """ok=None: abandoned (hedge loser), says nothing about health."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.healthy = True
+            elif ok is False:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.healthy and endpoint.consecutive_failures >= self.failure_threshold:
+                    endpoint.healthy = False
+                    endpoint.down_since = time.monotonic()
+                    print(f"⚠️ TTS endpoint down: {endpoint.url}")
+
+    def _hedge_delay(self, endpoint: Endpoint) -> Optional[float]:
+        with self._lock:
+            if not self.hedge or endpoint.latency_samples < self.hedge_min_samples:
+                return None
+            return max(self.hedge_min_delay, endpoint.latency_percentile(95))
+
+    # --- Streaming ---
+
+    def stream_voice(self, params: Dict[str, Any]) -> Iterator[Tuple[int, np.ndarray]]:
+        events: "queue.Queue" = queue.Queue()
+        attempts: List[_Attempt] = []
+
+        def launch() -> Optional[_Attempt]:
+            endpoint = self.acquire(exclude=[a.endpoint for a in attempts])
+            if endpoint is None:
+                return None
+            attempt = _Attempt(endpoint)
+            attempts.append(attempt)
+            threading.Thread(target=self._run_attempt, args=(attempt, params, events), daemon=True).start()
+            return attempt
+
+        with self._lock:
+            self.stats["requests"] += 1
+        primary = launch()
+        if primary is None:
+            raise NoHealthyEndpointError("No TTS endpoint available")
+        delay = self._hedge_delay(primary.endpoint)
+        hedge_at = time.monotonic() + delay if delay is not None else None
+
+        try:
+            # Phase 1: wait for the first chunk from any attempt
+            winner, first = None, None
+            running = 1
+            while winner is None:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                try:
+                    attempt, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedge_at = None
+                    if launch() is not None:
+                        running += 1
+                        with self._lock:
+                            self.stats["hedges"] += 1
+                    continue
+
+                if kind == "chunk":
+                    winner, first = attempt, payload
+                elif kind == "done":
+                    winner = attempt  # Empty response
+                else:
+                    running -= 1
+                    if isinstance(payload, SBV2APIError) and payload.status_code < 500:
+                        raise payload  # Bad request: every server would answer the same
+                    if running == 0:
+                        if launch() is None:
+                            raise payload
+                        running += 1
+                        with self._lock:
+                            self.stats["failovers"] += 1
+
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.cancelled = True
+            if winner is not primary:
+                with self._lock:
+                    self.stats["hedge_wins"] += 1
+            if first is None:
+                return
+
+            # Phase 2: stream the winner
+            yield first
+            while True:
+                attempt, kind, payload = events.get()
+                if attempt is not winner:
+                    continue
+                if kind == "chunk":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload  # Mid-utterance: part of it was already played, no retry
+        finally:
+            for attempt in attempts:
+                attempt.cancelled = True
+
+    def _run_attempt(self, attempt: _Attempt, params, events: "queue.Queue"):
+        endpoint = attempt.endpoint
+        start = time.monotonic()
+        ok: Optional[bool] = None
+        try:
+            stream = endpoint.client.stream_voice(params)
+            try:
+                for i, block in enumerate(stream):
+                    if attempt.cancelled:
+                        break
+                    if i == 0:
+                        with self._lock:
+                            endpoint.record_latency(time.monotonic() - start)
+                    events.put((attempt, "chunk", block))
+                else:
+                    ok = True
+            finally:
+                stream.close()  # Drops the HTTP response if we stopped early
+            events.put((attempt, "done", None))
+        except Exception as e:
+            if not attempt.cancelled:
+                client_error = isinstance(e, SBV2APIError) and e.status_code < 500
+                ok = True if client_error else False
+            events.put((attempt, "error", e))
+        finally:
+            self.release(endpoint, ok)
+
+    # --- Active health checks ---
+
+    def check_health(self):
+        for endpoint in self.endpoints:
+            alive = endpoint.client.ping(self.health_path)
+            with self._lock:
+                if alive and not endpoint.healthy:
+                    endpoint.healthy = True
+                    endpoint.consecutive_failures = 0
+                    print(f"✅ TTS endpoint back: {endpoint.url}")
+                elif not alive and endpoint.healthy:
+                    endpoint.healthy = False
+                    endpoint.down_since = time.monotonic()
+                    print(f"⚠️ TTS endpoint down: {endpoint.url}")
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"⚠️ TTS health check failed: {e}")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{
+                "url": e.url,
+                "healthy": e.healthy,
+                "outstanding": e.outstanding,
+                "requests": e.requests,
+                "failures": e.failures,
+                "p50": e.latency_percentile(50),
+                "p95": e.latency_percentile(95),
+            } for e in self.endpoints]
+
+    def close(self):
+        self._stop.set()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+
+class SBV2PoolTTS(SBV2TTS):
+    """SBV2TTS over several servers; in-flight sentences scale with the number of endpoints."""
+
+    def __init__(self, audio_io, api_urls: Sequence[str], per_endpoint_in_flight: int = 2,
+                 connect_timeout: float = 3.0, read_timeout: float = 30.0, stream_chunk_bytes: int = 8192,
+                 failure_threshold: int = 2, health_interval: float = 5.0, hedge: bool = True, **kwargs):
+        self.pool = EndpointPool(api_urls, per_endpoint_in_flight=per_endpoint_in_flight,
+                                 connect_timeout=connect_timeout, read_timeout=read_timeout,
+                                 chunk_bytes=stream_chunk_bytes, failure_threshold=failure_threshold,
+                                 health_interval=health_interval, hedge=hedge)
+        super().__init__(audio_io, api_url=api_urls[0], client=self.pool,
+                         max_in_flight=per_endpoint_in_flight * len(api_urls), **kwargs)
+        self.api_url = ", ".join(api_urls)  # For log messages
+
+    def warmup(self, text: str = "こんにちは"):
+        """Warm every endpoint, not just the one dispatch would pick."""
+        failures = []
+        for endpoint in self.pool.endpoints:
+            try:
+                for _ in endpoint.client.stream_voice(self._params(text, self.model_id, self.style)):
+                    pass
+            except Exception as e:
+                failures.append(f"{endpoint.url}: {e}")
+        if len(failures) == len(self.pool.endpoints):
+            raise RuntimeError("; ".join(failures))
+        for failure in failures:
+            print(f"⚠️ TTS warmup failed for {failure}")
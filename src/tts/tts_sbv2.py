@@ -1,41 +1,122 @@
-import requests
 import numpy as np
-import scipy.io.wavfile
-import scipy.signal
-import io
-import threading
-import urllib.parse
+from src.common.resampler import StreamingResampler
+from src.tts.audio_cache import AudioCache, cache_key
+from src.tts.sbv2_client import SBV2Client
 from src.tts.tts_interface import TTSInterface
+from src.tts.tts_pipeline import TTSPipeline
 
 class SBV2TTS(TTSInterface):
-    def __init__(self, audio_io, api_url="http://127.0.0.1:5000", model_id=2, style="s1", style_weight=1.0):
+    def __init__(self, audio_io, api_url="http://127.0.0.1:5000", model_id=2, style="s1", style_weight=1.0,
+                 length=0.7, max_in_flight=2, connect_timeout=3.0, read_timeout=30.0, stream_chunk_bytes=8192,
+                 cache: AudioCache = None, cache_max_text_chars=40, client=None):
         self.audio_io = audio_io
         self.api_url = api_url.rstrip("/")
         self.model_id = model_id
         self.style = style
         self.style_weight = style_weight
-        self.lock = threading.Lock()
-        print(f"🔄 SBV2TTS API Setup: {self.api_url} (Model={model_id})")
+        self.length = length
+        # Short, repeated phrases are played from the cache without touching the server
+        self.cache = cache
+        self.cache_max_text_chars = cache_max_text_chars
+        # Keep-alive pool with one connection per in-flight synthesis (or any object with stream_voice())
+        self.client = client or SBV2Client(self.api_url, pool_size=max_in_flight, connect_timeout=connect_timeout,
+                                           read_timeout=read_timeout, chunk_bytes=stream_chunk_bytes)
+        # Sentences are synthesized concurrently but played in the order they were spoken
+        self.pipeline = TTSPipeline(self._render, audio_io.enqueue_output, max_in_flight=max_in_flight,
+                                    position=lambda: getattr(audio_io, "output_position", None))
+        print(f"🔄 SBV2TTS API Setup: {self.api_url} (Model={model_id}, in-flight={max_in_flight})")
 
     def speak(self, text: str, **kwargs):
+        """Queue `text` for synthesis and return immediately (the returned job tracks its playback)."""
         if not text.strip():
             return
 
+        key = self._cache_key(text, kwargs.get('model_id', self.model_id), kwargs.get('style', self.style))
+        if key is not None:
+            audio = self.cache.get(key)
+            if audio is not None:
+                print(f"🔊 SBV2 Speaking (cached): {text}")
+                return self.pipeline.submit_audio(text, audio)
+
         print(f"🔊 SBV2 Speaking: {text}")
-        
+        return self.pipeline.submit(text, **kwargs)
+
+    def prewarm(self, phrases) -> int:
+        """Synthesize `phrases` into the cache (no playback). Returns how many needed synthesis."""
+        synthesized = 0
+        for text in phrases:
+            key = self._cache_key(text, self.model_id, self.style)
+            if key is None or key in self.cache:
+                continue
+            chunks = list(self._stream(text, self.model_id, self.style))
+            if chunks:
+                self.cache.put(key, np.concatenate(chunks))
+                synthesized += 1
+        return synthesized
+
+    def _cache_key(self, text, model_id, style):
+        if self.cache is None or len(text) > self.cache_max_text_chars:
+            return None
+        return cache_key(text, model_id, style, self.style_weight, self.length, self.audio_io.sample_rate)
+
+    def flush(self, timeout=None) -> bool:
+        return self.pipeline.flush(timeout)
+
+    def cancel(self):
+        self.pipeline.cancel()
+
+    def interrupt(self):
+        # Stop the delivery thread from starting another chunk, then cut what reached
+        # the buffer (a chunk still being written is cut by enqueue_output itself).
+        self.pipeline.cancel()  # Closes in-flight HTTP streams at their next chunk
+        # The playback position of the cut decides what the user actually heard
+        return self.audio_io.cancel_playback()
+
+    def was_heard(self, handle, cut_position) -> bool:
+        if handle is None or cut_position is None:
+            return True
+        return handle.end_position is not None and handle.end_position <= cut_position
+
+    def _render(self, text: str, **kwargs):
+        """Synthesis job run by the pipeline: yields output-rate chunks."""
         # Override params from kwargs if provided
         model_id = kwargs.get('model_id', self.model_id)
         style = kwargs.get('style', self.style)
         # weight = kwargs.get('weight', self.style_weight) # API might vary on param name
 
+        key = self._cache_key(text, model_id, style)
+        try:
+            chunks = []
+            for chunk in self._stream(text, model_id, style):
+                chunks.append(chunk)
+                yield chunk
+            if not chunks:
+                print("⚠️ SBV2 generated empty audio")
+            elif key is not None:
+                # Only reached if the job ran to completion (cancelled jobs stop at the yield)
+                self.cache.put(key, np.concatenate(chunks))
+
+        except Exception as e:
+            print(f"❌ SBV2 Error: {e}")
+            print(f"   (Is the API server running at {self.api_url}?)")
+
+    def warmup(self, text: str = "こんにちは"):
+        """
+        One synthesis round trip without playback: loads the voice model on the
+        server, opens the HTTP connection and builds the resampler filter.
+        """
+        for _ in self._stream(text, self.model_id, self.style):
+            pass
+
+    def _params(self, text, model_id, style):
         # Construct Query
         # Common Style-Bert-VITS2 API params:
         # text, model_id, speaker_id (sometimes), style, style_weight
         # We assume the "Voicevox compatible" or "Simple generic" API?
         # Let's try the common endpoint for local servers: /voice
         # params: text, model_id, speaker_id, sdp_ratio, noise, noisew, length, language, auto_split, split_interval, assist_text, assist_text_weight, style, style_weight
-        
-        params = {
+
+        return {
             "text": text,
             "model_id": model_id,
             "speaker_id": 0, # Default speaker
@@ -43,48 +124,19 @@ class SBV2TTS(TTSInterface):
             "style_weight": self.style_weight,
             "language": "JP", # Force JP usually
             "encoding": "utf-8", # Make sure text is handled right,
-            "length": 0.7
+            "length": self.length
         }
 
-        try:
-            with self.lock:
-                # Request to API
-                # Endpoint might be /voice or /synthesis. 
-                # Let's try /voice which is common for some wrappers. 
-                # OR user might be using the official "server_fastapi.py"?
-                # Official endpoint: GET /voice
-                
-                url = f"{self.api_url}/voice"
-                
-                response = requests.get(url, params=params)
-                
-                if response.status_code != 200:
-                    print(f"⚠️ SBV2 API Error {response.status_code}: {response.text}")
-                    return
-
-                # Response content should be WAV bytes
-                audio_content = response.content
-                
-                # Decode WAV
-                with io.BytesIO(audio_content) as bio:
-                    sample_rate, audio_data = scipy.io.wavfile.read(bio)
-                
-                # Convert to float32
-                if audio_data.dtype == np.int16:
-                    audio_data = audio_data.astype(np.float32) / 32768.0
-                elif audio_data.dtype == np.int32:
-                    audio_data = audio_data.astype(np.float32) / 2147483648.0
-                
-                # Resample
-                if len(audio_data) > 0:
-                    if sample_rate != self.audio_io.sample_rate:
-                        num_samples = int(len(audio_data) * self.audio_io.sample_rate / sample_rate)
-                        audio_data = scipy.signal.resample(audio_data, num_samples)
-                    
-                    self.audio_io.enqueue_output(audio_data)
-                else:
-                    print("⚠️ SBV2 generated empty audio")
-
-        except Exception as e:
-            print(f"❌ SBV2 Error: {e}")
-            print(f"   (Is the API server running at {self.api_url}?)")
+    def _stream(self, text, model_id, style):
+        """
+        Request one utterance and yield it resampled to the output rate while
+        the WAV body is still downloading.
+        """
+        params = self._params(text, model_id, style)
+        resampler = None
+        for sample_rate, samples in self.client.stream_voice(params):
+            if resampler is None:
+                resampler = StreamingResampler(sample_rate, self.audio_io.sample_rate)
+            yield resampler.process(samples)
+        if resampler is not None:
+            yield resampler.flush()
@@ -0,0 +1,115 @@
+import struct
+from typing import Optional
+
+import numpy as np
+
+_FORMAT_PCM = 1
+_FORMAT_FLOAT = 3
+_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Streaming servers that don't know the length up front write 0 or 0xFFFFFFFF
+_UNKNOWN_SIZES = (0, 0xFFFFFFFF)
+
+
+class WavFormatError(ValueError):
+    pass
+
+
+class WavStreamDecoder:
+    """
+    Incremental RIFF/WAVE parser.
+
+    Feed it response bytes as they arrive; once the header (up to the `data`
+    chunk) has been seen, every `feed()` returns the complete sample frames
+    received so far as mono float32. Partial frames are carried over to the
+    next call.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.header_parsed = False
+        self.sample_rate: Optional[int] = None
+        self.channels = 0
+        self.bits_per_sample = 0
+        self._dtype = None
+        self._data_remaining: Optional[int] = None  # None = until end of stream
+
+    def feed(self, data: bytes) -> np.ndarray:
+        self._buf += data
+        if not self.header_parsed and not self._parse_header():
+            return np.zeros(0, dtype=np.float32)
+        return self._take_frames()
+
+    def _parse_header(self) -> bool:
+        buf = self._buf
+        if len(buf) < 12:
+            return False
+        if buf[0:4] != b"RIFF" or buf[8:12] != b"WAVE":
+            raise WavFormatError("Not a RIFF/WAVE stream")
+
+        pos = 12
+        while True:
+            if len(buf) < pos + 8:
+                return False
+            chunk_id = bytes(buf[pos:pos + 4])
+            size = struct.unpack_from("<I", buf, pos + 4)[0]
+            body = pos + 8
+
+            if chunk_id == b"data":
+                if self._dtype is None:
+                    raise WavFormatError("data chunk before fmt chunk")
+                self._data_remaining = None if size in _UNKNOWN_SIZES else size
+                del buf[:body]
+                self.header_parsed = True
+                return True
+
+            padded = size + (size & 1)  # Chunks are word-aligned
+            if len(buf) < body + padded:
+                return False
+            if chunk_id == b"fmt ":
+                self._parse_fmt(bytes(buf[body:body + size]))
+            pos = body + padded
+
+    def _parse_fmt(self, fmt: bytes):
+        if len(fmt) < 16:
+            raise WavFormatError("Truncated fmt chunk")
+        fmt_tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", fmt)
+        if fmt_tag == _FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            fmt_tag = struct.unpack_from("<H", fmt, 24)[0]  # First two bytes of the sub-format GUID
+
+        if fmt_tag == _FORMAT_PCM and bits == 16:
+            dtype = np.dtype("<i2")
+        elif fmt_tag == _FORMAT_PCM and bits == 32:
+            dtype = np.dtype("<i4")
+        elif fmt_tag == _FORMAT_FLOAT and bits == 32:
+            dtype = np.dtype("<f4")
+        else:
+            raise WavFormatError(f"Unsupported WAV format (tag={fmt_tag}, bits={bits})")
+
+        self.channels = channels
+        self.sample_rate = rate
+        self.bits_per_sample = bits
+        self._dtype = dtype
+
+    def _take_frames(self) -> np.ndarray:
+        frame_bytes = self._dtype.itemsize * self.channels
+        available = len(self._buf)
+        if self._data_remaining is not None:
+            available = min(available, self._data_remaining)
+        n_frames = available // frame_bytes
+        if n_frames == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        n_bytes = n_frames * frame_bytes
+        samples = np.frombuffer(bytes(self._buf[:n_bytes]), dtype=self._dtype)
+        del self._buf[:n_bytes]
+        if self._data_remaining is not None:
+            self._data_remaining -= n_bytes
+
+        if self._dtype.kind == "i":
+            audio = samples.astype(np.float32) / float(2 ** (self.bits_per_sample - 1))
+        else:
+            audio = samples.astype(np.float32)
+        if self.channels > 1:
+            audio = audio.reshape(-1, self.channels).mean(axis=1)
+        return audio
@@ -0,0 +1,59 @@
+import numpy as np
+from src.tts.audio_cache import AudioCache, cache_key
+
+def clip(n, value=0.5):
+    return np.full(n, value, dtype=np.float32)
+
+def test_key_covers_every_synthesis_parameter():
+    base = cache_key("はい。", 2, "s1", 1.0, 0.7, 16000)
+    assert base == cache_key("はい。", 2, "s1", 1.0, 0.7, 16000)
+    variants = [
+        cache_key("はい", 2, "s1", 1.0, 0.7, 16000),
+        cache_key("はい。", 3, "s1", 1.0, 0.7, 16000),
+        cache_key("はい。", 2, "s2", 1.0, 0.7, 16000),
+        cache_key("はい。", 2, "s1", 1.5, 0.7, 16000),
+        cache_key("はい。", 2, "s1", 1.0, 1.0, 16000),
+        cache_key("はい。", 2, "s1", 1.0, 0.7, 48000),
+    ]
+    assert base not in variants and len(set(variants)) == len(variants)
+
+def test_lru_eviction_by_bytes():
+    cache = AudioCache(max_bytes=100 * 4)
+    cache.put("a", clip(40))
+    cache.put("b", clip(40))
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.put("c", clip(40))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes == 80 * 4
+    assert cache.stats["evictions"] == 1
+
+def test_oversized_entry_is_not_kept_in_memory():
+    cache = AudioCache(max_bytes=16)
+    cache.put("big", clip(100))
+    assert len(cache) == 0
+
+def test_entries_are_read_only():
+    cache = AudioCache()
+    cache.put("a", clip(4))
+    assert not cache.get("a").flags.writeable
+
+def test_disk_tier_survives_restart_and_is_memory_mapped(tmp_path):
+    AudioCache(disk_dir=str(tmp_path)).put("k", clip(10, 0.25))
+
+    cache = AudioCache(disk_dir=str(tmp_path))
+    assert "k" in cache
+    audio = cache.get("k")
+    assert isinstance(audio, np.memmap)
+    np.testing.assert_array_equal(audio, clip(10, 0.25))
+    assert cache.stats == {"hits": 0, "disk_hits": 1, "misses": 0, "evictions": 0}
+    assert cache.get("k") is audio  # Promoted to the memory tier
+    assert cache.stats["hits"] == 1
+
+def test_disk_tier_is_bounded(tmp_path):
+    entry = clip(1000)
+    cache = AudioCache(disk_dir=str(tmp_path), max_disk_bytes=int(entry.nbytes * 2.5))
+    for key in ("a", "b", "c", "d"):
+        cache.put(key, entry)
+    assert len(list(tmp_path.glob("*.npy"))) == 2
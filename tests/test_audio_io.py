@@ -0,0 +1,145 @@
+import numpy as np
+import scipy.io.wavfile
+from src.common.audio_io import AudioIO
+from src.common.audio_backend import VirtualAudioBackend
+from src.common.audio_telemetry import AudioTelemetry
+
+SR = 16000
+BLOCK = 512
+
+def make_audio_io(**backend_kwargs):
+    backend = VirtualAudioBackend(speed=None, **backend_kwargs)
+    return AudioIO(sample_rate=SR, block_size=BLOCK, output_buffer_seconds=2.0,
+                   input_buffer_seconds=2.0, backend=backend), backend
+
+def test_virtual_input_reaches_input_buffer():
+    signal = np.linspace(-1, 1, SR // 2, dtype=np.float32)
+    audio_io, backend = make_audio_io(input_audio=signal, tail_seconds=0.0)
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+
+    out = np.zeros(SR, dtype=np.float32)
+    n = audio_io.read_input(out, timeout=0.1)
+    # Input is delivered in whole blocks, the final one zero padded
+    assert n == -(-len(signal) // BLOCK) * BLOCK
+    np.testing.assert_array_equal(out[:len(signal)], signal)
+
+def test_enqueued_output_is_played_in_order():
+    tone = np.sin(np.arange(SR // 4) / 10).astype(np.float32)
+    audio_io, backend = make_audio_io(tail_seconds=0.5)
+    audio_io.enqueue_output(tone)
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+
+    recorded = backend.recorded_output()
+    np.testing.assert_array_equal(recorded[:len(tone)], tone)
+    assert not recorded[len(tone):].any()
+    assert not audio_io.is_playing
+
+def test_cancel_playback_flushes_output():
+    audio_io, backend = make_audio_io(tail_seconds=0.2)
+    audio_io.enqueue_output(np.ones(SR, dtype=np.float32))
+    audio_io.cancel_playback()
+    assert not audio_io.is_playing
+
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+    assert not backend.recorded_output().any()
+
+def test_cancel_playback_keeps_audio_enqueued_after_the_cut():
+    audio_io, backend = make_audio_io(tail_seconds=0.2)
+    audio_io.enqueue_output(np.ones(SR, dtype=np.float32))
+    audio_io.cancel_playback()
+    next_turn = np.full(BLOCK * 2, 0.5, dtype=np.float32)
+    audio_io.enqueue_output(next_turn)
+    assert audio_io.is_playing
+
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+    recorded = backend.recorded_output()
+    np.testing.assert_array_equal(recorded[:len(next_turn)], next_turn)
+    assert not recorded[len(next_turn):].any()
+
+def test_cancel_during_a_write_drops_that_write():
+    audio_io, backend = make_audio_io(tail_seconds=0.2)
+    write = audio_io.output_buffer.write
+
+    def cancelled_write(data):
+        audio_io.cancel_playback()  # Lands before the write publishes its samples
+        return write(data)
+    audio_io.output_buffer.write = cancelled_write
+    audio_io.enqueue_output(np.ones(SR, dtype=np.float32))
+    assert not audio_io.is_playing
+
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+    assert not backend.recorded_output().any()
+
+def test_recording_keeps_only_the_last_seconds():
+    ramp = np.arange(SR, dtype=np.float32) / SR
+    audio_io, backend = make_audio_io(tail_seconds=1.0, record_seconds=0.25)
+    audio_io.enqueue_output(ramp)
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+
+    recorded = backend.recorded_output()
+    assert len(recorded) == -(-SR // 4 // BLOCK) * BLOCK
+    played = np.concatenate([ramp, np.zeros(backend.frames_processed - SR, dtype=np.float32)])
+    np.testing.assert_array_equal(recorded, played[-len(recorded):])
+
+    audio_io, backend = make_audio_io(tail_seconds=0.2, record_seconds=0)
+    audio_io.enqueue_output(np.ones(BLOCK, dtype=np.float32))
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+    assert len(backend.recorded_output()) == 0
+
+def test_wav_input_and_simulated_clock(tmp_path):
+    """WAV files are resampled to the device rate; the clock tracks simulated time."""
+    path = tmp_path / "input.wav"
+    scipy.io.wavfile.write(path, 8000, (np.ones(8000) * 1000).astype(np.int16))
+
+    audio_io, backend = make_audio_io(input_path=str(path), tail_seconds=0.0)
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+
+    assert backend.elapsed >= 1.0
+    assert audio_io.input_buffer.available >= SR
+
+def test_telemetry_snapshot_reports_latency_and_callbacks():
+    audio_io, backend = make_audio_io(tail_seconds=0.5)
+    audio_io.enqueue_output(np.ones(BLOCK * 4, dtype=np.float32))
+    audio_io.start()
+    assert backend.wait_until_finished(timeout=5)
+    audio_io.stop()
+
+    snap = audio_io.telemetry_snapshot()
+    assert snap.callbacks == backend.frames_processed // BLOCK
+    assert snap.playback_underruns == 0
+    assert "p95" in snap.callback_time_us
+    assert snap.enqueue_to_play_ms["max"] >= 0
+    # Nobody drained the capture side, so its backlog is visible
+    assert snap.input_backlog_ms > 0
+
+def test_telemetry_counts_playback_gaps_and_capture_overruns():
+    telemetry = AudioTelemetry(underrun_resume_blocks=2)
+    telemetry.record_output(BLOCK, BLOCK)
+    telemetry.record_output(0, BLOCK)       # Ran dry...
+    telemetry.record_output(BLOCK, BLOCK)   # ...and resumed shortly after -> underrun
+    telemetry.record_output(0, BLOCK)
+    for _ in range(5):
+        telemetry.record_output(0, BLOCK)   # Long silence: end of utterance
+    telemetry.record_output(BLOCK, BLOCK)
+    telemetry.record_capture(100, BLOCK)
+
+    snap = telemetry.snapshot(0, 0, SR)
+    assert snap.playback_underruns == 1
+    assert snap.capture_overruns == 1
+    assert snap.capture_dropped_samples == BLOCK - 100
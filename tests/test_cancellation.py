@@ -0,0 +1,50 @@
+import threading
+
+from src.core.cancellation import CancellationToken
+
+
+def test_callbacks_run_once_on_cancel():
+    token = CancellationToken()
+    calls = []
+    token.add_callback(lambda: calls.append("a"))
+    assert not token.cancelled and token.cancelled_at is None
+
+    token.cancel()
+    token.cancel()
+    assert token.cancelled
+    assert token.cancelled_at is not None
+    assert calls == ["a"]
+
+
+def test_late_callback_runs_immediately():
+    token = CancellationToken()
+    token.cancel()
+    calls = []
+    token.add_callback(lambda: calls.append("late"))
+    assert calls == ["late"]
+
+
+def test_removed_callback_does_not_run():
+    token = CancellationToken()
+    calls = []
+    callback = lambda: calls.append("x")
+    token.add_callback(callback)
+    token.remove_callback(callback)
+    token.cancel()
+    assert calls == []
+
+
+def test_failing_callback_does_not_stop_the_others():
+    token = CancellationToken()
+    calls = []
+    token.add_callback(lambda: 1 / 0)
+    token.add_callback(lambda: calls.append("ok"))
+    token.cancel()
+    assert calls == ["ok"]
+
+
+def test_wait_returns_when_cancelled_from_another_thread():
+    token = CancellationToken()
+    assert token.wait(timeout=0.01) is False
+    threading.Timer(0.05, token.cancel).start()
+    assert token.wait(timeout=2) is True
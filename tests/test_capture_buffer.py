@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from src.stt.capture_buffer import CaptureBuffer, CapturePool, PreRoll
+
+def test_capture_buffer_is_bounded_and_view_is_zero_copy():
+    buf = CaptureBuffer(8)
+    assert buf.append(np.arange(5, dtype=np.float32)) == 5
+    assert buf.append(np.arange(5, dtype=np.float32)) == 3
+    assert buf.full
+
+    view = buf.view()
+    np.testing.assert_array_equal(view, [0, 1, 2, 3, 4, 0, 1, 2])
+    assert np.shares_memory(view, buf._buf)
+    with pytest.raises(ValueError):
+        view[0] = 1.0  # Consumers can't scribble on the capture
+
+def test_earlier_view_survives_later_appends():
+    buf = CaptureBuffer(8)
+    buf.append(np.ones(3, dtype=np.float32))
+    snapshot = buf.view()
+    buf.append(np.full(3, 2, dtype=np.float32))
+    np.testing.assert_array_equal(snapshot, [1, 1, 1])
+
+def test_preroll_keeps_most_recent_samples_in_order():
+    preroll = PreRoll(4)
+    preroll.push(np.array([1, 2, 3], dtype=np.float32))
+    preroll.push(np.array([4, 5, 6], dtype=np.float32))
+
+    capture = CaptureBuffer(10)
+    preroll.drain_into(capture)
+    np.testing.assert_array_equal(capture.view(), [3, 4, 5, 6])
+    assert preroll.length == 0
+
+def test_pool_hands_out_a_fixed_number_of_buffers():
+    pool = CapturePool(count=2, capacity=4)
+    a = pool.acquire()
+    b = pool.acquire()
+    assert a is not None and b is not None
+    assert pool.acquire() is None
+
+    a.append(np.ones(4, dtype=np.float32))
+    pool.release(a)
+    again = pool.acquire()
+    assert again is a
+    assert again.length == 0  # Cleared on acquire
@@ -0,0 +1,121 @@
+from src.core.conversation import (MESSAGE_OVERHEAD_TOKENS, SUMMARY_HEADER, ConversationManager, estimate_tokens,
+                                   summarize_turns)
+
+
+def words(text):
+    """One token per word keeps budgets easy to reason about."""
+    return len(text.split())
+
+
+def make(budget=100, **kwargs):
+    return ConversationManager("sys", token_budget=budget, token_counter=words, **kwargs)
+
+
+def add_turn(conversation, n, size=10):
+    conversation.add_user_message(f"question {n} " + "w " * (size - 2))
+    conversation.add_assistant_message("a " * size)
+
+
+def test_token_counts_are_cached_per_message():
+    calls = []
+    def counter(text):
+        calls.append(text)
+        return words(text)
+
+    conversation = ConversationManager("sys", token_counter=counter)
+    conversation.add_user_message("one two three")
+    conversation.get_history()
+    assert conversation.total_tokens == (1 + 3) + 2 * MESSAGE_OVERHEAD_TOKENS
+    assert calls == ["sys", "one two three"]
+
+
+def test_under_budget_nothing_is_evicted():
+    conversation = make(budget=1000)
+    for n in range(30):  # More than the old 20-message cap
+        add_turn(conversation, n)
+    assert len(conversation.get_history()) == 61
+    assert conversation.stats["evictions"] == 0
+
+
+def test_eviction_removes_whole_turns_in_one_block():
+    conversation = make(budget=100, evict_fraction=0.5)  # Each turn is 2 x (10 + 4) = 28 tokens
+    for n in range(4):
+        add_turn(conversation, n)
+
+    history = conversation.get_history()
+    assert conversation.stats["evictions"] == 1
+    assert conversation.total_tokens <= 50 + 28
+    assert history[0]["content"] == "sys"
+    assert history[1]["role"] == "user"  # Never starts mid-turn
+    assert history[-1]["role"] == "assistant" and history[-2]["content"].startswith("question 3")
+
+
+def test_prefix_is_stable_between_evictions():
+    conversation = make(budget=200, evict_fraction=0.5)
+    prefixes = []
+    for n in range(20):
+        add_turn(conversation, n)
+        prefixes.append(conversation.get_history()[1]["content"])
+
+    changes = sum(1 for a, b in zip(prefixes, prefixes[1:]) if a != b)
+    assert changes == conversation.stats["evictions"]
+    assert changes <= 20 // 3  # Block eviction, not once per turn
+
+
+def test_tool_outputs_leave_with_their_turn():
+    conversation = make(budget=60, evict_fraction=0.5)
+    conversation.add_user_message("what time")
+    conversation.add_assistant_message(tool_calls=[{"id": "c1", "type": "function",
+                                                    "function": {"name": "clock", "arguments": "{}"}}])
+    conversation.add_tool_output("c1", "x " * 30)
+    conversation.add_assistant_message("three")
+    conversation.add_user_message("thanks")
+
+    roles = [m["role"] for m in conversation.get_history()]
+    assert roles == ["system", "user"]
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    conversation = make(budget=10)
+    conversation.add_user_message("w " * 50)
+    assert len(conversation.get_history()) == 2
+
+
+def test_rolling_summary_replaces_evicted_turns():
+    conversation = make(budget=100, evict_fraction=0.5, summarizer=summarize_turns)
+    for n in range(8):
+        add_turn(conversation, n)
+
+    history = conversation.get_history()
+    assert history[0]["content"] == "sys"
+    assert history[1]["role"] == "system" and history[1]["content"].startswith(SUMMARY_HEADER)
+    assert "User: question 0" in conversation.summary
+    assert history[2]["role"] == "user"
+    assert conversation.total_tokens == sum(conversation.count_tokens(m) for m in history)
+
+
+def test_revised_message_is_recounted():
+    conversation = make()
+    conversation.add_user_message("hi")
+    conversation.add_assistant_message("one two three four")
+    conversation.revise_last_assistant_message("one")
+    assert conversation.total_tokens == sum(conversation.count_tokens(m) for m in conversation.get_history())
+    conversation.revise_last_assistant_message("")
+    assert len(conversation.get_history()) == 2
+    assert len(conversation._tokens) == 2
+
+
+def test_summary_is_bounded_and_skips_tool_output():
+    messages = [{"role": "user", "content": "turn on the light"},
+                {"role": "assistant", "tool_calls": [{"function": {"name": "light", "arguments": "{}"}}]},
+                {"role": "tool", "content": "ok " * 100},
+                {"role": "assistant", "content": "Done."}]
+    summary = summarize_turns(messages)
+    assert summary.splitlines() == ["User: turn on the light", "Assistant used light", "Assistant: Done."]
+    assert len(summarize_turns(messages * 50, max_chars=200)) <= 200
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hello world!") == 3
+    assert estimate_tokens("今日は") == 3
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+from src.stt.decode_policy import AdaptiveDecodePolicy, DecodeTier
+
+def segment(text="こんにちは", avg_logprob=-0.2, compression_ratio=1.2, no_speech_prob=0.01):
+    return SimpleNamespace(text=text, avg_logprob=avg_logprob,
+                           compression_ratio=compression_ratio, no_speech_prob=no_speech_prob)
+
+class FakeModel:
+    """Returns canned segments per beam size and records the calls."""
+    def __init__(self, by_beam):
+        self.by_beam = by_beam
+        self.calls = []
+
+    def __call__(self, audio, beam_size, prefix, word_timestamps):
+        self.calls.append((beam_size, prefix, word_timestamps))
+        return self.by_beam[beam_size]
+
+def make_policy():
+    return AdaptiveDecodePolicy([DecodeTier("greedy", 1), DecodeTier("wide", 10)])
+
+AUDIO = np.zeros(16000, dtype=np.float32)
+
+def test_confident_greedy_result_is_not_redecoded():
+    model = FakeModel({1: [segment()], 10: [segment("wide")]})
+    policy = make_policy()
+    result = policy.decode(model, AUDIO)
+
+    assert result.tier == "greedy"
+    assert result.attempts == 1
+    assert model.calls == [(1, None, False)]
+    assert policy.tier_counts["greedy"] == 1
+
+def test_low_logprob_escalates_to_wide_beam():
+    model = FakeModel({1: [segment(avg_logprob=-1.5)], 10: [segment("wide")]})
+    result = make_policy().decode(model, AUDIO, prefix="今日", word_timestamps=True)
+
+    assert result.tier == "wide"
+    assert result.segments[0].text == "wide"
+    assert [c[0] for c in model.calls] == [1, 10]
+    # Prefix and word-timestamp requests are passed through to every tier
+    assert all(c[1:] == ("今日", True) for c in model.calls)
+
+def test_repetition_loop_escalates():
+    model = FakeModel({1: [segment(compression_ratio=3.0)], 10: [segment()]})
+    assert make_policy().decode(model, AUDIO).tier == "wide"
+
+def test_last_tier_is_accepted_even_if_unconfident():
+    model = FakeModel({1: [segment(avg_logprob=-2.0)], 10: [segment(avg_logprob=-2.0)]})
+    result = make_policy().decode(model, AUDIO)
+    assert result.tier == "wide"
+    assert result.confident is False
+
+def test_silence_is_accepted_without_escalation():
+    model = FakeModel({1: [segment("ご視聴ありがとうございました", avg_logprob=-1.2, no_speech_prob=0.9)]})
+    result = make_policy().decode(model, AUDIO)
+    assert result.tier == "greedy"
+    assert result.no_speech is True
+
+def test_from_config():
+    policy = AdaptiveDecodePolicy.from_config(
+        [{"name": "fast", "beam_size": 2}], min_avg_logprob=-0.5
+    )
+    assert policy.tiers == [DecodeTier("fast", 2)]
+    assert policy.min_avg_logprob == -0.5
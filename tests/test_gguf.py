@@ -0,0 +1,29 @@
+import struct
+
+import pytest
+
+from src.llm.gguf import read_gguf_header
+
+
+def write_gguf(path, magic=b"GGUF", version=3, n_tensors=291, n_kv=24, padding=64):
+    path.write_bytes(struct.pack("<4sIQQ", magic, version, n_tensors, n_kv) + b"\0" * padding)
+    return str(path)
+
+
+def test_reads_the_fixed_header(tmp_path):
+    header = read_gguf_header(write_gguf(tmp_path / "model.gguf"))
+    assert (header.version, header.n_tensors, header.n_kv) == (3, 291, 24)
+    assert header.file_size == 24 + 64
+
+
+def test_rejects_files_that_are_not_gguf(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_gguf_header(str(tmp_path / "missing.gguf"))
+    with pytest.raises(ValueError, match="not a GGUF"):
+        read_gguf_header(write_gguf(tmp_path / "page.gguf", magic=b"<htm"))
+    with pytest.raises(ValueError, match="version"):
+        read_gguf_header(write_gguf(tmp_path / "old.gguf", version=1))
+    truncated = tmp_path / "truncated.gguf"
+    truncated.write_bytes(b"GGUF\3\0")
+    with pytest.raises(ValueError, match="too small"):
+        read_gguf_header(str(truncated))
@@ -0,0 +1,167 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+llm_module = pytest.importorskip("src.llm.llm", exc_type=ImportError)  # Needs llama-cpp-python
+
+from src.core.cancellation import CancellationToken
+
+
+class FakeLlama:
+    """Streams one chunk per word; records how far the stream was consumed."""
+
+    def __init__(self, words, prompt=(1, 2, 3)):
+        self.words = words
+        self.prompt = np.array(prompt, dtype=np.intc)
+        self.generated = 0
+        self.closed = False
+        self._input_ids = np.array([], dtype=np.intc)
+
+    def set_cache(self, cache):
+        pass
+
+    def create_chat_completion(self, **kwargs):
+        try:
+            for word in self.words:
+                # Like llama.cpp: every sampled token goes through the logits processors
+                input_ids = np.concatenate([self.prompt, np.zeros(self.generated, dtype=np.intc)])
+                for processor in kwargs.get("logits_processor") or []:
+                    processor(input_ids, np.zeros(4, dtype=np.single))
+                self.generated += 1
+                yield {"choices": [{"delta": {"content": word}}]}
+        finally:
+            self.closed = True
+
+
+class ShapedLlama(FakeLlama):
+    """
+    Buffers sized and written like llama-cpp-python 0.3: with a draft model every
+    evaluated token gets a scores row, but scores only has n_ctx rows when
+    logits_all was passed (n_batch rows otherwise).
+    """
+    n_vocab = 16
+
+    def __init__(self, n_ctx, n_batch, logits_all=False, draft_model=None, **kwargs):
+        super().__init__([])
+        self.n_batch = n_batch
+        self._logits_all = logits_all if draft_model is None else True
+        self.n_tokens = 0
+        self.scores = np.zeros((n_ctx if logits_all else n_batch, self.n_vocab), dtype=np.single)
+
+    def eval(self, tokens):
+        for i in range(0, len(tokens), self.n_batch):
+            batch = tokens[i:i + self.n_batch]
+            if self._logits_all:
+                self.scores[self.n_tokens:self.n_tokens + len(batch), :] = np.ones((len(batch), self.n_vocab))
+            self.n_tokens += len(batch)
+
+
+@pytest.fixture
+def make_llm(monkeypatch):
+    def make(words):
+        fake = FakeLlama(words)
+        monkeypatch.setattr(llm_module.Llama, "from_pretrained", lambda **kwargs: fake)
+        llm = llm_module.LocalLLM(repo_id="repo", filename="model.gguf")
+        monkeypatch.setattr(llm, "_tokenize_prompt", lambda *args: pytest.fail("prompt tokenized twice"))
+        return llm, fake
+    return make
+
+
+def test_generation_stops_within_a_token_of_cancel(make_llm):
+    llm, fake = make_llm(["a", "b", "c", "d", "e"])
+    token = CancellationToken()
+
+    received = []
+    for kind, text in llm.chat_stream([{"role": "user", "content": "hi"}], cancel=token):
+        received.append(text)
+        if len(received) == 2:
+            token.cancel()
+
+    assert received == ["a", "b"]
+    assert fake.generated == 3  # The token in flight at cancel time is discarded
+    assert fake.closed
+    assert llm._lock.acquire(blocking=False)  # The model is free for the next turn
+
+
+def test_prompt_stats_come_from_the_evaluated_prompt(make_llm):
+    llm, fake = make_llm(["a", "b"])
+    fake._input_ids = np.array([1, 2, 9], dtype=np.intc)  # Previous turn shares two tokens
+
+    list(llm.chat_stream([{"role": "user", "content": "hi"}]))
+
+    assert llm.last_prompt_stats == {"prompt_tokens": 3, "context_hit": 2, "cache_hit": 0,
+                                     "saved": 2, "prefill": 1}
+    assert llm.last_decode_stats["tokens"] == 2
+
+
+class YieldOnceSlot:
+    """Scheduler slot that asks for one switch after the first sentence."""
+
+    def __init__(self):
+        self.tokens = 0
+        self.switches = []
+
+    def count_token(self):
+        self.tokens += 1
+
+    def should_yield(self, text):
+        return not self.switches and text.endswith("。")
+
+    def wait_turn(self):
+        return True
+
+    def record_switch(self, seconds):
+        self.switches.append(seconds)
+
+
+def test_slot_gets_sampled_tokens_and_switch_cost(make_llm):
+    llm, fake = make_llm(["a", "b。", "c"])
+    states = []
+    fake.save_state = lambda: SimpleNamespace(llama_state_size=2**20, scores=np.zeros((4, 4), dtype=np.single))
+    fake.load_state = states.append
+    slot = YieldOnceSlot()
+
+    assert [text for _, text in llm.chat_stream([{"role": "user", "content": "hi"}], slot=slot)] == ["a", "b。", "c"]
+    assert slot.tokens == 3  # One per logits-processor call
+    assert len(states) == 1 and len(slot.switches) == 1
+
+
+def test_local_model_path_skips_the_hub(monkeypatch, tmp_path):
+    import struct
+
+    loaded = {}
+
+    class LocalLlama(llm_module.Llama):
+        def __init__(self, **kwargs):
+            loaded.update(kwargs)
+
+        @classmethod
+        def from_pretrained(cls, **kwargs):
+            pytest.fail("hub lookup for a local model")
+
+    monkeypatch.setattr(llm_module, "Llama", LocalLlama)
+    path = tmp_path / "model.gguf"
+    path.write_bytes(struct.pack("<4sIQQ", b"GGUF", 3, 1, 1))
+
+    llm_module.LocalLLM(model_path=str(path), n_batch=256, n_threads=4, use_mlock=True)
+    assert loaded["model_path"] == str(path)
+    assert (loaded["n_batch"], loaded["n_threads"], loaded["use_mlock"], loaded["verbose"]) == (256, 4, True, False)
+
+    path.write_bytes(b"Not Found")
+    with pytest.raises(ValueError):
+        llm_module.LocalLLM(model_path=str(path))
+
+
+def test_drafting_keeps_a_scores_row_for_every_context_position(monkeypatch):
+    monkeypatch.setattr(llm_module.Llama, "from_pretrained", lambda **kwargs: ShapedLlama(**kwargs))
+    prompt = list(range(1500))  # System prompt + tools alone pass n_batch
+
+    with pytest.raises(ValueError):  # What llama-cpp-python does without logits_all
+        ShapedLlama(n_ctx=2048, n_batch=512, draft_model=object()).eval(prompt)
+
+    llm = llm_module.LocalLLM(repo_id="repo", filename="model.gguf", context_size=2048, n_batch=512,
+                              draft_model=object())
+    llm.llm.eval(prompt)
+    assert llm.llm.scores.shape == (2048, ShapedLlama.n_vocab)
+    assert llm.llm.n_tokens == 1500
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from src.core.cancellation import CancellationToken
+from src.mcp.mcp_client import MCPClient
+
+
+class SlowSession:
+    """MCP session whose tool runs until it is cancelled."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.cancelled = threading.Event()
+
+    async def call_tool(self, name, arguments):
+        self.started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+@pytest.fixture
+def client(tmp_path):
+    config = tmp_path / "mcp.json"
+    config.write_text(json.dumps({"mcpServers": {}}), encoding="utf-8")
+    client = MCPClient(str(config))
+    yield client
+    client.close()
+
+
+def test_cancel_aborts_a_pending_tool_call(client):
+    session = SlowSession()
+    client.sessions["slow"] = session
+    token = CancellationToken()
+    threading.Thread(target=lambda: (session.started.wait(2), token.cancel())).start()
+
+    start = time.monotonic()
+    result = client.call_tool("slow", {}, cancel=token)
+
+    assert time.monotonic() - start < 5
+    assert "cancelled" in result
+    assert session.cancelled.wait(timeout=2)  # The task on the MCP loop was cancelled too
+    assert token._callbacks == []
+
+
+def test_call_with_a_cancelled_token_does_not_wait(client):
+    session = SlowSession()
+    client.sessions["slow"] = session
+    token = CancellationToken()
+    token.cancel()
+    assert "cancelled" in client.call_tool("slow", {}, cancel=token)
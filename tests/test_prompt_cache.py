@@ -0,0 +1,130 @@
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.llm.prompt_cache import PromptCache
+
+
+@dataclass
+class FakeState:
+    """Stand-in for llama_cpp.LlamaState with the fields the cache looks at."""
+    input_ids: np.ndarray
+    llama_state: bytes
+    llama_state_size: int
+
+
+def make_state(tokens, kv_bytes=1000):
+    return FakeState(np.asarray(tokens, dtype=np.intc), b"\0" * kv_bytes, kv_bytes)
+
+
+def test_lookup_returns_longest_prefix():
+    """A prompt extending a cached conversation gets that state back."""
+    cache = PromptCache()
+    cache[[1, 2, 3]] = make_state([1, 2, 3])
+    cache[[1, 9, 9, 9]] = make_state([1, 9, 9, 9])
+
+    state = cache[[1, 2, 3, 4, 5]]
+    assert state.input_ids.tolist() == [1, 2, 3]
+    assert cache.longest_prefix([1, 2, 3, 4, 5]) == 3
+    assert cache.stats["ram_hits"] == 1
+    assert cache.stats["hit_tokens"] == 3
+
+
+def test_miss_raises_key_error():
+    cache = PromptCache()
+    cache[[1, 2]] = make_state([1, 2])
+    assert [7, 8] not in cache
+    try:
+        cache[[7, 8]]
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+    assert cache.stats["misses"] == 1
+
+
+def test_longer_state_replaces_its_prefixes():
+    """Turn N's state covers turn N-1's, so only one entry is kept."""
+    cache = PromptCache()
+    cache[[1, 2, 3]] = make_state([1, 2, 3])
+    cache[[1, 2, 3, 4, 5]] = make_state([1, 2, 3, 4, 5])
+    assert cache.cache_size == make_state([1, 2, 3, 4, 5]).llama_state_size + 5 * 4
+    assert cache[[1, 2, 3, 7]].input_ids.tolist() == [1, 2, 3, 4, 5]
+
+
+def test_ram_budget_evicts_least_recently_used():
+    cache = PromptCache(capacity_bytes=2500)
+    cache[[1]] = make_state([1])
+    cache[[2]] = make_state([2])
+    cache[[1, 5]]  # Touch [1]
+    cache[[3]] = make_state([3])
+
+    assert cache.longest_prefix([2]) == 0
+    assert cache.longest_prefix([1]) == 1
+    assert cache.longest_prefix([3]) == 1
+    assert cache.stats["evictions"] == 1
+    assert cache.cache_size <= 2500
+
+
+def test_min_tokens_skips_short_prompts():
+    cache = PromptCache(min_tokens=4)
+    cache[[1, 2, 3]] = make_state([1, 2, 3])
+    assert cache.stats["stores"] == 0
+    assert [1, 2, 3] not in cache
+
+
+def test_evicted_states_spill_to_disk(tmp_path):
+    cache = PromptCache(capacity_bytes=1500, disk_dir=str(tmp_path))
+    cache[[1, 2]] = make_state([1, 2])
+    cache[[3, 4]] = make_state([3, 4])  # Pushes [1, 2] to disk
+    assert cache.wait_for_writes(timeout=2)
+
+    state = cache[[1, 2, 9]]
+    assert state.input_ids.tolist() == [1, 2]
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_flushed_states_survive_restart(tmp_path):
+    """The warmed-up system prompt is restored from disk by the next process."""
+    cache = PromptCache(disk_dir=str(tmp_path))
+    cache[[10, 11, 12]] = make_state([10, 11, 12])
+    cache.flush()
+
+    restarted = PromptCache(disk_dir=str(tmp_path))
+    assert restarted.longest_prefix([10, 11, 12, 13]) == 3
+    assert restarted[[10, 11, 12, 13]].input_ids.tolist() == [10, 11, 12]
+
+
+def test_disk_budget_drops_oldest(tmp_path):
+    cache = PromptCache(capacity_bytes=1, disk_dir=str(tmp_path), disk_capacity_bytes=2500)
+    for i in range(4):
+        cache[[i, i]] = make_state([i, i])  # Each store evicts the previous state to disk
+        assert cache.wait_for_writes(timeout=2)
+
+    assert cache.longest_prefix([0, 0]) == 0
+    assert cache.longest_prefix([3, 3]) == 2
+    assert len(list(tmp_path.glob("*.state"))) <= 2
+
+
+class SlowState(FakeState):
+    """Pickling blocks until `released` is set, like a multi-hundred-MB state on a slow disk."""
+    released = threading.Event()
+
+    def __reduce__(self):
+        assert self.released.wait(timeout=2)
+        return FakeState, (self.input_ids, self.llama_state, self.llama_state_size)
+
+
+def test_spill_is_written_outside_the_lock(tmp_path):
+    cache = PromptCache(capacity_bytes=1500, disk_dir=str(tmp_path))
+    cache[[1, 2]] = SlowState(np.asarray([1, 2], dtype=np.intc), b"\0" * 1000, 1000)
+    cache[[3, 4]] = make_state([3, 4])  # Queues [1, 2] for the writer, which blocks
+
+    # Stores and lookups go on meanwhile; the evicted state is served from memory
+    cache[[5, 6]] = make_state([5, 6])
+    assert cache[[1, 2, 9]].input_ids.tolist() == [1, 2]
+    assert not cache.wait_for_writes(timeout=0.05)
+
+    SlowState.released.set()
+    assert cache.wait_for_writes(timeout=2)
+    assert len(list(tmp_path.glob("*.state"))) >= 1
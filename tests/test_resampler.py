@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import scipy.signal
+from src.common.resampler import StreamingResampler, _design_polyphase
+
+@pytest.mark.parametrize("src_rate, dst_rate", [(44100, 16000), (24000, 16000), (8000, 16000)])
+def test_chunked_output_matches_resample_poly(src_rate, dst_rate):
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal(50_003).astype(np.float32)
+    expected = scipy.signal.resample_poly(signal, dst_rate, src_rate)
+
+    resampler = StreamingResampler(src_rate, dst_rate)
+    outputs = []
+    cursor = 0
+    # Irregular chunk sizes exercise both the gather and the per-phase paths
+    while cursor < len(signal):
+        size = int(rng.integers(1, 20_000))
+        outputs.append(resampler.process(signal[cursor:cursor + size]))
+        cursor += size
+    outputs.append(resampler.flush())
+    result = np.concatenate(outputs)
+
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result, expected, atol=1e-5)
+
+def test_flush_resets_state_for_next_stream():
+    resampler = StreamingResampler(44100, 16000)
+    signal = np.ones(4410, dtype=np.float32)
+    first = np.concatenate([resampler.process(signal), resampler.flush()])
+    second = np.concatenate([resampler.process(signal), resampler.flush()])
+    np.testing.assert_array_equal(first, second)
+
+def test_equal_rates_pass_through():
+    resampler = StreamingResampler(16000, 16000)
+    signal = np.arange(10, dtype=np.float32)
+    np.testing.assert_array_equal(resampler.process(signal), signal)
+    assert len(resampler.flush()) == 0
+
+def test_filter_is_designed_once_per_rate_pair():
+    _design_polyphase.cache_clear()
+    StreamingResampler(44100, 16000)
+    StreamingResampler(44100, 16000)
+    assert _design_polyphase.cache_info().misses == 1
@@ -0,0 +1,49 @@
+import numpy as np
+from src.common.ring_buffer import RingBuffer
+
+def test_write_and_read_roundtrip():
+    rb = RingBuffer(8)
+    assert rb.write(np.arange(5, dtype=np.float32)) == 5
+    assert rb.available == 5
+    assert rb.free == 3
+
+    out = np.zeros(3, dtype=np.float32)
+    assert rb.read_into(out) == 3
+    np.testing.assert_array_equal(out, [0, 1, 2])
+    assert rb.available == 2
+
+def test_wraparound_preserves_order():
+    rb = RingBuffer(8)
+    out = np.zeros(8, dtype=np.float32)
+    rb.write(np.arange(6, dtype=np.float32))
+    rb.read_into(out[:6])
+
+    # Next write crosses the end of the storage array
+    assert rb.write(np.arange(10, 16, dtype=np.float32)) == 6
+    assert rb.read_into(out) == 6
+    np.testing.assert_array_equal(out[:6], np.arange(10, 16))
+
+def test_write_is_bounded_by_capacity():
+    """A full buffer rejects extra samples instead of growing."""
+    rb = RingBuffer(4)
+    assert rb.write(np.ones(10, dtype=np.float32)) == 4
+    assert rb.free == 0
+    assert rb.write(np.ones(1, dtype=np.float32)) == 0
+
+def test_discard_drops_readable_samples():
+    rb = RingBuffer(4)
+    rb.write(np.ones(3, dtype=np.float32))
+    assert rb.discard() == 3
+    assert rb.available == 0
+    assert rb.read_into(np.zeros(2, dtype=np.float32)) == 0
+
+def test_discard_until_keeps_later_samples():
+    rb = RingBuffer(8)
+    rb.write(np.ones(3, dtype=np.float32))
+    cut = rb.write_position
+    rb.write(np.full(2, 2.0, dtype=np.float32))
+    assert rb.discard(cut) == 3
+    assert rb.discard(cut) == 0  # Already past the cut
+    out = np.zeros(2, dtype=np.float32)
+    assert rb.read_into(out) == 2
+    np.testing.assert_array_equal(out, [2.0, 2.0])
@@ -0,0 +1,150 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+import scipy.io.wavfile
+from src.tts.sbv2_client import SBV2APIError, SBV2Client
+from src.tts.tts_sbv2 import SBV2TTS
+
+RATE = 44100
+PCM = (np.sin(np.arange(RATE) * 0.05) * 10000).astype(np.int16)  # 1s
+
+def wav_bytes(pcm):
+    bio = io.BytesIO()
+    scipy.io.wavfile.write(bio, RATE, pcm)
+    return bio.getvalue()
+
+class StandInServer:
+    """Local stand-in for the SBV2 API: GET /voice returns a WAV in two parts."""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+        self.hold = threading.Event()  # Set to release the second half of the body
+        self.hold.set()
+        self.status = 200
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive
+
+            def setup(self):
+                super().setup()
+                stand_in.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stand_in.requests.append(parse_qs(urlparse(self.path).query))
+                if stand_in.status != 200:
+                    body = b"model not found"
+                    self.send_response(stand_in.status)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                payload = wav_bytes(PCM)
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/wav")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                half = len(payload) // 2
+                self.wfile.write(payload[:half])
+                self.wfile.flush()
+                stand_in.hold.wait(5)
+                self.wfile.write(payload[half:])
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.hold.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def server():
+    s = StandInServer()
+    yield s
+    s.close()
+
+def test_streams_full_audio_and_reuses_the_connection(server):
+    client = SBV2Client(server.url, pool_size=1)
+    for _ in range(3):
+        blocks = list(client.stream_voice({"text": "こんにちは"}))
+        assert all(rate == RATE for rate, _ in blocks)
+        audio = np.concatenate([b for _, b in blocks])
+        np.testing.assert_allclose(audio, PCM / 32768.0, atol=1e-7)
+    assert server.connections == 1  # Keep-alive: one TCP connection for three sentences
+    assert server.requests[0]["text"] == ["こんにちは"]
+    client.close()
+
+def test_first_audio_arrives_before_the_body_is_complete(server):
+    server.hold.clear()
+    client = SBV2Client(server.url)
+    stream = client.stream_voice({"text": "long sentence"})
+    rate, first = next(stream)  # Would block until `hold` if the body were buffered
+    assert rate == RATE and len(first) > 0
+    assert not server.hold.is_set()
+    server.hold.set()
+    rest = sum(len(b) for _, b in stream)
+    assert len(first) + rest == len(PCM)
+    client.close()
+
+def test_error_status_raises(server):
+    server.status = 404
+    client = SBV2Client(server.url)
+    with pytest.raises(SBV2APIError) as excinfo:
+        list(client.stream_voice({"text": "x"}))
+    assert excinfo.value.status_code == 404
+    client.close()
+
+def test_read_timeout(server):
+    server.hold.clear()
+    client = SBV2Client(server.url, read_timeout=0.2)
+    with pytest.raises(Exception):
+        list(client.stream_voice({"text": "x"}))
+    client.close()
+
+class FakeAudioIO:
+    sample_rate = 16000
+    def __init__(self):
+        self.chunks = []
+    def enqueue_output(self, samples):
+        self.chunks.append(samples)
+
+def test_sbv2_tts_streams_resampled_audio_into_audio_io(server):
+    audio_io = FakeAudioIO()
+    tts = SBV2TTS(audio_io, api_url=server.url, stream_chunk_bytes=4096)
+    tts.speak("テスト")
+    assert tts.flush(timeout=5)
+
+    total = sum(len(c) for c in audio_io.chunks)
+    assert len(audio_io.chunks) > 1  # Enqueued incrementally, not as one block
+    assert abs(total - 16000) <= 2
+
+def test_cached_phrase_skips_the_server(server, tmp_path):
+    from src.tts.audio_cache import AudioCache
+
+    audio_io = FakeAudioIO()
+    tts = SBV2TTS(audio_io, api_url=server.url, cache=AudioCache(disk_dir=str(tmp_path)))
+    assert tts.prewarm(["はい。"]) == 1
+    assert tts.prewarm(["はい。"]) == 0  # Already cached
+    assert len(server.requests) == 1
+
+    tts.speak("はい。")
+    tts.speak("はい。", style="s2")  # Different style -> different audio
+    assert tts.flush(timeout=5)
+    assert len(server.requests) == 2
+    assert abs(sum(len(c) for c in audio_io.chunks) - 2 * 16000) <= 4
+
+    # Long sentences are not cached
+    tts.speak("あ" * 100)
+    tts.speak("あ" * 100)
+    assert tts.flush(timeout=5)
+    assert len(server.requests) == 4
@@ -0,0 +1,176 @@
+import threading
+import time
+
+import pytest
+from src.core.conversation import ConversationManager
+from src.core.scheduler import PREEMPT, LLMScheduler
+
+
+class SliceLLM:
+    """
+    Yields `n` chunks for a "name:n" prompt and honours the scheduler's time slices
+    like LocalLLM. Each chunk is `tokens_per_chunk` sampled tokens; every
+    `sentence_every`-th chunk ends a sentence.
+    """
+
+    def __init__(self, tokens_per_chunk=1, sentence_every=1):
+        self.tokens_per_chunk = tokens_per_chunk
+        self.sentence_every = sentence_every
+        self.log = []
+
+    def chat_stream(self, messages, tools=None, slot=None, cancel=None):
+        name, n = messages[-1]["content"].split(":")
+        for i in range(1, int(n) + 1):
+            self.log.append(name)
+            text = "x。" if i % self.sentence_every == 0 else "x"
+            if slot is not None:
+                for _ in range(self.tokens_per_chunk):
+                    slot.count_token()
+            yield ("content", text)
+            if slot is not None and slot.should_yield(text):
+                if slot.wait_turn():
+                    slot.record_switch(0.002)
+
+
+def make_scheduler(llm=None, **kwargs):
+    llm = llm or SliceLLM()
+    return llm, LLMScheduler(llm, conversation_factory=lambda: ConversationManager("system"), **kwargs)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def run_turn(scheduler, session_id, prompt, out=None):
+    with scheduler.turn(session_id) as turn:
+        items = list(scheduler.chat_stream(turn, [{"role": "user", "content": prompt}]))
+    if out is not None:
+        out.append(items)
+
+
+def test_long_answer_gives_way_to_a_waiting_session():
+    llm, scheduler = make_scheduler(quantum_tokens=4)
+    b_started = []
+
+    with scheduler.turn("a") as turn:
+        stream = scheduler.chat_stream(turn, [{"role": "user", "content": "long:20"}])
+        next(stream)
+        b = threading.Thread(target=run_turn, args=(scheduler, "b", "short:3", b_started))
+        b.start()
+        wait_for(lambda: scheduler._has_waiters())
+        rest = list(stream)
+    b.join(timeout=2)
+
+    assert len(rest) == 19
+    assert llm.log == ["long"] * 4 + ["short"] * 3 + ["long"] * 16
+    stats = scheduler.sessions["b"].stats
+    assert stats.tokens == 3
+    assert stats.max_queue_wait_sec > 0
+    assert scheduler.sessions["a"].stats.switches == 1
+    assert scheduler.metrics()[0]["avg_switch_ms"] == 2.0
+
+
+def interleave(llm, quantum_tokens):
+    """Log of a long answer that a short one from another session starts waiting behind."""
+    llm, scheduler = make_scheduler(llm, quantum_tokens=quantum_tokens)
+    with scheduler.turn("a") as turn:
+        stream = scheduler.chat_stream(turn, [{"role": "user", "content": "long:20"}])
+        next(stream)
+        b = threading.Thread(target=run_turn, args=(scheduler, "b", "short:3"))
+        b.start()
+        wait_for(lambda: scheduler._has_waiters())
+        list(stream)
+    b.join(timeout=2)
+    return llm.log, scheduler
+
+
+def test_time_slice_ends_at_a_sentence_end():
+    log, _ = interleave(SliceLLM(sentence_every=3), quantum_tokens=4)
+    assert log == ["long"] * 6 + ["short"] * 3 + ["long"] * 14
+
+
+def test_time_slice_without_a_sentence_end_is_capped():
+    # Two tokens per chunk: the quantum counts sampled tokens, not chunks
+    log, scheduler = interleave(SliceLLM(tokens_per_chunk=2, sentence_every=100), quantum_tokens=4)
+    assert log == ["long"] * 4 + ["short"] * 3 + ["long"] * 16
+    assert scheduler.sessions["a"].stats.tokens == 40
+    assert scheduler.sessions["b"].stats.tokens == 6
+
+
+def test_no_slicing_without_waiters():
+    llm, scheduler = make_scheduler(quantum_tokens=2)
+    run_turn(scheduler, "a", "solo:10")
+    assert scheduler.sessions["a"].stats.waits == 1  # Never gave the model up
+
+
+def test_queue_policy_serializes_a_session():
+    llm, scheduler = make_scheduler()
+    order = []
+
+    def turn(label, hold):
+        with scheduler.turn("a"):
+            order.append(f"{label} start")
+            time.sleep(hold)
+            order.append(f"{label} end")
+
+    first = threading.Thread(target=turn, args=("first", 0.1))
+    first.start()
+    wait_for(lambda: order)
+    turn("second", 0)
+    first.join()
+    assert order == ["first start", "first end", "second start", "second end"]
+
+
+def test_preempt_policy_stops_the_running_turn():
+    llm, scheduler = make_scheduler(policy=PREEMPT)
+    done = []
+
+    with scheduler.turn("a") as first:
+        second = threading.Thread(target=run_turn, args=(scheduler, "a", "new:2", done))
+        second.start()
+        wait_for(lambda: first.cancelled)
+        assert list(scheduler.chat_stream(first, [{"role": "user", "content": "old:5"}])) == []
+    second.join(timeout=2)
+
+    assert done == [[("content", "x。")] * 2]
+    assert scheduler.sessions["a"].stats.preempted == 1
+
+
+def test_sessions_have_their_own_history():
+    llm, scheduler = make_scheduler()
+    scheduler.session("a").conversation.add_user_message("hi")
+    assert len(scheduler.session("b").conversation.get_history()) == 1
+    with pytest.raises(KeyError):
+        LLMScheduler(llm).session("unknown")
+    assert [m["session"] for m in scheduler.metrics()] == ["a", "b"]
+
+
+def test_waiting_generation_gives_up_when_cancelled():
+    llm, scheduler = make_scheduler()
+    results = []
+
+    with scheduler.turn("a") as running:
+        stream = scheduler.chat_stream(running, [{"role": "user", "content": "long:5"}])
+        next(stream)  # "a" holds the model
+
+        def waiter():
+            with scheduler.turn("b") as turn:
+                waiting.append(turn)
+                results.append(list(scheduler.chat_stream(turn, [{"role": "user", "content": "b:3"}])))
+
+        waiting = []
+        b = threading.Thread(target=waiter)
+        b.start()
+        wait_for(lambda: scheduler._has_waiters())
+        waiting[0].cancel()
+        b.join(timeout=2)
+        assert not b.is_alive()
+        assert not scheduler._has_waiters()
+        stream.close()
+
+    assert results == [[]]
+    assert "b" not in llm.log
+    assert not scheduler.busy
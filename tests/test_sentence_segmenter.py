@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from src.core.sentence_segmenter import SegmenterPolicy, SentenceSegmenter
+
+def segment(text, step=1, **policy):
+    segmenter = SentenceSegmenter(SegmenterPolicy(**policy))
+    chunks = []
+    for i in range(0, len(text), step):
+        chunks += segmenter.feed(text[i:i + step])
+    return chunks + segmenter.flush()
+
+def test_first_chunk_ends_at_first_clause():
+    chunks = segment("えーと、今日は晴れだよ。")
+    assert chunks == ["えーと、", "今日は晴れだよ。"]
+
+def test_short_clause_is_not_a_first_chunk():
+    # "はい、" is below first_min_chars, so the first chunk runs to the sentence end
+    assert segment("はい、わかりました。")[0] == "はい、わかりました。"
+
+def test_later_chunks_grow_toward_target():
+    text = "はい、わかりました。今日の東京の天気は晴れです。気温は23.5度で、湿度は40%です。明日は雨が降るでしょう。傘を持って行ってね！"
+    chunks = segment(text)
+    assert chunks == [
+        "はい、わかりました。",
+        "今日の東京の天気は晴れです。気温は23.5度で、湿度は40%です。",
+        "明日は雨が降るでしょう。傘を持って行ってね！",
+    ]
+    assert "".join(chunks) == text
+
+@pytest.mark.parametrize("sentence", [
+    "Pi is 3.14 and the version is v1.2.",
+    "It costs 1,000 yen at 10:30.",
+    "Ask Mr. Smith, e.g. about the U.S. office.",
+    "Visit https://example.com/a?b=1!c and www.example.org/x.y today.",
+    "円周率は3.14です。",
+])
+def test_no_split_inside_numbers_abbreviations_or_urls(sentence):
+    # Long first_min_chars and target: the only legal cut is the final one
+    assert segment(sentence, first_min_chars=1000, target_chars=1000) == [sentence]
+
+@pytest.mark.parametrize("step", [1, 2, 5])
+def test_decimal_point_split_across_deltas(step):
+    assert segment("値は3.14です。", step=step) == ["値は3.14です。"]
+
+def test_closing_quotes_stay_with_their_sentence():
+    chunks = segment("彼は「はい！」と言った。He said \"OK!\" and left.", target_chars=1)
+    assert chunks == ["彼は「はい！」", "と言った。", "He said \"OK!\"", "and left."]
+
+def test_hard_cap_without_punctuation():
+    chunks = segment("あ" * 300, max_chars=120)
+    assert [len(c) for c in chunks] == [120, 120, 60]
+
+def test_hard_cap_prefers_spaces():
+    chunks = segment("word " * 40, max_chars=50)
+    assert chunks == [" ".join(["word"] * 10)] * 4
+
+def test_flush_resets_for_next_response():
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("途中") == []
+    assert segmenter.flush() == ["途中"]
+    assert segmenter.feed("えーと、はい") == ["えーと、"]  # Short first chunk again
+
+# --- Benchmarks ---
+
+REPLY = ("えーと、今日の東京の天気を調べてみるね。東京は一日中晴れで、最高気温は23.5度、最低気温は15度だよ。"
+         "夕方から少し風が強くなるみたいだから、上着を持って行くといいかな。明日は雨の予報だから傘を忘れないでね！")
+
+def tokens(text, size=2):
+    """Rough stand-in for LLM tokenization: 2 characters per delta."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def legacy_chunks(deltas):
+    """The old chat_stream behaviour: flush whenever a delta contains a delimiter."""
+    delimiters = ["。", "！", "？", "\n", "!", "?", "."]
+    buffer, out = "", []
+    for i, token in enumerate(deltas):
+        buffer += token
+        if any(d in token for d in delimiters):
+            out.append((i, buffer))
+            buffer = ""
+    return out
+
+def test_benchmark_first_chunk_latency():
+    deltas = tokens(REPLY)
+    segmenter = SentenceSegmenter()
+    first_at = None
+    for i, delta in enumerate(deltas):
+        if segmenter.feed(delta) and first_at is None:
+            first_at = i
+    legacy_first_at = legacy_chunks(deltas)[0][0]
+
+    tok_per_sec = 30.0
+    print(f"\nfirst chunk after {first_at + 1} tokens ({(first_at + 1) / tok_per_sec * 1000:.0f}ms @30tok/s), "
+          f"legacy {legacy_first_at + 1} tokens ({(legacy_first_at + 1) / tok_per_sec * 1000:.0f}ms)")
+    assert first_at < legacy_first_at
+
+def test_benchmark_feed_cost():
+    deltas = tokens(REPLY) * 50
+    segmenter = SentenceSegmenter()
+    start = time.perf_counter()
+    chunks = []
+    for delta in deltas:
+        chunks += segmenter.feed(delta)
+    chunks += segmenter.flush()
+    per_token_us = (time.perf_counter() - start) / len(deltas) * 1e6
+
+    print(f"\nsegmenter: {per_token_us:.1f}us/token over {len(deltas)} tokens, {len(chunks)} chunks")
+    assert "".join(chunks) == REPLY * 50
+    assert per_token_us < 200  # Negligible next to ~30ms per generated token
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from src.llm.speculative import GGUFDraftModel, MeteredDraftModel, create_draft_model
+
+
+class FixedDraft:
+    def __init__(self, guesses):
+        self.guesses = guesses
+
+    def __call__(self, input_ids, **kwargs):
+        return np.array(self.guesses, dtype=np.intc)
+
+
+def test_acceptance_counts_verified_guesses():
+    draft = MeteredDraftModel(FixedDraft([7, 8, 9]))
+    draft(np.array([1, 2, 3]))
+    # Target accepted 7 and 8, then sampled 5 instead of 9
+    draft(np.array([1, 2, 3, 7, 8, 5]))
+    assert draft.proposed == 3
+    assert draft.accepted == 2
+
+
+def test_all_guesses_accepted():
+    draft = MeteredDraftModel(FixedDraft([7, 8]))
+    draft(np.array([1]))
+    draft(np.array([1, 7, 8, 4]))  # Both accepted plus the target's bonus token
+    assert draft.accepted == 2
+    assert draft.acceptance_rate == 1.0  # The second round's guesses are not verified yet
+
+
+def test_reset_starts_a_new_turn():
+    draft = MeteredDraftModel(FixedDraft([7]))
+    draft(np.array([1, 2]))
+    draft.reset()
+    draft(np.array([1, 2, 7]))  # Not compared against the previous turn's guess
+    assert (draft.proposed, draft.accepted) == (0, 0)
+    assert MeteredDraftModel(FixedDraft([])).acceptance_rate is None
+
+
+class CountingLlama:
+    """
+    Deterministic stand-in for llama_cpp.Llama: always predicts previous token + 1.
+    Like llama-cpp-python, input_ids is a fixed buffer (stale past n_tokens),
+    scores has n_ctx rows only with logits_all (n_batch otherwise) and is only
+    written in that mode.
+    """
+    vocab = 32
+
+    def __init__(self, logits_all=True, n_ctx=64, n_batch=8):
+        self._logits_all = logits_all
+        self.input_ids = np.full(n_ctx, 5, dtype=np.intc)
+        self.n_tokens = 0
+        self.evaluated = 0
+        self.scores = np.zeros((n_ctx if logits_all else n_batch, self.vocab), dtype=np.float32)
+
+    @property
+    def _input_ids(self):
+        return self.input_ids[:self.n_tokens]
+
+    def eval(self, tokens):
+        for token in tokens:
+            self.input_ids[self.n_tokens] = token
+            if self._logits_all:
+                self.scores[self.n_tokens] = 0
+                self.scores[self.n_tokens, (token + 1) % self.vocab] = 1
+            self.n_tokens += 1
+        self.evaluated += len(tokens)
+
+    def token_eos(self):
+        return 0
+
+
+def test_gguf_draft_reuses_its_own_context():
+    llm = CountingLlama()
+    draft = GGUFDraftModel(llm, num_draft_tokens=3)
+
+    assert draft(np.array([1, 2, 3])).tolist() == [4, 5, 6]
+    assert llm.evaluated == 3 + 2  # Prompt plus all guesses but the last
+    # Target accepted 4, rejected 5: only the divergent token is evaluated
+    assert draft(np.array([1, 2, 3, 4, 9])).tolist() == [10, 11, 12]
+    assert llm.evaluated == 5 + 1 + 2
+
+
+def test_gguf_draft_ignores_stale_tokens_past_its_context():
+    llm = CountingLlama()
+    draft = GGUFDraftModel(llm, num_draft_tokens=2)
+    draft(np.array([1, 2, 3]))
+    llm.n_tokens = 1  # Rolled back; the buffer still holds 2, 3, 4 after it
+    assert draft(np.array([1, 2, 3])).tolist() == [4, 5]
+    assert llm.evaluated == 4 + 3
+
+
+def test_gguf_draft_requires_logits_for_every_token():
+    with pytest.raises(ValueError):
+        GGUFDraftModel(CountingLlama(logits_all=False))
+
+
+def test_gguf_draft_stops_at_eos():
+    llm = CountingLlama()
+    assert GGUFDraftModel(llm, num_draft_tokens=4)(np.array([30])).tolist() == [31]
+
+
+def test_create_draft_model():
+    assert create_draft_model(None) is None
+    with pytest.raises(ValueError):
+        create_draft_model("medusa")
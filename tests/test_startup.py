@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+from src.core.startup import StartupError, StartupOrchestrator
+
+def test_independent_components_load_concurrently():
+    startup = StartupOrchestrator(max_workers=4)
+    for name in ("a", "b", "c"):
+        startup.add(name, lambda name=name: time.sleep(0.2) or name)
+
+    t0 = time.perf_counter()
+    startup.run()
+    assert time.perf_counter() - t0 < 0.5  # Not 3 x 0.2s
+    assert all(t.load_sec >= 0.2 for t in startup.timings)
+
+def test_dependents_get_warm_dependencies_as_arguments():
+    events = []
+    startup = StartupOrchestrator()
+    startup.add("model", lambda: {"warm": False},
+                warmup=lambda m: (events.append("warmup"), m.update(warm=True)))
+    startup.add("user", lambda model: (events.append("user"), model["warm"])[1], depends_on=["model"])
+
+    components = startup.run()
+    assert components["user"] is True
+    assert events == ["warmup", "user"]
+
+def test_warmup_can_be_disabled():
+    called = threading.Event()
+    startup = StartupOrchestrator(warmup=False)
+    startup.add("x", lambda: 1, warmup=lambda _: called.set())
+    startup.run()
+    assert not called.is_set()
+
+def test_failed_warmup_is_not_fatal():
+    def fail(_):
+        raise RuntimeError("server down")
+    startup = StartupOrchestrator()
+    startup.add("tts", lambda: "tts", warmup=fail)
+
+    assert startup.run()["tts"] == "tts"
+    assert startup.timings[0].warmup_error == "server down"
+    assert "warmup failed" in startup.report()
+
+def test_optional_failure_skips_dependents():
+    def boom():
+        raise RuntimeError("no model")
+    startup = StartupOrchestrator()
+    startup.add("llm", boom, required=False)
+    startup.add("prompt", lambda llm: "cached", depends_on=["llm"], required=False)
+    startup.add("other", lambda: "ok")
+
+    components = startup.run()
+    assert components == {"llm": None, "prompt": None, "other": "ok"}
+    assert [t.skipped for t in startup.timings] == [False, True, False]
+
+def test_required_failure_raises_after_everything_settles():
+    def boom():
+        raise RuntimeError("no model")
+    startup = StartupOrchestrator()
+    startup.add("llm", boom)
+    startup.add("mcp", lambda: time.sleep(0.1) or "mcp")
+
+    with pytest.raises(StartupError, match="llm: no model"):
+        startup.run()
+    assert startup.components["mcp"] == "mcp"  # Available for cleanup
+
+def test_unknown_dependency_is_rejected():
+    startup = StartupOrchestrator()
+    with pytest.raises(ValueError):
+        startup.add("stt", lambda vad: None, depends_on=["vad"])
@@ -0,0 +1,91 @@
+import re
+import time
+
+import pytest
+from src.core.stream_parser import TEXT, THINK, TOOL_CALL, TagStreamParser
+
+TOOL_JSON = '{"name": "get_weather", "arguments": {"city": "Tokyo"}}'
+RESPONSE = f"<think>Need the weather. a < b</think>調べるね！<tool_call>{TOOL_JSON}</tool_call>ちょっと待ってね。"
+
+
+def parse(text, step=1):
+    parser = TagStreamParser()
+    events = []
+    for i in range(0, len(text), step):
+        events += parser.feed(text[i:i + step])
+    events += parser.flush()
+    # Merge adjacent events of one kind so results don't depend on delta boundaries
+    merged = []
+    for kind, data in events:
+        if merged and merged[-1][0] == kind and kind != TOOL_CALL:
+            merged[-1] = (kind, merged[-1][1] + data)
+        else:
+            merged.append((kind, data))
+    return merged
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 5, 7, 1000])
+def test_events_do_not_depend_on_delta_boundaries(step):
+    assert parse(RESPONSE, step) == [
+        (THINK, "Need the weather. a < b"),
+        (TEXT, "調べるね！"),
+        (TOOL_CALL, TOOL_JSON),
+        (TEXT, "ちょっと待ってね。"),
+    ]
+
+
+def test_lone_angle_brackets_are_text():
+    assert parse("1 < 2 and <b>bold</b> <tool", 1) == [(TEXT, "1 < 2 and <b>bold</b> <tool")]
+
+
+def test_partial_tag_is_held_back_until_decided():
+    parser = TagStreamParser()
+    assert parser.feed("Hi <tool_") == [(TEXT, "Hi ")]
+    assert parser.feed("call>{}") == []
+    assert parser.feed("</tool_call>") == [(TOOL_CALL, "{}")]
+
+
+def test_unterminated_tool_call_is_dropped():
+    assert parse("OK<tool_call>{\"name\":") == [(TEXT, "OK")]
+
+
+def legacy_scan(deltas):
+    """The loop this parser replaced: regex scans over the whole buffer on every delta."""
+    stream_buffer, spoken, in_think = "", [], False
+    for delta in deltas:
+        stream_buffer += delta
+        if "<think>" in stream_buffer:
+            in_think = True
+        if in_think:
+            if "</think>" in stream_buffer:
+                stream_buffer = re.sub(r'<think>.*?</think>', '', stream_buffer, flags=re.DOTALL)
+                in_think = False
+            else:
+                continue
+        spoken.append(stream_buffer)
+        stream_buffer = ""
+    return spoken
+
+
+def test_benchmark_throughput():
+    # A long reasoning block, the case where rescanning the buffer is quadratic
+    reasoning = "<think>" + "Let me think about this step by step. " * 400 + "</think>"
+    text = reasoning + "答えは四十二だよ。"
+    deltas = [text[i:i + 3] for i in range(0, len(text), 3)]
+
+    start = time.perf_counter()
+    parser = TagStreamParser()
+    events = []
+    for delta in deltas:
+        events += parser.feed(delta)
+    events += parser.flush()
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy_scan(deltas)
+    legacy = time.perf_counter() - start
+
+    print(f"\nparser: {elapsed / len(deltas) * 1e6:.1f}us/delta, legacy regex scan: {legacy / len(deltas) * 1e6:.1f}us/delta "
+          f"({len(deltas)} deltas)")
+    assert "".join(data for kind, data in events if kind == TEXT) == "答えは四十二だよ。"
+    assert elapsed / len(deltas) < 50e-6
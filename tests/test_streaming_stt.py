@@ -0,0 +1,36 @@
+from src.stt.streaming import LocalAgreement, tokenize_hypothesis
+
+def test_tokenize_splits_japanese_per_character_and_keeps_words():
+    assert tokenize_hypothesis("今日は OK") == ["今", "日", "は", " ", "OK"]
+    assert "".join(tokenize_hypothesis("Hello, 世界 3.14")) == "Hello, 世界 3.14"
+
+def test_commits_only_what_consecutive_hypotheses_agree_on():
+    agreement = LocalAgreement(n=2)
+    assert agreement.update(tokenize_hypothesis("今日は")) == []  # Nothing to compare yet
+
+    new = agreement.update(tokenize_hypothesis("今日の天気"))
+    assert "".join(new) == "今日"
+    assert agreement.committed_text == "今日"
+
+    new = agreement.update(tokenize_hypothesis("今日の天気は"))
+    assert "".join(new) == "の天気"
+    assert agreement.committed_text == "今日の天気"
+
+def test_committed_prefix_is_never_retracted():
+    agreement = LocalAgreement(n=2)
+    agreement.update(tokenize_hypothesis("hello world"))
+    agreement.update(tokenize_hypothesis("hello world again"))
+    assert agreement.committed_text == "hello world"
+
+    # Later hypotheses that disagree with the commit don't change it
+    assert agreement.update(tokenize_hypothesis("yellow world")) == []
+    assert agreement.update(tokenize_hypothesis("yellow world")) == []
+    assert agreement.committed_text == "hello world"
+
+def test_reset_starts_a_new_utterance():
+    agreement = LocalAgreement(n=2)
+    agreement.update(["a"])
+    agreement.update(["a"])
+    agreement.reset()
+    assert agreement.committed == []
+    assert agreement.update(["b"]) == []
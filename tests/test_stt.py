@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from src.common.audio_backend import VirtualAudioBackend
+from src.common.audio_io import AudioIO
+from src.stt.stt import Utterance, WhisperSTT
+from src.stt.vad import VADEngine
+
+Segment = namedtuple("Segment", "text avg_logprob compression_ratio no_speech_prob words")
+
+
+class FakeVAD(VADEngine):
+    """Speech wherever the window is loud; records the size of every batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def process(self, windows):
+        self.batches.append(len(windows))
+        return (np.abs(windows).mean(axis=1) > 0.05).astype(np.float32)
+
+    def reset(self):
+        pass
+
+
+class FakeSession:
+    """Stands in for a TranscriptionSession; `reply(audio, prefix)` gives the decoded text."""
+
+    def __init__(self, reply=None, delay=0.0):
+        self.reply = reply or (lambda audio, prefix: f"{len(audio) // 16000}s")
+        self.delay = delay
+        self.calls = []
+
+    def transcribe(self, audio, beam_size, prefix=None, word_timestamps=False):
+        self.calls.append((len(audio), prefix))
+        time.sleep(self.delay)
+        return [Segment(self.reply(audio, prefix), -0.1, 1.0, 0.0, None)]
+
+
+class FakeService:
+    def __init__(self, session):
+        self.model = None
+        self._session = session
+
+    def open_session(self, session_id):
+        return self._session
+
+    def start(self):
+        pass
+
+
+def make_stt(session=None, **kwargs):
+    kwargs.setdefault("streaming", False)
+    return WhisperSTT(service=FakeService(session or FakeSession()), vad=FakeVAD(), **kwargs)
+
+
+def tone(seconds):
+    return np.full(int(16000 * seconds), 0.2, dtype=np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(16000 * seconds), dtype=np.float32)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def final(stt, seconds=1.0, utterance_id=1):
+    capture = stt.capture_pool.acquire()
+    capture.append(tone(seconds))
+    return Utterance(capture.view(), time.monotonic(), utterance_id, capture=capture)
+
+
+def test_vad_and_transcription_stages_produce_one_text_per_utterance():
+    stt = make_stt()
+    backend = VirtualAudioBackend(np.concatenate([tone(1.0), silence(1.0), tone(2.0)]), speed=None, tail_seconds=1.5)
+    audio_io = AudioIO(backend=backend)
+    texts = []
+
+    audio_io.start()
+    stt.start(audio_io, texts.append)
+    try:
+        wait_for(lambda: len(texts) == 2)
+    finally:
+        stt.is_running = False
+        audio_io.stop()
+
+    # Trailing silence and pre-roll are part of each utterance, so only compare whole seconds
+    assert [int(t[:-1]) for t in texts] == [1, 2]
+    assert max(stt.vad.batches) > 1  # The backlog is scored in batches, not window by window
+    wait_for(lambda: stt.capture_pool.available == stt.utterance_queue.maxsize + 2)  # Every buffer returned
+
+
+def test_full_queue_drops_the_oldest_final():
+    stt = make_stt(utterance_queue_size=2)
+    free = stt.capture_pool.available
+    utterances = [final(stt, utterance_id=i) for i in range(3)]
+    for utterance in utterances:
+        stt._submit_utterance(utterance)
+
+    assert stt.dropped_utterances == 1
+    assert [stt.utterance_queue.get_nowait().utterance_id for _ in range(2)] == [1, 2]
+    assert stt.capture_pool.available == free - 2  # The dropped one went back to the pool
+
+
+def test_final_evicts_a_queued_partial_without_counting_a_drop():
+    stt = make_stt(utterance_queue_size=1, streaming=True, partial_min_sec=0.5)
+    capture = stt.capture_pool.acquire()
+    capture.append(tone(1.0))
+    assert stt._submit_partial(capture, 1)
+    assert not stt._submit_partial(capture, 1)  # At most one partial in flight
+
+    stt._submit_utterance(final(stt, utterance_id=1))
+    assert stt.dropped_utterances == 0
+    assert stt._partial_pending is False
+    assert stt.utterance_queue.get_nowait().is_partial is False
+
+
+def test_partial_never_evicts_a_final():
+    stt = make_stt(utterance_queue_size=1, streaming=True, partial_min_sec=0.5)
+    stt._submit_utterance(final(stt))
+    capture = stt.capture_pool.acquire()
+    capture.append(tone(1.0))
+
+    assert not stt._submit_partial(capture, 2)
+    assert stt._partial_pending is False
+    assert stt.utterance_queue.qsize() == 1
+
+
+def test_short_snapshot_is_not_submitted_as_partial():
+    stt = make_stt(streaming=True, partial_min_sec=1.0)
+    capture = stt.capture_pool.acquire()
+    capture.append(tone(0.5))
+    assert not stt._submit_partial(capture, 1)
+    assert stt.utterance_queue.empty()
+
+
+def test_committed_partial_text_is_forced_as_the_final_prefix():
+    def reply(audio, prefix):
+        return (prefix or "") + " world" if prefix else "hello world"
+
+    session = FakeSession(reply)
+    stt = make_stt(session, streaming=True, agreement_n=2)
+    partials, texts = [], []
+    capture = stt.capture_pool.acquire()
+    capture.append(tone(1.0))
+    for _ in range(2):
+        stt.utterance_queue.put(Utterance(capture.view(), time.monotonic(), 1, is_partial=True))
+    stt.utterance_queue.put(Utterance(capture.view(), time.monotonic(), 1, capture=capture))
+
+    stt.is_running = True
+    worker = threading.Thread(target=stt._transcribe_worker, args=(texts.append, partials.append), daemon=True)
+    worker.start()
+    try:
+        wait_for(lambda: texts)
+    finally:
+        stt.is_running = False
+        worker.join(timeout=3)
+
+    assert partials == ["hello world"]
+    assert session.calls[-1][1] == "hello world"  # Only the tail after the commit is decoded
+    assert texts == ["hello world world"]
+    assert stt.agreement.committed == []  # Reset for the next utterance
+
+
+def test_vad_stage_never_waits_for_a_slow_transcriber():
+    stt = make_stt(FakeSession(delay=0.5), utterance_queue_size=1)
+    backend = VirtualAudioBackend(np.concatenate([tone(0.5), silence(1.0)] * 4), speed=None, tail_seconds=1.0)
+    audio_io = AudioIO(backend=backend)
+    texts = []
+
+    audio_io.start()
+    stt.start(audio_io, texts.append)
+    try:
+        # Four utterances end while the first one is still being decoded
+        wait_for(lambda: backend.finished.is_set())
+        wait_for(lambda: stt.audio_io.input_buffer.available == 0)
+    finally:
+        stt.is_running = False
+        audio_io.stop()
+
+    assert stt.dropped_utterances >= 1
+
+
+def test_barge_in_fires_even_without_a_free_capture_buffer():
+    stt = make_stt()
+    backend = VirtualAudioBackend(np.concatenate([silence(0.2), tone(0.5), silence(0.5)]), speed=None, tail_seconds=0.5)
+    audio_io = AudioIO(backend=backend)
+    audio_io.enqueue_output(np.full(16000 * 10, 0.1, dtype=np.float32))  # The assistant is talking
+    held = []
+    while (capture := stt.capture_pool.acquire()) is not None:
+        held.append(capture)  # The transcriber holds every buffer
+    barge_ins = []
+
+    audio_io.start()
+    stt.start(audio_io, lambda text: None, on_barge_in=lambda: barge_ins.append(audio_io.cancel_playback()))
+    try:
+        wait_for(lambda: backend.finished.is_set())
+        wait_for(lambda: stt.audio_io.input_buffer.available == 0)
+        wait_for(lambda: barge_ins)
+    finally:
+        stt.is_running = False
+        audio_io.stop()
+
+    assert len(barge_ins) == 1  # Once per speech onset, not once per window
+    assert not audio_io.is_playing
@@ -0,0 +1,87 @@
+from src.mcp.tool_index import ToolIndex, tokenize
+
+
+def tool(name, description, **params):
+    return {"type": "function", "function": {
+        "name": name, "description": description,
+        "parameters": {"type": "object", "properties": {k: {"type": "string", "description": v}
+                                                         for k, v in params.items()}}}}
+
+
+TOOLS = [
+    tool("brave_web_search", "Search the web with Brave", query="Search terms"),
+    tool("read_file", "Read the contents of a file", path="File path"),
+    tool("write_file", "Write text to a file", path="File path", content="Text"),
+    tool("launch_app", "Launch a Windows application", app="Application name"),
+    tool("get_time", "Current date and time"),
+]
+
+
+def names(tools):
+    return [t["function"]["name"] for t in tools]
+
+
+def test_tokenize_splits_identifiers_and_japanese():
+    assert tokenize("braveWebSearch read_file") == ["brave", "web", "search", "read", "file"]
+    assert tokenize("天気を") == ["天気", "気を"]
+    assert tokenize("字") == ["字"]
+
+
+def test_top_k_relevant_tools_in_original_order():
+    index = ToolIndex(TOOLS, top_k=2)
+    assert index.relevant("please write this text to a file")[0] == "write_file"
+    # Ranked by score, returned in MCP order
+    assert names(index.select("write text to a file")) == ["read_file", "write_file"]
+
+
+def test_pinned_tools_are_always_offered():
+    index = ToolIndex(TOOLS, top_k=1, pinned=["get_time", "unknown"])
+    assert names(index.select("hello there")) == ["get_time"]
+    assert names(index.select("search the web")) == ["brave_web_search", "get_time"]
+
+
+def test_keywords_by_tool_or_server_match_japanese():
+    index = ToolIndex(TOOLS, top_k=3, keywords={"brave-search": ["検索", "天気"], "launch_app": ["起動"]},
+                      servers={"brave_web_search": "brave-search"})
+    assert names(index.select("明日の天気は？")) == ["brave_web_search"]
+    assert names(index.select("メモ帳を起動して")) == ["launch_app"]
+
+
+def test_no_match_without_pinned_tools_offers_every_tool():
+    index = ToolIndex(TOOLS, top_k=2)
+    first = index.select("hello there")
+    assert names(first) == names(TOOLS)
+    assert index.select("thanks!", previous=first) == first
+    # The fallback gives way to a real selection once something matches
+    narrowed = names(index.select("search the web", previous=first))
+    assert "brave_web_search" in narrowed and len(narrowed) <= 2
+    assert index.stats["fallbacks"] == 1
+
+
+def test_previous_selection_is_kept_when_it_still_covers_the_query():
+    index = ToolIndex(TOOLS, top_k=2)
+    first = index.select("read the file")
+    assert index.select("thanks!", previous=first) == first  # Nothing relevant: prefix unchanged
+    assert index.select("now read that file again", previous=first) == first
+    assert "brave_web_search" in names(index.select("search the web", previous=first))
+    assert index.stats["reused"] == 2
+
+
+def test_selection_and_hit_rate_stats():
+    index = ToolIndex(TOOLS, top_k=2)
+    offered = index.select("search the web")
+    index.select("read file", record=False)
+    index.record_call("brave_web_search", offered)
+    index.record_call("get_time", offered)
+
+    summary = index.summary()
+    assert summary["selections"] == 1
+    assert summary["tools_total"] == len(TOOLS)
+    assert summary["avg_tools_offered"] == len(offered)
+    assert summary["hit_rate"] == 0.5
+
+
+def test_empty_index():
+    index = ToolIndex([], top_k=3)
+    assert index.select("anything") == []
+    assert index.hit_rate is None
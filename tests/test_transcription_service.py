@@ -0,0 +1,108 @@
+from collections import namedtuple
+from concurrent.futures import CancelledError
+
+import numpy as np
+import pytest
+from src.stt.transcription_service import SLOT_SECONDS, TranscriptionJob, TranscriptionService
+
+# Same shape as faster-whisper's Segment namedtuple, trimmed to what the service touches
+Segment = namedtuple("Segment", "text start end")
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append(kwargs)
+        return iter([Segment(f"single:{len(audio)}", 0.0, 1.0)]), None
+
+class FakeBatchPipeline:
+    """Emits one segment per 30s slot that contains non-zero audio (clip times are in seconds)."""
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append(kwargs)
+        out = []
+        for i, clip in enumerate(kwargs["clip_timestamps"]):
+            start, end = int(clip["start"] * 16000), int(clip["end"] * 16000)
+            assert end <= len(audio), "clip_timestamps must be in seconds"
+            if np.any(audio[start:end]):
+                t0 = i * SLOT_SECONDS
+                out.append(Segment(f"slot{i}", t0 + 0.5, t0 + 1.5))
+        return iter(out), None
+
+def make_service(**kwargs):
+    return TranscriptionService(FakeModel(), batch_pipeline=FakeBatchPipeline(), **kwargs)
+
+def tone(seconds=1.0):
+    return np.full(int(16000 * seconds), 0.1, dtype=np.float32)
+
+def test_single_job_uses_plain_transcribe_with_options():
+    service = make_service()
+    session = service.open_session("a")
+    service.start()
+    segments = session.transcribe(tone(), 5, prefix="今日", word_timestamps=True)
+    service.stop()
+
+    assert segments[0].text == "single:16000"
+    call = service.model.calls[0]
+    assert call["beam_size"] == 5
+    assert call["prefix"] == "今日"
+    assert call["word_timestamps"] is True
+
+def test_next_batch_is_round_robin_and_one_job_per_session():
+    service = make_service(max_batch_size=8)
+    a = service.open_session("a")
+    b = service.open_session("b")
+    for _ in range(3):
+        a.submit(tone(), 1)
+    b.submit(tone(), 1)
+
+    first = service._next_batch()
+    second = service._next_batch()
+    assert [j.session_id for j in first] == ["a", "b"]
+    assert [j.session_id for j in second] == ["a"]
+
+def test_incompatible_jobs_are_not_batched():
+    service = make_service()
+    service.open_session("a").submit(tone(), 1, prefix="partial")  # Prefixed decodes run alone
+    service.open_session("b").submit(tone(), 1)
+
+    first = service._next_batch()
+    assert [j.session_id for j in first] == ["a"]
+
+def test_batched_segments_map_back_to_their_job():
+    service = make_service()
+    jobs = [TranscriptionJob("a", tone(), 1), TranscriptionJob("b", tone(2.0), 1),
+            TranscriptionJob("c", tone(), 1)]
+
+    results = service._decode_batch(jobs)
+    assert [r[0].text for r in results] == ["slot0", "slot1", "slot2"]
+    # Times are relative to each utterance, not to the padded batch
+    assert all(r[0].start == 0.5 and r[0].end == 1.5 for r in results)
+    assert service._batch_pipeline.calls[0]["batch_size"] == 3
+    assert service._batch_pipeline.calls[0]["clip_timestamps"] == [
+        {"start": 0, "end": 30}, {"start": 30, "end": 60}, {"start": 60, "end": 90}]
+
+def test_worker_batches_concurrent_sessions():
+    service = make_service()
+    fa = service.open_session("a").submit(tone(), 1)
+    fb = service.open_session("b").submit(tone(), 1)
+    service.start()
+
+    assert fa.result(timeout=2)[0].text == "slot0"
+    assert fb.result(timeout=2)[0].text == "slot1"
+    service.stop()
+    assert service.stats["batches"] == 1
+    assert service.stats["batched_jobs"] == 2
+
+def test_closing_a_session_cancels_its_pending_jobs():
+    service = make_service()
+    session = service.open_session("a")
+    future = session.submit(tone(), 1)
+    session.close()
+    with pytest.raises(CancelledError):
+        future.result(timeout=1)
+    with pytest.raises(KeyError):
+        session.submit(tone(), 1)
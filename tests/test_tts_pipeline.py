@@ -0,0 +1,120 @@
+import threading
+import time
+
+import numpy as np
+from src.tts.tts_pipeline import TTSPipeline
+
+class Sink:
+    def __init__(self):
+        self.chunks = []
+    def __call__(self, chunk):
+        self.chunks.append(float(chunk[0]))
+
+def delayed(delays):
+    """Synth that yields two chunks tagged with the job's id after a per-job delay."""
+    def synthesize(text, **options):
+        time.sleep(delays[text])
+        job_id = int(text)
+        yield np.full(4, job_id, dtype=np.float32)
+        yield np.full(4, job_id + 0.5, dtype=np.float32)
+    return synthesize
+
+def test_playback_follows_submission_order():
+    sink = Sink()
+    # Later sentences finish synthesis first
+    pipeline = TTSPipeline(delayed({"1": 0.15, "2": 0.05, "3": 0.0}), sink, max_in_flight=3)
+    for text in ("1", "2", "3"):
+        pipeline.submit(text)
+
+    assert pipeline.flush(timeout=2)
+    assert sink.chunks == [1, 1.5, 2, 2.5, 3, 3.5]
+
+def test_submit_does_not_block_and_in_flight_is_bounded():
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def synthesize(text, **options):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        yield np.zeros(4, dtype=np.float32)
+
+    sink = Sink()
+    pipeline = TTSPipeline(synthesize, sink, max_in_flight=2)
+    t0 = time.perf_counter()
+    for i in range(6):
+        pipeline.submit(str(i))
+    assert time.perf_counter() - t0 < 0.05
+
+    assert pipeline.flush(timeout=2)
+    assert peak == 2
+    assert len(sink.chunks) == 6
+
+def test_flush_times_out_while_synthesis_is_running():
+    release = threading.Event()
+
+    def synthesize(text, **options):
+        release.wait(2)
+        yield np.zeros(4, dtype=np.float32)
+
+    pipeline = TTSPipeline(synthesize, Sink())
+    pipeline.submit("slow")
+    assert pipeline.flush(timeout=0.05) is False
+    release.set()
+    assert pipeline.flush(timeout=2) is True
+
+def test_cancel_drops_queued_speech():
+    release = threading.Event()
+
+    def synthesize(text, **options):
+        release.wait(2)
+        yield np.full(4, int(text), dtype=np.float32)
+
+    sink = Sink()
+    pipeline = TTSPipeline(synthesize, sink, max_in_flight=1)
+    for text in ("1", "2", "3"):
+        pipeline.submit(text)
+    pipeline.cancel()
+    release.set()
+
+    assert pipeline.flush(timeout=1)
+    time.sleep(0.05)
+    assert sink.chunks == []
+    pipeline.submit("4")  # Still usable after a cancel
+    assert pipeline.flush(timeout=1)
+    assert sink.chunks == [4]
+
+def test_failed_job_is_skipped():
+    def synthesize(text, **options):
+        if text == "bad":
+            raise RuntimeError("server error")
+        yield np.full(4, 1, dtype=np.float32)
+
+    sink = Sink()
+    pipeline = TTSPipeline(synthesize, sink)
+    pipeline.submit("bad")
+    pipeline.submit("good")
+    assert pipeline.flush(timeout=1)
+    assert sink.chunks == [1]
+
+def test_sink_error_drops_only_that_job():
+    def sink(chunk):
+        if chunk[0] == 1:
+            raise RuntimeError("device lost")
+        delivered.append(float(chunk[0]))
+
+    delivered = []
+    pipeline = TTSPipeline(delayed({"1": 0.0, "2": 0.0}), sink, position=lambda: 1 / 0)
+    first = pipeline.submit("1")
+    second = pipeline.submit("2")
+    assert pipeline.flush(timeout=1)
+    assert delivered == [2, 2.5]
+    assert first.end_position is None and second.end_position is None
+
+    pipeline.submit("2")  # The delivery thread survived both errors
+    assert pipeline.flush(timeout=1)
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from src.tts.sbv2_client import SBV2APIError
+from src.tts.tts_pool import EndpointPool
+
+class FakeClient:
+    """Stands in for SBV2Client: waits `delay`, then yields `blocks` tagged with its name."""
+    def __init__(self, name, delay=0.0, blocks=2, error=None):
+        self.name = name
+        self.delay = delay
+        self.blocks = blocks
+        self.error = error
+        self.alive = True
+        self.calls = 0
+        self.closed_early = 0
+
+    def stream_voice(self, params):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        try:
+            for i in range(self.blocks):
+                yield 16000, np.array([i], dtype=np.float32)
+                time.sleep(0.001)
+        except GeneratorExit:
+            self.closed_early += 1
+            raise
+
+    def ping(self, path):
+        return self.alive
+
+    def close(self):
+        pass
+
+def make_pool(*clients, **kwargs):
+    kwargs.setdefault("health_interval", 0)
+    return EndpointPool([c.name for c in clients], clients=list(clients), **kwargs)
+
+def stream(pool):
+    return list(pool.stream_voice({"text": "x"}))
+
+def test_least_outstanding_dispatch():
+    a, b = FakeClient("a"), FakeClient("b")
+    pool = make_pool(a, b)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.url, second.url} == {"a", "b"}
+    pool.release(first, True)
+    assert pool.acquire() is first  # Now the less loaded one
+
+def test_concurrent_requests_spread_over_endpoints():
+    clients = [FakeClient(n, delay=0.05) for n in "abc"]
+    pool = make_pool(*clients, hedge=False)
+    threads = [threading.Thread(target=stream, args=(pool,)) for _ in range(6)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [c.calls for c in clients] == [2, 2, 2]
+    assert time.perf_counter() - t0 < 0.25  # Not 6 x 50ms serially
+
+def test_failover_before_first_chunk_and_passive_health():
+    bad = FakeClient("bad", error=ConnectionError("refused"))
+    good = FakeClient("good")
+    pool = make_pool(bad, good, failure_threshold=2)
+
+    for _ in range(2):
+        pool.endpoints[1].outstanding = 5  # Make "bad" the preferred pick
+        assert len(stream(pool)) == 2
+        pool.endpoints[1].outstanding = 0
+    assert pool.stats["failovers"] == 2
+    assert pool.endpoints[0].healthy is False
+    bad.calls = 0
+    stream(pool)
+    assert bad.calls == 0  # Out of rotation
+
+def test_client_errors_are_not_retried_or_counted_against_the_server():
+    a = FakeClient("a", error=SBV2APIError(422, "bad style"))
+    pool = make_pool(a, FakeClient("b"))
+    pool.endpoints[1].outstanding = 5
+    with pytest.raises(SBV2APIError):
+        stream(pool)
+    assert pool.endpoints[0].healthy and pool.endpoints[0].consecutive_failures == 0
+
+def test_active_health_check_restores_endpoint():
+    a = FakeClient("a")
+    pool = make_pool(a, FakeClient("b"))
+    a.alive = False
+    pool.check_health()
+    assert pool.endpoints[0].healthy is False
+    a.alive = True
+    pool.check_health()
+    assert pool.endpoints[0].healthy is True
+
+def test_hedges_when_primary_exceeds_its_p95():
+    slow, fast = FakeClient("slow", delay=0.5), FakeClient("fast", delay=0.0)
+    pool = make_pool(slow, fast, hedge_min_samples=3, hedge_min_delay=0.02)
+    for _ in range(3):
+        pool.endpoints[0].record_latency(0.03)  # Normally answers in 30ms
+    pool.endpoints[1].outstanding = 5  # Dispatch picks "slow" first
+
+    t0 = time.perf_counter()
+    blocks = stream(pool)
+    elapsed = time.perf_counter() - t0
+    pool.endpoints[1].outstanding = 0
+
+    assert len(blocks) == 2
+    assert elapsed < 0.3
+    assert pool.stats["hedges"] == 1 and pool.stats["hedge_wins"] == 1
+    time.sleep(0.6)  # Abandoned attempt finishes in the background
+    assert pool.endpoints[0].outstanding == 0
+    assert pool.endpoints[0].healthy  # Losing a hedge is not a failure
+
+def test_no_hedge_without_latency_history():
+    slow = FakeClient("slow", delay=0.1)
+    pool = make_pool(slow, FakeClient("other"))
+    pool.endpoints[1].outstanding = 5
+    stream(pool)
+    assert pool.stats["hedges"] == 0
+    assert slow.calls == 1
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from src.stt.vad import VAD_WINDOW, OnnxSileroVAD, TorchSileroVAD
+
+
+class FakeOnnxSession:
+    """Recurrent stand-in for the Silero v5 graph: output depends on the input and the carried state."""
+
+    def __init__(self):
+        self.inputs = []
+
+    def run(self, outputs, feeds):
+        x = feeds["input"]
+        state = feeds["state"]
+        self.inputs.append(x.copy())
+        prob = np.array([[float(x.mean() + state[0, 0, 0])]], dtype=np.float32)
+        new_state = state + x.sum()
+        return prob, new_state
+
+
+def make_vad():
+    # Skips onnxruntime and the model file; everything process() touches is set up by reset()
+    vad = OnnxSileroVAD.__new__(OnnxSileroVAD)
+    vad.session = FakeOnnxSession()
+    vad._sr = np.array(16000, dtype=np.int64)
+    vad._input = np.zeros((1, OnnxSileroVAD.CONTEXT + VAD_WINDOW), dtype=np.float32)
+    vad.reset()
+    return vad
+
+
+def windows(n, seed=0):
+    return np.random.default_rng(seed).uniform(-1, 1, (n, VAD_WINDOW)).astype(np.float32)
+
+
+def test_one_batch_matches_one_call_per_window():
+    frames = windows(6)
+    batched = make_vad().process(frames)
+
+    single = make_vad()
+    one_by_one = np.concatenate([single.process(frames[i:i + 1]) for i in range(len(frames))])
+
+    assert batched.shape == (6,)
+    np.testing.assert_array_equal(batched, one_by_one)
+
+
+def test_each_window_gets_the_previous_windows_tail_as_context():
+    vad = make_vad()
+    frames = windows(3)
+    vad.process(frames[:2])
+    vad.process(frames[2:])  # Context carries over between calls too
+
+    inputs = vad.session.inputs
+    assert inputs[0].shape == (1, OnnxSileroVAD.CONTEXT + VAD_WINDOW)
+    assert not inputs[0][0, :OnnxSileroVAD.CONTEXT].any()
+    for prev, cur in zip(frames, inputs[1:]):
+        np.testing.assert_array_equal(cur[0, :OnnxSileroVAD.CONTEXT], prev[-OnnxSileroVAD.CONTEXT:])
+
+
+def test_reset_clears_state_and_context():
+    vad = make_vad()
+    frames = windows(2)
+    first = vad.process(frames)
+    vad.reset()
+    assert not vad._input.any() and not vad._state.any()
+    np.testing.assert_array_equal(vad.process(frames), first)
+
+
+def test_missing_onnx_model_is_reported(tmp_path):
+    pytest.importorskip("onnxruntime")
+    with pytest.raises(FileNotFoundError):
+        OnnxSileroVAD(model_path=str(tmp_path / "missing.onnx"))
+
+
+def test_torch_batch_matches_one_call_per_window():
+    torch = pytest.importorskip("torch")
+
+    class FakeSilero:
+        def __init__(self):
+            self.reset_states()
+
+        def __call__(self, frame, sr):
+            self.state = self.state * 0.5 + frame.mean()
+            return self.state.reshape(1, 1)
+
+        def reset_states(self):
+            self.state = torch.zeros(())
+
+    def make():
+        vad = TorchSileroVAD.__new__(TorchSileroVAD)
+        vad.torch = torch
+        vad.model = FakeSilero()
+        return vad
+
+    frames = windows(5)
+    single = make()
+    one_by_one = np.concatenate([single.process(frames[i:i + 1]) for i in range(len(frames))])
+    np.testing.assert_allclose(make().process(frames), one_by_one)
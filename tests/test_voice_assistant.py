@@ -1,4 +1,6 @@
 
+import threading
+import time
 import pytest
 from unittest.mock import MagicMock
 from src.core.voice_assistant import VoiceAssistant
@@ -6,17 +8,22 @@ from src.common import config as cfg
 
 # --- Mock Classes ---
 class MockLLM:
-    def chat_stream(self, messages, tools=None):
+    def chat_stream(self, messages, tools=None, slot=None, cancel=None):
         yield ("content", "Test response")
 
 class MockTTS:
+    def __init__(self):
+        self.events = []
     def speak(self, text, **kwargs):
-        pass
+        self.events.append(("speak", text))
+    def flush(self, timeout=None):
+        self.events.append(("flush", None))
+        return True
 
 class MockMCP:
     def list_tools(self):
         return []
-    def call_tool(self, name, args):
+    def call_tool(self, name, args, cancel=None):
         return "Tool Result"
 
 class MockConversation:
@@ -33,13 +40,6 @@ class MockConversation:
 def assistant():
     return VoiceAssistant(MockLLM(), MockTTS(), MockMCP(), MockConversation())
 
-def test_is_partial_tag(assistant):
-    """Test partial tag detection for buffering."""
-    assert assistant._is_partial_tag("<") is True
-    assert assistant._is_partial_tag("<think") is True
-    assert assistant._is_partial_tag("Hello <tool") is True
-    assert assistant._is_partial_tag("Normal text") is False
-
 def test_truncation_logic(assistant):
     """Test that tool outputs are truncated correctly."""
     # Temporarily lower the limit for testing
@@ -72,9 +72,251 @@ def test_truncation_logic(assistant):
         # Restore limit
         cfg.MAX_TOOL_OUTPUT_CHARS = original_limit
 
-def test_think_tag_stripping(assistant):
-    """Test that think tags are stripped from output."""
-    # This logic is inside _run_conversation_loop which is hard to unit test 
-    # without mocking the entire generator. 
-    # For now, we tested _is_partial_tag which supports this feature.
-    pass
+class PrefillLLM(MockLLM):
+    def __init__(self):
+        self.prefilled = []
+        self.called = threading.Event()
+
+    def prefill(self, messages, tools=None):
+        self.prefilled.append(messages)
+        self.called.set()
+        return 1
+
+def test_speculate_prefills_history_plus_partial_turn():
+    llm = PrefillLLM()
+    assistant = VoiceAssistant(llm, MockTTS(), MockMCP(), MockConversation())
+
+    assistant.speculate("今日の天気")
+    assert llm.called.wait(timeout=2)
+    assert llm.prefilled[-1] == [{"role": "user", "content": "今日の天気"}]
+
+def test_speculate_is_skipped_during_a_turn():
+    llm = PrefillLLM()
+    assistant = VoiceAssistant(llm, MockTTS(), MockMCP(), MockConversation())
+
+    with assistant.scheduler.turn(VoiceAssistant.DEFAULT_SESSION) as turn:
+        stream = assistant.scheduler.chat_stream(turn, [])
+        next(stream)  # Generating: the model is taken
+        assistant.speculate("hello")
+        assert not llm.called.wait(timeout=0.2)
+        stream.close()
+
+def test_speculate_without_prefill_support_is_noop(assistant):
+    assert assistant.speculative_prefill is False
+    assistant.speculate("hello")  # Must not raise
+
+
+def test_turn_waits_for_queued_speech(assistant):
+    """speak() is asynchronous; the turn flushes the TTS queue before finishing."""
+    assistant.process_input("hello")
+    assert assistant.tts.events == [("speak", "Test response"), ("flush", None)]
+
+
+class TaggedLLM(MockLLM):
+    def __init__(self):
+        self.turns = 0
+
+    def chat_stream(self, messages, tools=None, slot=None, cancel=None):
+        self.turns += 1
+        if self.turns == 1:
+            text = '<think>hmm</think>調べるね。<tool_call>{"name": "clock", "arguments": {}}</tool_call>'
+        else:
+            text = "三時だよ。"
+        for i in range(0, len(text), 2):
+            yield ("content", text[i:i + 2])
+
+
+def test_think_blocks_are_silent_and_tool_calls_run():
+    assistant = VoiceAssistant(TaggedLLM(), MockTTS(), MockMCP(), MockConversation())
+    assistant.mcp_client.call_tool = MagicMock(return_value="15:00")
+    assistant.process_input("何時？")
+
+    assistant.mcp_client.call_tool.assert_called_once()
+    assert assistant.mcp_client.call_tool.call_args.args == ("clock", {})
+    assert assistant.mcp_client.call_tool.call_args.kwargs["cancel"] is not None
+    spoken = [text for kind, text in assistant.tts.events if kind == "speak"]
+    assert spoken == ["調べるね。", "三時だよ。"]
+
+
+class SlowLLM(MockLLM):
+    def __init__(self):
+        self.started = threading.Event()
+
+    def chat_stream(self, messages, tools=None, slot=None, cancel=None):
+        self.started.set()
+        time.sleep(0.2)
+        yield ("content", "ok")
+
+
+def test_utterance_during_a_turn_is_queued_not_dropped():
+    from src.core.conversation import ConversationManager
+    conversation = ConversationManager("system")
+    assistant = VoiceAssistant(SlowLLM(), MockTTS(), MockMCP(), conversation)
+
+    first = threading.Thread(target=assistant.process_input, args=("one",))
+    first.start()
+    assert assistant.llm.started.wait(timeout=2)
+    assistant.process_input("two")
+    first.join()
+
+    users = [m["content"] for m in conversation.get_history() if m["role"] == "user"]
+    assert users == ["one", "two"]
+    assert assistant.scheduler.sessions["local"].stats.turns == 2
+
+
+class Handle:
+    def __init__(self, end_position):
+        self.end_position = end_position
+
+
+class PlaybackTTS(MockTTS):
+    """Each chunk plays for 100 samples; `on_flush` simulates a barge-in while the turn flushes."""
+
+    def __init__(self, cut=150):
+        super().__init__()
+        self.cut = cut
+        self.played = 0
+        self.on_flush = None
+
+    def speak(self, text, **kwargs):
+        self.events.append(("speak", text))
+        self.played += 100
+        return Handle(self.played)
+
+    def flush(self, timeout=None):
+        self.events.append(("flush", None))
+        if self.on_flush:
+            self.on_flush()
+        return True
+
+    def cancel(self):
+        self.events.append(("cancel", None))
+
+    def interrupt(self):
+        self.events.append(("interrupt", None))
+        return self.cut
+
+    def was_heard(self, handle, cut_position):
+        return handle.end_position <= cut_position
+
+
+class SentencesLLM(MockLLM):
+    def __init__(self, text="One. Two. Three."):
+        self.text = text
+        self.cancelled = False
+
+    def chat_stream(self, messages, tools=None, slot=None, cancel=None):
+        for word in self.text.split(" "):
+            if cancel is not None and cancel.cancelled:
+                self.cancelled = True
+                return
+            yield ("content", word + " ")
+
+
+def make_interruptible_assistant(llm, tts):
+    from src.core.conversation import ConversationManager
+    from src.core.sentence_segmenter import SegmenterPolicy
+    policy = SegmenterPolicy(first_min_chars=1, target_chars=1, growth=1.0)
+    return VoiceAssistant(llm, tts, MockMCP(), ConversationManager("system"), segmenter_policy=policy)
+
+
+def last_assistant(assistant):
+    return [m for m in assistant.conversation.get_history() if m["role"] == "assistant"][-1]["content"]
+
+
+def test_barge_in_during_flush_keeps_only_heard_sentences():
+    tts = PlaybackTTS(cut=150)
+    assistant = make_interruptible_assistant(SentencesLLM(), tts)
+    tts.on_flush = assistant.interrupt
+
+    assistant.process_input("count")
+
+    spoken = [text for kind, text in tts.events if kind == "speak"]
+    assert len(spoken) == 3
+    assert last_assistant(assistant) == spoken[0]
+    assert tts.events[-1] == ("cancel", None)
+    assert assistant.last_interrupt_latency is not None
+
+
+def test_barge_in_after_the_turn_trims_the_playing_answer():
+    tts = PlaybackTTS(cut=250)
+    assistant = make_interruptible_assistant(SentencesLLM(), tts)
+    assistant.process_input("count")
+
+    assistant.interrupt()
+
+    spoken = [text for kind, text in tts.events if kind == "speak"]
+    assert last_assistant(assistant) == spoken[0] + spoken[1]
+
+
+def test_barge_in_trims_only_its_own_session():
+    tts = PlaybackTTS(cut=150)
+    assistant = make_interruptible_assistant(SentencesLLM(), tts)
+    from src.core.conversation import ConversationManager
+    assistant.scheduler.add_session("remote", ConversationManager("system"))
+    assistant.process_input("count", session_id="remote")
+    assistant.process_input("count")
+    local = last_assistant(assistant)
+
+    assistant.interrupt("remote")
+
+    spoken = [text for kind, text in tts.events if kind == "speak"]
+    remote = assistant.scheduler.sessions["remote"].conversation.get_history()
+    assert remote[-1]["content"] == spoken[0]
+    assert last_assistant(assistant) == local  # The local answer is untouched
+    assert assistant.scheduler.sessions["local"].last_speech is not None
+
+
+def test_barge_in_mid_generation_stops_the_llm():
+    tts = PlaybackTTS(cut=150)
+    llm = SentencesLLM()
+    assistant = make_interruptible_assistant(llm, tts)
+
+    original_speak = tts.speak
+    def speak_and_interrupt(text, **kwargs):
+        handle = original_speak(text, **kwargs)
+        assistant.interrupt()  # The user talks over the first sentence
+        return handle
+    tts.speak = speak_and_interrupt
+
+    assistant.process_input("count")
+
+    assert llm.cancelled
+    assert [kind for kind, _ in tts.events].count("speak") == 1
+    assert ("flush", None) not in tts.events
+    # The first chunk ended at 100 <= 150: it was heard
+    assert last_assistant(assistant) == [t for k, t in tts.events if k == "speak"][0]
+
+
+class IndexedMCP(MockMCP):
+    def __init__(self):
+        from src.mcp.tool_index import ToolIndex
+        self.tools = [{"type": "function", "function": {"name": name, "description": desc, "parameters": {}}}
+                      for name, desc in [("clock", "Current time"), ("search", "Search the web"),
+                                         ("files", "Read a file")]]
+        self.tool_index = ToolIndex(self.tools, top_k=1, keywords={"clock": ["何時"]})
+
+    def list_tools(self):
+        return self.tools
+
+
+class ToolRecordingLLM(TaggedLLM):
+    def __init__(self):
+        super().__init__()
+        self.offered = []
+
+    def chat_stream(self, messages, tools=None, slot=None, cancel=None):
+        self.offered.append([t["function"]["name"] for t in tools or []])
+        yield from super().chat_stream(messages, tools, slot, cancel)
+
+
+def test_each_turn_is_offered_only_relevant_tools():
+    llm = ToolRecordingLLM()
+    mcp = IndexedMCP()
+    assistant = VoiceAssistant(llm, MockTTS(), mcp, MockConversation())
+
+    assistant.process_input("何時？")
+
+    assert llm.offered == [["clock"], ["clock"]]  # Same tools on the round after the tool call
+    assert mcp.tool_index.stats["selections"] == 1
+    assert mcp.tool_index.hit_rate == 1.0
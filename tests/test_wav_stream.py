@@ -0,0 +1,59 @@
+import io
+import struct
+
+import numpy as np
+import pytest
+import scipy.io.wavfile
+from src.tts.wav_stream import WavFormatError, WavStreamDecoder
+
+def wav_bytes(data, rate=44100):
+    bio = io.BytesIO()
+    scipy.io.wavfile.write(bio, rate, data)
+    return bio.getvalue()
+
+def decode_in_pieces(payload, piece):
+    decoder = WavStreamDecoder()
+    out = [decoder.feed(payload[i:i + piece]) for i in range(0, len(payload), piece)]
+    return decoder, np.concatenate(out)
+
+@pytest.mark.parametrize("piece", [1, 7, 1000, 1 << 20])
+def test_int16_matches_full_decode_for_any_split(piece):
+    pcm = (np.sin(np.arange(5000) * 0.01) * 20000).astype(np.int16)
+    decoder, audio = decode_in_pieces(wav_bytes(pcm), piece)
+    assert decoder.sample_rate == 44100
+    np.testing.assert_allclose(audio, pcm / 32768.0, atol=1e-7)
+
+def test_int32_float32_and_stereo():
+    pcm32 = np.array([0, 2 ** 30, -2 ** 31], dtype=np.int32)
+    _, audio = decode_in_pieces(wav_bytes(pcm32), 3)
+    np.testing.assert_allclose(audio, [0.0, 0.5, -1.0])
+
+    flt = np.array([0.25, -0.5], dtype=np.float32)
+    _, audio = decode_in_pieces(wav_bytes(flt), 5)
+    np.testing.assert_allclose(audio, flt)
+
+    stereo = np.array([[1000, 3000], [-2000, 0]], dtype=np.int16)
+    _, audio = decode_in_pieces(wav_bytes(stereo), 2)
+    np.testing.assert_allclose(audio, [2000 / 32768.0, -1000 / 32768.0])
+
+def test_skips_extra_chunks_and_handles_unknown_data_size():
+    pcm = np.arange(10, dtype=np.int16)
+    fmt = struct.pack("<HHIIHH", 1, 1, 22050, 44100, 2, 16)
+    body = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            + b"LIST" + struct.pack("<I", 3) + b"abc\x00"          # Odd size, padded
+            + b"data" + struct.pack("<I", 0xFFFFFFFF) + pcm.tobytes())
+    payload = b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + body
+
+    decoder, audio = decode_in_pieces(payload, 4)
+    assert decoder.sample_rate == 22050
+    np.testing.assert_allclose(audio, pcm / 32768.0)
+
+def test_trailing_bytes_after_data_chunk_are_ignored():
+    pcm = np.arange(4, dtype=np.int16)
+    payload = wav_bytes(pcm) + b"JUNK" + struct.pack("<I", 2) + b"zz"
+    _, audio = decode_in_pieces(payload, 3)
+    assert len(audio) == 4
+
+def test_rejects_non_wav():
+    with pytest.raises(WavFormatError):
+        WavStreamDecoder().feed(b"<html>Internal Server Error</html>")